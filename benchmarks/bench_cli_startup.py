@@ -0,0 +1,114 @@
+"""Startup budget check for the CLI.
+
+Times `cloudysetup-cli --help` in fresh interpreters and inspects
+`python -X importtime` output to make sure the heavy dependencies (boto3,
+requests, rich renderables, dotenv) are only loaded by the commands that use
+them. Exits with status 1 when the median run exceeds the budget or a
+forbidden module is imported, so it can run in CI.
+
+    python benchmarks/bench_cli_startup.py [--runs N] [--budget-ms MS]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+CLI_ARGS = ["-m", "cloudysetup.cli_tool.cli", "--help"]
+
+FORBIDDEN_MODULES = (
+    "boto3",
+    "botocore",
+    "requests",
+    "dotenv",
+    "rich.progress",
+    "rich.live",
+    "rich.table",
+    "rich.syntax",
+)
+
+
+def run_env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    return env
+
+
+def time_help(runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *CLI_ARGS],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            env=run_env(),
+        )
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def import_profile():
+    """Return {module: cumulative microseconds} from -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *CLI_ARGS],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        env=run_env(),
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        cumulative = cumulative.strip()
+        if cumulative.isdigit():
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    timings = time_help(args.runs)
+    median = statistics.median(timings)
+    print(
+        f"--help over {args.runs} runs: median {median:.1f} ms, "
+        f"min {min(timings):.1f} ms, max {max(timings):.1f} ms "
+        f"(budget {args.budget_ms:.0f} ms)"
+    )
+
+    modules = import_profile()
+    cli_us = modules.get("cloudysetup.cli_tool.cli")
+    if cli_us is not None:
+        print(f"cloudysetup.cli_tool.cli cumulative import: {cli_us / 1000:.1f} ms")
+
+    loaded = sorted(
+        name
+        for name in modules
+        if any(
+            name == forbidden or name.startswith(forbidden + ".")
+            for forbidden in FORBIDDEN_MODULES
+        )
+    )
+
+    failed = False
+    if loaded:
+        failed = True
+        print("Heavy modules imported at startup: " + ", ".join(loaded))
+    if median > args.budget_ms:
+        failed = True
+        print(f"Median startup {median:.1f} ms is over budget")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Micro-benchmark of JSON extraction from Bedrock model replies.
+
+Compares the regex + json.loads approach the Bedrock helpers used to take
+with the single-pass extractor, over the recorded replies in
+corpus/model_replies.jsonl, a synthetic long reply full of stray braces and
+a few pathological inputs made of unbalanced or non-JSON brackets.
+
+    python benchmarks/bench_json_extract.py [--number N]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from cloudysetup.envapi_app.json_extract import (  # noqa: E402
+    JsonExtractor,
+    extract_json_values,
+)
+
+CORPUS = os.path.join(os.path.dirname(__file__), "corpus", "model_replies.jsonl")
+
+
+def load_corpus():
+    with open(CORPUS) as f:
+        return [json.loads(line)["reply"] for line in f if line.strip()]
+
+
+def synthetic_reply(size: int = 20000):
+    prose = "Replace {placeholder} and [note] values; " * (size // 40)
+    template = json.dumps(
+        {
+            "TypeName": "AWS::SNS::Topic",
+            "Properties": {"Subscription": [{"Endpoint": f"e{i}"} for i in range(200)]},
+        }
+    )
+    return prose + template + prose
+
+
+def pathological_inputs(size: int = 8000):
+    return {
+        "open braces": "{ " * (size // 2),
+        "nested prose braces": "{a" * (size // 4) + "}" * (size // 4),
+        "nested invalid arrays": "[1," * (size // 4) + "x" + "]" * (size // 4),
+        "stray quotes": 'He said "hi {there" ' * (size // 20),
+    }
+
+
+def regex_extract(text):
+    for pattern in (r"\{.*\}", r"\[.*?\]"):
+        match = re.search(pattern, text, re.DOTALL)
+        if match:
+            try:
+                return json.loads(match.group())
+            except ValueError:
+                continue
+            except RecursionError:
+                # The old helpers let this escape to the request handler.
+                return None
+    return None
+
+
+def chunked_extract(text, chunk_size=16):
+    extractor = JsonExtractor()
+    found = []
+    for i in range(0, len(text), chunk_size):
+        found.extend(extractor.feed(text[i : i + chunk_size]))
+    return found + extractor.finish()
+
+
+def bench(name, func, replies, number):
+    elapsed = timeit.timeit(lambda: [func(r) for r in replies], number=number)
+    per_reply = elapsed / (number * len(replies)) * 1e6
+    print(f"{name:<36} {per_reply:10.2f} us/reply")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    recovered = sum(regex_extract(r) is not None for r in corpus)
+    print(f"corpus: {len(corpus)} replies")
+    print(f"regex recovers a value from {recovered}/{len(corpus)} replies")
+    recovered = sum(bool(extract_json_values(r)) for r in corpus)
+    print(f"extractor recovers a value from {recovered}/{len(corpus)} replies")
+    print()
+
+    bench("regex (corpus)", regex_extract, corpus, args.number)
+    bench("extractor (corpus)", extract_json_values, corpus, args.number)
+    bench("extractor 16-char chunks", chunked_extract, corpus, args.number)
+
+    long_reply = [synthetic_reply()]
+    number = max(1, args.number // 10)
+    print()
+    print(f"long reply: {len(long_reply[0])} chars")
+    print(f"regex recovers a value: {regex_extract(long_reply[0]) is not None}")
+    print(f"extractor recovers a value: {bool(extract_json_values(long_reply[0]))}")
+    bench("regex (long reply)", regex_extract, long_reply, number)
+    bench("extractor (long reply)", extract_json_values, long_reply, number)
+
+    print()
+    for name, text in pathological_inputs().items():
+        bench(f"regex ({name})", regex_extract, [text], number)
+        bench(f"extractor ({name})", extract_json_values, [text], number)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+"""Load test of the API service against the offline AWS stand-in.
+
+Starts `uvicorn cloudysetup.envapi_app.main:app` with the stand-in in
+fake_aws.py as its AWS client hook, drives each endpoint with concurrent
+clients for a fixed time and reports throughput, p50/p95/p99 latency, errors and the peak
+RSS of every worker. Results are written as JSON; pass an earlier result to
+--compare to flag throughput or p95 regressions beyond --tolerance, in which
+case the script exits with status 1.
+
+    python benchmarks/bench_load.py [--workers N] [--concurrency N]
+        [--duration S] [--scenarios a,b] [--compare results/load-....json]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+RESULTS_VERSION = 1
+
+HEADERS = {"aws-access-key": "bench-access-key", "aws-secret-key": "bench-secret"}
+TYPE_NAME = "AWS::SNS::Topic"
+SEED_RESOURCES = 100
+
+
+def seeded(i):
+    return f"topic-seed-{i % SEED_RESOURCES:04d}"
+
+
+def patch(i):
+    return json.dumps([{"op": "add", "path": "/DisplayName", "value": f"v{i}"}])
+
+
+# name -> (path, payload for the i-th request, whether the response streams)
+SCENARIOS = {
+    "generate-template": (
+        "/generate-template",
+        lambda run, i: {"prompt": f"Create an SNS topic {run}-{i}"},
+        False,
+    ),
+    "generate-template-single": (
+        "/generate-template",
+        lambda run, i: {"prompt": f"Create an SNS topic {run}-{i}", "mode": "single"},
+        False,
+    ),
+    "generate-template-stream": (
+        "/generate-template/stream",
+        lambda run, i: {"prompt": f"Create an SNS topic {run}-{i}"},
+        True,
+    ),
+    "create-resource": (
+        "/create-resource",
+        lambda run, i: {
+            "TypeName": TYPE_NAME,
+            "Properties": {"TopicName": f"{run}-{i}"},
+        },
+        False,
+    ),
+    "read-resource": (
+        "/read-resource",
+        lambda run, i: {"TypeName": TYPE_NAME, "Identifier": seeded(i)},
+        False,
+    ),
+    "update-resource": (
+        "/update-resource",
+        lambda run, i: {
+            "TypeName": TYPE_NAME,
+            "Identifier": seeded(i),
+            "PatchDocument": patch(i),
+        },
+        False,
+    ),
+    "delete-resource": (
+        "/delete-resource",
+        lambda run, i: {"TypeName": TYPE_NAME, "Identifier": f"{run}-gone-{i}"},
+        False,
+    ),
+    "list-resource": ("/list-resource", lambda run, i: {"TypeName": TYPE_NAME}, True),
+    "resource-status": (
+        "/resource-status",
+        lambda run, i: {"request_token": REQUEST_TOKENS[i % len(REQUEST_TOKENS)]},
+        False,
+    ),
+    # What `cloudysetup-cli monitor --all` asks for.
+    "resource-requests": (
+        "/resource-requests",
+        lambda run, i: {"operation_statuses": ["PENDING", "IN_PROGRESS"]},
+        False,
+    ),
+    "batch": (
+        "/batch",
+        lambda run, i: {
+            "Operations": [
+                {
+                    "Operation": "create",
+                    "TypeName": TYPE_NAME,
+                    "Properties": {"TopicName": f"{run}-{i}-{n}"},
+                }
+                for n in range(10)
+            ]
+        },
+        False,
+    ),
+    "plan": (
+        "/plan",
+        lambda run, i: {
+            "Resources": [
+                {
+                    "TypeName": TYPE_NAME,
+                    "Identifier": seeded(i * 5 + n),
+                    "Properties": {"DisplayName": f"v{i}"},
+                }
+                for n in range(5)
+            ]
+        },
+        False,
+    ),
+}
+
+# Filled by setup() with tokens to look up in the resource-status scenario.
+REQUEST_TOKENS = []
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, port):
+    env = dict(os.environ)
+    env.update(
+        {
+            "PYTHONPATH": os.pathsep.join(
+                filter(None, [ROOT, BENCHMARKS_DIR, env.get("PYTHONPATH")])
+            ),
+            "AWS_CLIENT_HOOK": "fake_aws:install",
+            # Never the caller's own keys: the stand-in answers every call.
+            "AWS_ACCESS_KEY_ID": "fake-access-key",
+            "AWS_SECRET_ACCESS_KEY": "fake-secret-key",
+            "AWS_DEFAULT_REGION": "us-east-1",
+            "FAKE_AWS_LATENCY_MS": str(args.aws_latency_ms),
+            "FAKE_BEDROCK_LATENCY_MS": str(args.bedrock_latency_ms),
+            "FAKE_AWS_THROTTLE_RATE": str(args.throttle_rate),
+            "FAKE_AWS_OPERATION_SECONDS": str(args.operation_seconds),
+            "FAKE_AWS_SEED_RESOURCES": str(SEED_RESOURCES),
+            "RATE_LIMIT_ENABLED": "0",
+            "SCHEMA_OFFLINE": "1",
+            "LOG_LEVEL": "WARNING",
+        }
+    )
+    command = [sys.executable, "-m", "uvicorn", "cloudysetup.envapi_app.main:app"]
+    command += ["--port", str(port), "--workers", str(args.workers)]
+    command += ["--log-level", "warning"]
+    server = subprocess.Popen(command, cwd=ROOT, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit(f"Server exited with status {server.returncode}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return server
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    server.terminate()
+    sys.exit("Server did not start within 30 seconds")
+
+
+def worker_pids(server_pid):
+    """The processes serving requests: uvicorn's workers, or the server itself."""
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == server_pid and b"resource_tracker" not in cmdline:
+            children.append(int(entry))
+    return sorted(children) or [server_pid]
+
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class MemorySampler(threading.Thread):
+    """Peak RSS of each worker while a scenario runs (Linux /proc only)."""
+
+    def __init__(self, pids, interval=0.2):
+        super().__init__(daemon=True)
+        self.pids = pids
+        self.interval = interval
+        self.peaks = {}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            for pid in self.pids:
+                rss = rss_mb(pid)
+                if rss is not None:
+                    self.peaks[pid] = max(rss, self.peaks.get(pid, 0))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return [round(self.peaks[pid], 1) for pid in sorted(self.peaks)]
+
+
+def send(session, base_url, path, payload, stream):
+    response = session.post(
+        base_url + path, json=payload, headers=HEADERS, stream=stream, timeout=120
+    )
+    if stream:
+        for _ in response.iter_content(chunk_size=None):
+            pass
+    response.close()
+    return response.status_code
+
+
+def run_scenario(name, base_url, run_id, args, pids):
+    path, payload, stream = SCENARIOS[name]
+    counter = itertools.count()
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    measuring = threading.Event()
+    stop = threading.Event()
+
+    def client():
+        session = requests.Session()
+        while not stop.is_set():
+            i = next(counter)
+            started = time.perf_counter()
+            try:
+                status = send(session, base_url, path, payload(run_id, i), stream)
+            except requests.RequestException:
+                status = "exception"
+            elapsed = (time.perf_counter() - started) * 1000
+            if measuring.is_set():
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    threads = [threading.Thread(target=client) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.warmup)
+    sampler = MemorySampler(pids)
+    sampler.start()
+    measuring.set()
+    started = time.perf_counter()
+    time.sleep(args.duration)
+    measuring.clear()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join()
+    memory = sampler.stop()
+    return summarise(latencies, statuses, elapsed, memory)
+
+
+def summarise(latencies, statuses, elapsed, memory):
+    count = len(latencies)
+    errors = count - statuses.get("200", 0)
+    result = {
+        "requests": count,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else None,
+        "throughput_rps": round(count / elapsed, 2),
+        "status_codes": statuses,
+        "memory_mb_per_worker": memory,
+    }
+    if count >= 2:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        result["latency_ms"] = {
+            "mean": round(statistics.fmean(latencies), 2),
+            "p50": round(cuts[49], 2),
+            "p95": round(cuts[94], 2),
+            "p99": round(cuts[98], 2),
+            "max": round(max(latencies), 2),
+        }
+    return result
+
+
+def setup(base_url, run_id):
+    """Submit a few requests for the resource-status scenario to look up."""
+    session = requests.Session()
+    for i in range(20):
+        response = session.post(
+            base_url + "/create-resource",
+            json={"TypeName": TYPE_NAME, "Properties": {"TopicName": f"{run_id}-s{i}"}},
+            headers=HEADERS,
+        )
+        response.raise_for_status()
+        REQUEST_TOKENS.append(
+            response.json()["details"]["ProgressEvent"]["RequestToken"]
+        )
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Settings that must match for two results to be comparable.
+COMPARABLE_SETTINGS = (
+    "workers",
+    "concurrency",
+    "duration",
+    "aws_latency_ms",
+    "bedrock_latency_ms",
+    "throttle_rate",
+    "operation_seconds",
+)
+
+
+def compare(baseline, current, tolerance):
+    """Print the change per scenario and return the regressed scenario names."""
+    for setting in COMPARABLE_SETTINGS:
+        before = baseline["settings"].get(setting)
+        after = current["settings"].get(setting)
+        if before != after:
+            print(f"warning: {setting} differs ({before} -> {after})")
+
+    regressions = []
+    print(
+        f"\n{'scenario':<26} {'rps before':>11} {'rps now':>9} {'change':>8}"
+        f" {'p95 before':>11} {'p95 now':>9} {'change':>8}"
+    )
+    for name, result in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None or "latency_ms" not in before or "latency_ms" not in result:
+            continue
+        rps_change = result["throughput_rps"] / before["throughput_rps"] - 1
+        p95_change = result["latency_ms"]["p95"] / before["latency_ms"]["p95"] - 1
+        regressed = (
+            rps_change < -tolerance
+            or p95_change > tolerance
+            or (result["error_rate"] or 0) > (before["error_rate"] or 0) + 0.01
+        )
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:<26} {before['throughput_rps']:>11.1f} {result['throughput_rps']:>9.1f}"
+            f" {rps_change:>+8.1%} {before['latency_ms']['p95']:>11.1f}"
+            f" {result['latency_ms']['p95']:>9.1f} {p95_change:>+8.1%}"
+            + ("  REGRESSED" if regressed else "")
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds measured")
+    parser.add_argument("--warmup", type=float, default=2, help="Seconds not measured")
+    parser.add_argument(
+        "--scenarios",
+        default=",".join(SCENARIOS),
+        help="Comma-separated scenarios to run",
+    )
+    parser.add_argument("--aws-latency-ms", type=float, default=30)
+    parser.add_argument("--bedrock-latency-ms", type=float, default=800)
+    parser.add_argument("--throttle-rate", type=float, default=0)
+    parser.add_argument("--operation-seconds", type=float, default=2)
+    parser.add_argument(
+        "--output", help="Result file (default: results/load-<time>.json)"
+    )
+    parser.add_argument("--compare", help="Earlier result file to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    server = start_server(args, port)
+    try:
+        pids = worker_pids(server.pid)
+        setup(base_url, run_id)
+        scenarios = {}
+        for name in names:
+            result = run_scenario(name, base_url, run_id, args, pids)
+            scenarios[name] = result
+            latency = result.get("latency_ms", {})
+            print(
+                f"{name:<26} {result['throughput_rps']:>8.1f} req/s"
+                f"  p50 {latency.get('p50', 0):>8.1f} ms"
+                f"  p95 {latency.get('p95', 0):>8.1f} ms"
+                f"  p99 {latency.get('p99', 0):>8.1f} ms"
+                f"  errors {result['errors']:>4}"
+                f"  rss/worker {result['memory_mb_per_worker']} MB"
+            )
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    settings = {key: value for key, value in vars(args).items()}
+    for key in ("output", "compare", "scenarios"):
+        settings.pop(key)
+    results = {
+        "version": RESULTS_VERSION,
+        "run_id": run_id,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": settings,
+        "scenarios": scenarios,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{run_id}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {os.path.relpath(output)}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.tolerance)
+        if regressions:
+            print("Regressed: " + ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,623 @@
+"""In-memory stand-in for the AWS APIs the service calls, for load tests.
+
+Loaded into the API service through its client hook, e.g. by
+bench_load.py:
+
+    PYTHONPATH=.:benchmarks AWS_CLIENT_HOOK=fake_aws:install uvicorn ...
+
+Every Cloud Control, CloudFormation and Bedrock call is then answered from
+memory. The stand-in sits where the HTTP request would be sent, so parameter
+validation, signing, retries, response parsing and the metrics hooks all run
+as they do against AWS.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import random
+import struct
+import threading
+import time
+import uuid
+from binascii import crc32
+from collections import OrderedDict, deque
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import escape
+
+from botocore.awsrequest import AWSResponse
+
+from cloudysetup.envapi_app.metrics import stats_collector
+from cloudysetup.envapi_app.schema_registry import BUNDLED_SCHEMA_DIR
+
+FAKE_AWS_LATENCY_MS = float(os.getenv("FAKE_AWS_LATENCY_MS", "30"))
+FAKE_AWS_JITTER_MS = float(os.getenv("FAKE_AWS_JITTER_MS", "10"))
+# Share of calls answered with a throttling error, which botocore retries.
+FAKE_AWS_THROTTLE_RATE = float(os.getenv("FAKE_AWS_THROTTLE_RATE", "0"))
+# Share of create, update and delete requests that end FAILED.
+FAKE_AWS_FAILURE_RATE = float(os.getenv("FAKE_AWS_FAILURE_RATE", "0"))
+# How long a request stays IN_PROGRESS before it reaches its final status.
+FAKE_AWS_OPERATION_SECONDS = float(os.getenv("FAKE_AWS_OPERATION_SECONDS", "2"))
+# Resources every type starts with, the same in every worker.
+FAKE_AWS_SEED_RESOURCES = int(os.getenv("FAKE_AWS_SEED_RESOURCES", "100"))
+FAKE_AWS_PAGE_SIZE = int(os.getenv("FAKE_AWS_PAGE_SIZE", "50"))
+FAKE_AWS_MAX_REQUESTS = int(os.getenv("FAKE_AWS_MAX_REQUESTS", "10000"))
+FAKE_BEDROCK_LATENCY_MS = float(os.getenv("FAKE_BEDROCK_LATENCY_MS", "800"))
+FAKE_BEDROCK_CHUNK_MS = float(os.getenv("FAKE_BEDROCK_CHUNK_MS", "20"))
+
+SCHEMA_DIR = BUNDLED_SCHEMA_DIR
+TERMINAL_STATUSES = ("SUCCESS", "FAILED", "CANCEL_COMPLETE")
+# Which bodies are asked for, told apart by the prompts in cloudcontrol_client.
+SUGGESTIONS_PROMPT_PREFIX = "Create a suggested changes"
+COMBINED_PROMPT_MARKER = '{"template":'
+
+
+class FakeError(Exception):
+    def __init__(self, code: str, message: str, status: int = 400):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+
+
+def type_slug(type_name: str):
+    return type_name.split("::")[-1].lower()
+
+
+def seed_identifier(type_name: str, index: int):
+    return f"{type_slug(type_name)}-seed-{index:04d}"
+
+
+def resolve_pointer(document, path: str):
+    """The container and key a JSON Pointer's last token refers to."""
+    tokens = [
+        token.replace("~1", "/").replace("~0", "~") for token in path.split("/")[1:]
+    ]
+    if not tokens:
+        raise FakeError("InvalidRequestException", "Cannot patch the whole document")
+    parent = document
+    for token in tokens[:-1]:
+        parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+    return parent, tokens[-1]
+
+
+def apply_patch(document: dict, operations: list):
+    """Apply RFC 6902 operations to a copy of the document."""
+    document = json.loads(json.dumps(document))
+    for operation in operations:
+        op = operation.get("op")
+        try:
+            if op in ("move", "copy"):
+                parent, key = resolve_pointer(document, operation["from"])
+                value = parent[int(key)] if isinstance(parent, list) else parent[key]
+                if op == "move":
+                    del parent[int(key) if isinstance(parent, list) else key]
+                operation = {"op": "add", "path": operation["path"], "value": value}
+                op = "add"
+            parent, key = resolve_pointer(document, operation["path"])
+            if isinstance(parent, list):
+                index = len(parent) if key == "-" else int(key)
+                if op == "add":
+                    parent.insert(index, operation["value"])
+                elif op == "remove":
+                    del parent[index]
+                elif op == "replace":
+                    parent[index] = operation["value"]
+                elif op == "test" and parent[index] != operation["value"]:
+                    raise ValueError("test failed")
+            elif op == "add" or op == "replace":
+                if op == "replace" and key not in parent:
+                    raise KeyError(key)
+                parent[key] = operation["value"]
+            elif op == "remove":
+                del parent[key]
+            elif op == "test" and parent.get(key) != operation["value"]:
+                raise ValueError("test failed")
+        except (KeyError, IndexError, ValueError, TypeError) as e:
+            raise FakeError(
+                "InvalidRequestException",
+                f"Cannot apply {op} at {operation.get('path')}: {e}",
+            )
+    return document
+
+
+def encode_request_token(record: dict):
+    """Tokens carry the request itself, so every worker can report its status."""
+    payload = json.dumps(record, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def decode_request_token(request_token: str):
+    try:
+        return json.loads(base64.urlsafe_b64decode(request_token.encode("ascii")))
+    except ValueError:
+        raise FakeError(
+            "RequestTokenNotFoundException",
+            f"Request with token {request_token} was not found",
+        )
+
+
+class FakeCloudControl:
+    """Resources and requests of the fake Cloud Control API in one region.
+
+    Requests stay IN_PROGRESS for FAKE_AWS_OPERATION_SECONDS and then end
+    SUCCESS (or FAILED, at FAKE_AWS_FAILURE_RATE). Their status is decoded
+    from the request token, while resources live in the worker that created
+    them on top of the seeded ones every worker shares.
+    """
+
+    def __init__(self, region: str, rng: random.Random):
+        self.region = region
+        self.rng = rng
+        self.resources = {}
+        self.requests = OrderedDict()
+        # Requests of this worker not applied yet, in the order they finish.
+        self.pending = deque()
+        self.client_tokens = {}
+        self.cancelled = set()
+        self._lock = threading.Lock()
+
+    def _type_resources(self, type_name: str):
+        resources = self.resources.get(type_name)
+        if resources is None:
+            resources = OrderedDict(
+                (
+                    seed_identifier(type_name, index),
+                    {"Name": seed_identifier(type_name, index)},
+                )
+                for index in range(FAKE_AWS_SEED_RESOURCES)
+            )
+            self.resources[type_name] = resources
+        return resources
+
+    def _status(self, request_token: str, record: dict):
+        if request_token in self.cancelled:
+            return "CANCEL_COMPLETE"
+        if time.time() - record["t"] < FAKE_AWS_OPERATION_SECONDS:
+            return "IN_PROGRESS"
+        local = self.requests.get(request_token)
+        if record["f"] or (local is not None and "error" in local):
+            return "FAILED"
+        return "SUCCESS"
+
+    def _apply(self, request_token: str, local: dict):
+        """Carry out a finished request of this worker on its resources."""
+        record = local["record"]
+        if request_token in self.cancelled or record["f"]:
+            return
+        resources = self._type_resources(record["n"])
+        identifier = record["i"]
+        if record["o"] == "CREATE":
+            if identifier in resources:
+                local["error"] = ("AlreadyExists", f"{identifier} already exists")
+            else:
+                resources[identifier] = local["properties"]
+        elif identifier not in resources:
+            local["error"] = ("NotFound", f"{identifier} was not found")
+        elif record["o"] == "UPDATE":
+            try:
+                resources[identifier] = apply_patch(
+                    resources[identifier], local["patch"]
+                )
+            except FakeError as e:
+                local["error"] = ("InvalidRequest", e.message)
+        else:
+            del resources[identifier]
+
+    def _settle_due(self):
+        now = time.time()
+        while self.pending:
+            request_token = self.pending[0]
+            local = self.requests.get(request_token)
+            if local is not None:
+                if now - local["record"]["t"] < FAKE_AWS_OPERATION_SECONDS:
+                    return
+                self._apply(request_token, local)
+            self.pending.popleft()
+
+    def _progress_event(self, request_token: str, record: dict):
+        status = self._status(request_token, record)
+        event = {
+            "TypeName": record["n"],
+            "Identifier": record["i"],
+            "RequestToken": request_token,
+            "Operation": record["o"],
+            "OperationStatus": status,
+            "EventTime": record["t"],
+        }
+        if status == "FAILED":
+            local = self.requests.get(request_token) or {}
+            code, message = local.get(
+                "error",
+                ("ServiceInternalError", "The fake backend failed this request"),
+            )
+            event["ErrorCode"] = code
+            event["StatusMessage"] = message
+        elif status == "SUCCESS" and record["o"] != "DELETE":
+            properties = self._type_resources(record["n"]).get(record["i"])
+            if properties is not None:
+                event["ResourceModel"] = json.dumps(properties)
+        return event
+
+    def _submit(self, operation: str, type_name: str, identifier: str, params, **local):
+        client_token = params.get("ClientToken")
+        if client_token and client_token in self.client_tokens:
+            request_token = self.client_tokens[client_token]
+            if request_token in self.requests:
+                record = self.requests[request_token]["record"]
+                return {"ProgressEvent": self._progress_event(request_token, record)}
+        record = {
+            "o": operation,
+            "n": type_name,
+            "i": identifier,
+            "t": round(time.time(), 3),
+            "f": self.rng.random() < FAKE_AWS_FAILURE_RATE,
+            "u": uuid.uuid4().hex[:8],
+        }
+        request_token = encode_request_token(record)
+        self.requests[request_token] = {"record": record, **local}
+        self.pending.append(request_token)
+        while len(self.requests) > FAKE_AWS_MAX_REQUESTS:
+            self.requests.popitem(last=False)
+        if client_token:
+            self.client_tokens[client_token] = request_token
+            while len(self.client_tokens) > FAKE_AWS_MAX_REQUESTS:
+                del self.client_tokens[next(iter(self.client_tokens))]
+        return {"ProgressEvent": self._progress_event(request_token, record)}
+
+    def _existing(self, type_name: str, identifier: str):
+        properties = self._type_resources(type_name).get(identifier)
+        if properties is None:
+            raise FakeError(
+                "ResourceNotFoundException",
+                f"{type_name} with identifier {identifier} was not found",
+            )
+        return properties
+
+    def call(self, operation: str, params: dict):
+        with self._lock:
+            self._settle_due()
+            return getattr(self, operation)(params)
+
+    def CreateResource(self, params):
+        type_name = params["TypeName"]
+        digest = hashlib.sha1(
+            (params.get("ClientToken") or uuid.uuid4().hex).encode("utf-8")
+        ).hexdigest()
+        identifier = f"{type_slug(type_name)}-{digest[:12]}"
+        properties = json.loads(params["DesiredState"])
+        return self._submit(
+            "CREATE", type_name, identifier, params, properties=properties
+        )
+
+    # Like Cloud Control, a missing resource fails the request rather than
+    # the call.
+    def UpdateResource(self, params):
+        patch = json.loads(params["PatchDocument"])
+        return self._submit(
+            "UPDATE", params["TypeName"], params["Identifier"], params, patch=patch
+        )
+
+    def DeleteResource(self, params):
+        return self._submit("DELETE", params["TypeName"], params["Identifier"], params)
+
+    def GetResource(self, params):
+        properties = self._existing(params["TypeName"], params["Identifier"])
+        return {
+            "TypeName": params["TypeName"],
+            "ResourceDescription": {
+                "Identifier": params["Identifier"],
+                "Properties": json.dumps(properties),
+            },
+        }
+
+    def ListResources(self, params):
+        resources = list(self._type_resources(params["TypeName"]).items())
+        start = int(params.get("NextToken") or 0)
+        end = start + min(params.get("MaxResults") or FAKE_AWS_PAGE_SIZE, 100)
+        response = {
+            "TypeName": params["TypeName"],
+            "ResourceDescriptions": [
+                {"Identifier": identifier, "Properties": json.dumps(properties)}
+                for identifier, properties in resources[start:end]
+            ],
+        }
+        if end < len(resources):
+            response["NextToken"] = str(end)
+        return response
+
+    def GetResourceRequestStatus(self, params):
+        request_token = params["RequestToken"]
+        record = decode_request_token(request_token)
+        return {"ProgressEvent": self._progress_event(request_token, record)}
+
+    def CancelResourceRequest(self, params):
+        request_token = params["RequestToken"]
+        record = decode_request_token(request_token)
+        if self._status(request_token, record) in TERMINAL_STATUSES:
+            raise FakeError(
+                "RequestTokenNotFoundException", "The request has already finished"
+            )
+        self.cancelled.add(request_token)
+        return {"ProgressEvent": self._progress_event(request_token, record)}
+
+    def ListResourceRequests(self, params):
+        status_filter = params.get("ResourceRequestStatusFilter") or {}
+        statuses = status_filter.get("OperationStatuses")
+        operations = status_filter.get("Operations")
+        summaries = []
+        for request_token, local in reversed(self.requests.items()):
+            event = self._progress_event(request_token, local["record"])
+            if statuses and event["OperationStatus"] not in statuses:
+                continue
+            if operations and event["Operation"] not in operations:
+                continue
+            summaries.append(event)
+        start = int(params.get("NextToken") or 0)
+        end = start + min(params.get("MaxResults") or FAKE_AWS_PAGE_SIZE, 100)
+        response = {"ResourceRequestStatusSummaries": summaries[start:end]}
+        if end < len(summaries):
+            response["NextToken"] = str(end)
+        return response
+
+
+def model_reply(prompt: str):
+    """A canned reply in the shape the prompt asks for, wrapped in prose."""
+    name = "topic-" + hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+    template = {
+        "TypeName": "AWS::SNS::Topic",
+        "Properties": {"TopicName": name, "DisplayName": name},
+        "Metadata": {"Operation": "create"},
+    }
+    suggestions = [
+        "Use a TopicName that describes what the topic is for",
+        "Set a DisplayName that subscribers will recognise",
+    ]
+    if prompt.startswith(SUGGESTIONS_PROMPT_PREFIX):
+        body = suggestions
+    elif COMBINED_PROMPT_MARKER in prompt:
+        body = {"template": template, "suggestions": suggestions}
+    else:
+        body = template
+    return f"Here is the result:\n\n{json.dumps(body, indent=2)}\n\nReplace the names as needed."
+
+
+def model_prompt(body: bytes):
+    request = json.loads(body)
+    return "".join(
+        part.get("text", "")
+        for message in request.get("messages", [])
+        for part in message.get("content", [])
+    )
+
+
+def encode_event(payload: dict):
+    """One application/vnd.amazon.eventstream "chunk" event."""
+    headers = b""
+    for name, value in (
+        (":event-type", "chunk"),
+        (":content-type", "application/json"),
+        (":message-type", "event"),
+    ):
+        name, value = name.encode("utf-8"), value.encode("utf-8")
+        headers += struct.pack("!B", len(name)) + name
+        headers += struct.pack("!BH", 7, len(value)) + value
+    body = json.dumps(
+        {"bytes": base64.b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")}
+    ).encode("utf-8")
+    prelude = struct.pack("!II", 12 + len(headers) + len(body) + 4, len(headers))
+    prelude += struct.pack("!I", crc32(prelude) & 0xFFFFFFFF)
+    message = prelude + headers + body
+    return message + struct.pack("!I", crc32(message) & 0xFFFFFFFF)
+
+
+class FakeRawResponse:
+    """The part of a urllib3 response botocore reads bodies through."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def stream(self, amt=1024, decode_content=None):
+        if self._buffer:
+            yield self._buffer
+            self._buffer = b""
+        yield from self._chunks
+
+    def read(self, amt=None):
+        while amt is None or len(self._buffer) < amt:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if amt is None:
+            amt = len(self._buffer)
+        data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        return data
+
+    def close(self):
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            close()
+
+
+class FakeAws:
+    """Answers boto3 requests through the client's before-send event."""
+
+    def __init__(self, seed: int = None):
+        self.rng = random.Random(seed)
+        self.regions = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.throttled = 0
+
+    def cloudcontrol(self, region: str):
+        with self._lock:
+            backend = self.regions.get(region)
+            if backend is None:
+                backend = self.regions[region] = FakeCloudControl(region, self.rng)
+            return backend
+
+    def install(self, client):
+        client.meta.events.register("before-send", self.handle)
+        return client
+
+    def _sleep(self, milliseconds: float):
+        jitter = self.rng.uniform(0, FAKE_AWS_JITTER_MS)
+        time.sleep(max(0.0, milliseconds + jitter) / 1000)
+
+    def handle(self, request, event_name, **kwargs):
+        _, service, operation = event_name.split(".", 2)
+        self.calls += 1
+        self._sleep(
+            FAKE_BEDROCK_LATENCY_MS
+            if operation == "InvokeModel"
+            else FAKE_AWS_LATENCY_MS
+        )
+        throttle = self.rng.random() < FAKE_AWS_THROTTLE_RATE
+        if throttle:
+            self.throttled += 1
+        if service == "cloudcontrol":
+            return self._cloudcontrol(request, operation, throttle)
+        if service == "bedrock-runtime":
+            return self._bedrock(request, operation, throttle)
+        if service == "cloudformation":
+            return self._cloudformation(request, operation, throttle)
+        return None
+
+    def _cloudcontrol(self, request, operation, throttle):
+        headers = {
+            "Content-Type": "application/x-amz-json-1.0",
+            "x-amzn-RequestId": str(uuid.uuid4()),
+        }
+        try:
+            if throttle:
+                raise FakeError("ThrottlingException", "Rate exceeded")
+            # https://cloudcontrolapi.<region>.amazonaws.com
+            region = urlsplit(request.url).hostname.split(".")[1]
+            params = json.loads(request.body or b"{}")
+            body, status = self.cloudcontrol(region).call(operation, params), 200
+        except FakeError as e:
+            body, status = {"__type": e.code, "Message": e.message}, e.status
+        raw = FakeRawResponse([json.dumps(body).encode("utf-8")])
+        return AWSResponse(request.url, status, headers, raw)
+
+    def _bedrock(self, request, operation, throttle):
+        headers = {"x-amzn-RequestId": str(uuid.uuid4())}
+        if throttle:
+            headers["x-amzn-ErrorType"] = "ThrottlingException"
+            body = json.dumps({"message": "Too many requests"}).encode("utf-8")
+            return AWSResponse(request.url, 429, headers, FakeRawResponse([body]))
+
+        prompt = model_prompt(request.body)
+        text = model_reply(prompt)
+        usage = {"input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4}
+        if operation == "InvokeModel":
+            headers["Content-Type"] = "application/json"
+            body = {
+                "id": f"msg_{uuid.uuid4().hex[:24]}",
+                "type": "message",
+                "role": "assistant",
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "usage": usage,
+            }
+            raw = FakeRawResponse([json.dumps(body).encode("utf-8")])
+            return AWSResponse(request.url, 200, headers, raw)
+
+        headers["Content-Type"] = "application/vnd.amazon.eventstream"
+        headers["X-Amzn-Bedrock-Content-Type"] = "application/json"
+        return AWSResponse(
+            request.url, 200, headers, FakeRawResponse(self._stream_events(text, usage))
+        )
+
+    def _stream_events(self, text: str, usage: dict):
+        yield encode_event(
+            {
+                "type": "message_start",
+                "message": {
+                    "role": "assistant",
+                    "usage": {
+                        "input_tokens": usage["input_tokens"],
+                        "output_tokens": 1,
+                    },
+                },
+            }
+        )
+        yield encode_event({"type": "content_block_start", "index": 0})
+        for start in range(0, len(text), 16):
+            time.sleep(FAKE_BEDROCK_CHUNK_MS / 1000)
+            yield encode_event(
+                {
+                    "type": "content_block_delta",
+                    "index": 0,
+                    "delta": {"type": "text_delta", "text": text[start : start + 16]},
+                }
+            )
+        yield encode_event({"type": "content_block_stop", "index": 0})
+        yield encode_event(
+            {
+                "type": "message_delta",
+                "delta": {"stop_reason": "end_turn"},
+                "usage": {"output_tokens": usage["output_tokens"]},
+            }
+        )
+        yield encode_event({"type": "message_stop"})
+
+    def _cloudformation(self, request, operation, throttle):
+        headers = {"Content-Type": "text/xml", "x-amzn-RequestId": str(uuid.uuid4())}
+        params = {
+            key: values[0]
+            for key, values in parse_qs((request.body or b"").decode("utf-8")).items()
+        }
+        schema = None
+        if operation == "DescribeType" and not throttle:
+            file_name = params.get("TypeName", "").lower().replace("::", "-") + ".json"
+            try:
+                with open(os.path.join(SCHEMA_DIR, file_name)) as f:
+                    schema = f.read()
+            except OSError:
+                pass
+        if schema is None:
+            code, status = (
+                ("Throttling", 400) if throttle else ("TypeNotFoundException", 404)
+            )
+            body = (
+                "<ErrorResponse><Error><Type>Sender</Type>"
+                f"<Code>{code}</Code><Message>{code}</Message></Error>"
+                f"<RequestId>{headers['x-amzn-RequestId']}</RequestId></ErrorResponse>"
+            )
+        else:
+            status = 200
+            body = (
+                '<DescribeTypeResponse xmlns="http://cloudformation.amazonaws.com/doc/2010-05-15/">'
+                "<DescribeTypeResult>"
+                f"<TypeName>{escape(params['TypeName'])}</TypeName>"
+                "<DefaultVersionId>00000001</DefaultVersionId>"
+                f"<Schema>{escape(schema)}</Schema>"
+                "</DescribeTypeResult>"
+                f"<ResponseMetadata><RequestId>{headers['x-amzn-RequestId']}</RequestId>"
+                "</ResponseMetadata></DescribeTypeResponse>"
+            )
+        raw = FakeRawResponse([body.encode("utf-8")])
+        return AWSResponse(request.url, status, headers, raw)
+
+    def stats(self):
+        with self._lock:
+            regions = dict(self.regions)
+        return {
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "requests": {
+                region: len(backend.requests) for region, backend in regions.items()
+            },
+        }
+
+
+fake_aws = FakeAws()
+stats_collector.register("fake_aws", fake_aws.stats)
+
+
+def install(client):
+    """The AWS_CLIENT_HOOK entry point: answer the client's calls from memory."""
+    return fake_aws.install(client)
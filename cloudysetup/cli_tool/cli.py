@@ -1,21 +1,62 @@
 import click
-import requests
 import json
 import time
 import random
-import boto3
-from dotenv import load_dotenv
 import os
-from rich.console import Console
-from rich.progress import Progress, SpinnerColumn, TimeElapsedColumn, TextColumn
-from rich.table import Table
 from datetime import datetime
+from functools import lru_cache
 
-load_dotenv()
-console = Console()
+from .credential_cache import resolve_credentials
 
+# Heavy dependencies (boto3, requests, rich renderables) are imported by the
+# commands that use them so that `cloudysetup-cli --help` starts quickly.
 
-BASE_URL = os.getenv("BASE_URL")
+STATE_FILE = os.path.join(os.path.expanduser("~"), ".cloudysetup_state.json")
+STATE_DB = os.getenv(
+    "CLOUDYSETUP_STATE_DB",
+    os.path.join(os.path.expanduser("~"), ".cloudysetup_state.db"),
+)
+
+_api = None
+_console = None
+_state_store = None
+
+
+def get_console():
+    global _console
+    if _console is None:
+        from rich.console import Console
+
+        _console = Console()
+    return _console
+
+
+class LazyConsole:
+    """Stands in for the rich Console until something is printed"""
+
+    def __getattr__(self, name):
+        return getattr(get_console(), name)
+
+
+console = LazyConsole()
+
+
+@lru_cache(maxsize=None)
+def get_base_url():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return os.getenv("BASE_URL")
+
+
+def get_api():
+    """Shared API client so every request of a command reuses one pooled connection"""
+    global _api
+    if _api is None:
+        from .http_client import ApiClient
+
+        _api = ApiClient(get_base_url())
+    return _api
 
 
 def find_project_root():
@@ -29,14 +70,103 @@ def find_project_root():
         current_dir = parent_dir
 
 
-# ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-ROOT_DIR = find_project_root()
-RESOURCES_DIR = os.path.join(ROOT_DIR, "resources")
-STATE_FILE = os.path.join(os.path.expanduser("~"), ".cloudysetup_state.json")
+@lru_cache(maxsize=None)
+def resources_dir():
+    """Project-level resources directory, looked up on first use"""
+    return os.path.join(find_project_root(), "resources")
+
+
+def aws_headers(profile):
+    """Resolve AWS credentials for the profile into the API's credential headers
+
+    Temporary credentials are cached in STATE_FILE until shortly before they
+    expire, so SSO and assume-role profiles are not resolved on every command.
+    """
+    ctx = click.get_current_context(silent=True)
+    refresh = bool(ctx and ctx.find_root().params.get("refresh_credentials"))
+    access_key, secret_key, token = resolve_credentials(STATE_FILE, profile, refresh)
+    return {
+        "aws-access-key": access_key,
+        "aws-secret-key": secret_key,
+        "aws-session-token": token,
+    }
+
+
+def progress_spinner(message):
+    from rich.progress import Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
+
+    return Progress(
+        SpinnerColumn(),
+        TextColumn(message),
+        TimeElapsedColumn(),
+        console=get_console(),
+    )
+
+
+def region_option(**kwargs):
+    """--region, defaulting to the AWS CLI environment and then the server's region"""
+    return click.option(
+        "--region",
+        envvar=["AWS_REGION", "AWS_DEFAULT_REGION"],
+        default=None,
+        **kwargs,
+    )
+
+
+def region_query(regions):
+    """Status query fields for one region or a fan-out over several"""
+    regions = [region for region in regions if region]
+    if len(regions) > 1:
+        return {"regions": regions}
+    return {"region": regions[0]} if regions else {}
+
+
+def get_state_store():
+    """Local index of managed resources, or None when CLOUDYSETUP_STATE_DB is empty"""
+    global _state_store
+    if _state_store is None and STATE_DB:
+        from .state_store import StateStore
+
+        _state_store = StateStore(STATE_DB)
+    return _state_store
+
+
+def update_state(method, *args, **kwargs):
+    """Record in the local state index; a broken index never fails a command"""
+    import sqlite3
+
+    try:
+        store = get_state_store()
+        if store is not None:
+            getattr(store, method)(*args, **kwargs)
+    except sqlite3.Error as e:
+        console.print(f"[dim]State index not updated: {e}[/dim]")
+
+
+def record_submission(operation, body, result, source=None):
+    """Index an accepted create, update or delete from its API response"""
+    progress_event = result.get("details", {}).get("ProgressEvent", {})
+    if operation not in BATCH_OPERATIONS or not progress_event.get("RequestToken"):
+        return
+    update_state(
+        "record_submission",
+        operation,
+        body.get("TypeName") or progress_event.get("TypeName"),
+        progress_event["RequestToken"],
+        region=result.get("Region") or body.get("Region"),
+        identifier=progress_event.get("Identifier") or body.get("Identifier"),
+        source=os.path.abspath(source) if source else None,
+        properties=body.get("Properties") if operation == "create" else None,
+    )
 
 
 @click.group()
-def cli():
+@click.option(
+    "--refresh-credentials",
+    is_flag=True,
+    help="Resolve AWS credentials again instead of using the cached ones",
+)
+def cli(refresh_credentials):
     pass
 
 
@@ -48,7 +178,8 @@ def cli():
     help="Path to JSON configuration file",
 )
 @click.option("--profile", default=None, help="AWS CLI profile to use")
-def generate(action, profile, config_file):
+@click.option("--stream", is_flag=True, help="Stream the model output as it arrives")
+def generate(action, profile, config_file, stream):
     """Generate resource configuration and save it to a file."""
 
     if not action:
@@ -56,13 +187,7 @@ def generate(action, profile, config_file):
             "Enter the action to perform (e.g. create an S3 bucket, create a DynamoDB table)"
         )
 
-    session = boto3.Session(profile_name=profile) if profile else boto3.Session()
-    credentials = session.get_credentials()
-    headers = {
-        "aws-access-key": credentials.access_key,
-        "aws-secret-key": credentials.secret_key,
-        "aws-session-token": credentials.token if credentials.token else "",
-    }
+    headers = aws_headers(profile)
     data = {
         "prompt": f"""
             Generate a JSON configuration for AWS Cloud Control API for the operation '{action}'.
@@ -79,107 +204,388 @@ def generate(action, profile, config_file):
         """
     }
 
-    with Progress(
-        SpinnerColumn(),
-        TextColumn("Generating template with Anthropic - Claude V2 model..."),
-        TimeElapsedColumn(),
-        console=console,
+    if stream:
+        generated_template, suggestions, error = stream_template(data, headers)
+        if error:
+            console.print(f"[bold red]Error: {error}[/bold red]")
+        else:
+            save_generated_template(action, generated_template, suggestions)
+        return
+
+    with progress_spinner(
+        "Generating template with Anthropic - Claude V2 model..."
     ) as progress:
         task = progress.add_task("waiting", total=None)
-        response = requests.post(
-            f"{BASE_URL}/generate-template", json=data, headers=headers
-        )
+        response = get_api().post("/generate-template", json=data, headers=headers)
         progress.update(task, advance=1)
 
     if response.status_code == 200:
-        console.print("[bold green]Configuration generated successfully.[/bold green]")
         generated_template = response.json()["request_data"]
         suggestions = response.json().get("suggestions", [])
-        if suggestions:
-            console.print(
-                "[bold blue]Anthropic Claude model [bold cyan]suggestions:[/bold cyan][/bold blue]"
-            )
-            for suggestion in suggestions:
-                console.print(f"  - {suggestion}")
+        save_generated_template(action, generated_template, suggestions)
+
+    else:
+        console.print(
+            f"[bold red]Error: {response.status_code} - {response.json().get('detail')}[/bold red]"
+        )
 
-        if not os.path.exists(RESOURCES_DIR):
-            os.makedirs(RESOURCES_DIR)
 
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        description = action[:25].replace(" ", "_").lower()
+def stream_template(data, headers):
+    """Render the server-sent template stream, returning template, suggestions and error"""
+    from rich.live import Live
+    from rich.syntax import Syntax
+    from rich.text import Text
 
-        unique_filename = os.path.join(RESOURCES_DIR, f"{description}_{timestamp}.json")
-        with open(unique_filename, "w") as f:
-            json.dump(generated_template, f, indent=4)
+    generated_template = None
+    suggestions = []
+    error = None
+    text = ""
 
+    with get_api().post(
+        "/generate-template/stream", json=data, headers=headers, stream=True
+    ) as response:
+        if response.status_code != 200:
+            return None, [], f"{response.status_code} - {response.json().get('detail')}"
+
+        with Live(Text(""), console=get_console(), refresh_per_second=12) as live:
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event: "):
+                    event = line[len("event: ") :]
+                    continue
+                if not line.startswith("data: "):
+                    continue
+
+                payload = json.loads(line[len("data: ") :])
+                if event == "token":
+                    text += payload["text"]
+                    live.update(Text(text))
+                elif event == "template":
+                    generated_template = payload
+                    live.update(Syntax(json.dumps(payload, indent=4), "json"))
+                elif event == "suggestions":
+                    suggestions = payload
+                elif event == "error":
+                    error = payload.get("detail")
+
+    if generated_template is None and error is None:
+        error = "Stream ended before a template was generated"
+    return generated_template, suggestions, error
+
+
+def save_generated_template(action, generated_template, suggestions):
+    console.print("[bold green]Configuration generated successfully.[/bold green]")
+    if suggestions:
         console.print(
-            f"[bold blue]Configuration saved to {os.path.relpath(unique_filename)}[/bold blue]"
+            "[bold blue]Anthropic Claude model [bold cyan]suggestions:[/bold cyan][/bold blue]"
         )
+        for suggestion in suggestions:
+            console.print(f"  - {suggestion}")
+
+    if not os.path.exists(resources_dir()):
+        os.makedirs(resources_dir())
+
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    description = action[:25].replace(" ", "_").lower()
+
+    unique_filename = os.path.join(resources_dir(), f"{description}_{timestamp}.json")
+    with open(unique_filename, "w") as f:
+        json.dump(generated_template, f, indent=4)
+
+    console.print(
+        f"[bold blue]Configuration saved to {os.path.relpath(unique_filename)}[/bold blue]"
+    )
+
+
+OPERATION_ENDPOINTS = {
+    "create": "create-resource",
+    "read": "read-resource",
+    "update": "update-resource",
+    "delete": "delete-resource",
+    "list": "list-resource",
+}
+
+BATCH_OPERATIONS = ("create", "update", "delete")
+
 
+def load_templates(path):
+    """Load (source file, template) pairs from a config file, a multi-resource file or a directory"""
+    if os.path.isdir(path):
+        templates = []
+        for name in sorted(os.listdir(path)):
+            if name.endswith(".json"):
+                templates.extend(load_templates(os.path.join(path, name)))
+        return templates
+
+    with open(path, "r") as f:
+        data = json.load(f)
+
+    if isinstance(data, list):
+        items = data
+    elif "Resources" in data:
+        items = data["Resources"]
+        if isinstance(items, dict):
+            items = list(items.values())
     else:
+        items = [data]
+    return [(path, item) for item in items]
+
+
+def prepare_template(template):
+    """Split a generated template into its operation and the request body"""
+    template = dict(template)
+    # Delete the Metadata field before sending the request
+    operation = template.pop("Metadata", {}).get("Operation", "").lower()
+
+    # Convert PatchDocument list to JSON string for update operation
+    if operation == "update" and "PatchDocument" in template:
+        if not isinstance(template["PatchDocument"], str):
+            template["PatchDocument"] = json.dumps(template["PatchDocument"])
+    return operation, template
+
+
+def is_desired_state(operation, body):
+    """An update written as the desired Properties rather than a PatchDocument"""
+    return (
+        operation == "update" and "PatchDocument" not in body and "Properties" in body
+    )
+
+
+def response_error(response):
+    """The status code and detail of an error response, whatever its body"""
+    try:
+        detail = response.json().get("detail")
+    except ValueError:
+        detail = response.text[:200] or response.reason
+    return f"{response.status_code} - {detail}"
+
+
+def request_plans(bodies, headers, region=None):
+    """Diff desired configurations against the live resources, one plan per body"""
+    resources = [
+        {
+            "TypeName": body.get("TypeName"),
+            "Identifier": body.get("Identifier"),
+            "Properties": body.get("Properties", {}),
+            "Region": body.get("Region"),
+        }
+        for body in bodies
+    ]
+    import requests
+
+    try:
+        response = get_api().post(
+            "/plan", json={"Resources": resources, "Region": region}, headers=headers
+        )
+    except requests.RequestException as e:
+        console.print(f"[bold red]Error: {e}[/bold red]")
+        return None
+    if response.status_code != 200:
+        console.print(f"[bold red]Error: {response_error(response)}[/bold red]")
+        return None
+    return response.json()["plans"]
+
+
+def planned_update(body, plan):
+    """The update request for a plan: (body, None), (None, None) when unchanged or (None, error)"""
+    action = plan["Action"]
+    if action == "no-op":
+        return None, None
+    if action == "update":
+        update = {
+            key: value
+            for key, value in body.items()
+            if key in ("Operation", "TypeName", "Identifier", "Region")
+        }
+        update["PatchDocument"] = json.dumps(plan["PatchDocument"])
+        return update, None
+    if action == "create":
+        return None, f"{body.get('Identifier')} does not exist"
+    if action == "replace":
+        return None, (
+            "create-only properties would change: "
+            + ", ".join(plan["ReplacementProperties"])
+        )
+    return None, plan.get("error")
+
+
+def plan_updates(requests, headers, region=None):
+    """Turn desired-state updates into PatchDocument updates, None for unchanged ones
+
+    Takes (operation, body) pairs and returns a (body, error) pair for each,
+    or None when the plan request failed. Other requests pass through as is.
+    """
+    planned = [(body, None) for _, body in requests]
+    pending = [
+        index
+        for index, (operation, body) in enumerate(requests)
+        if is_desired_state(operation, body)
+    ]
+    if pending:
+        plans = request_plans(
+            [requests[index][1] for index in pending], headers, region
+        )
+        if plans is None:
+            return None
+        for index, plan in zip(pending, plans):
+            planned[index] = planned_update(requests[index][1], plan)
+    return planned
+
+
+def render_plans(sources, plans):
+    from rich.table import Table
+
+    styles = {
+        "create": "green",
+        "update": "yellow",
+        "no-op": "dim",
+        "replace": "red",
+        "error": "red",
+    }
+    table = Table(title="Plan")
+    table.add_column("Config File", style="cyan")
+    table.add_column("Resource Type", style="magenta")
+    table.add_column("Identifier")
+    table.add_column("Action")
+    table.add_column("Changes")
+    for source, plan in zip(sources, plans):
+        action = plan["Action"]
+        style = styles.get(action, "")
+        if action == "error":
+            changes = plan.get("error") or ""
+        elif action == "replace":
+            changes = ", ".join(plan["ReplacementProperties"])
+        else:
+            changes = ", ".join(op["path"] for op in plan.get("PatchDocument", []))
+        table.add_row(
+            os.path.relpath(source),
+            plan.get("TypeName") or "N/A",
+            plan.get("Identifier") or "",
+            f"[{style}]{action}[/{style}]",
+            changes,
+        )
+    return table
+
+
+@cli.command()
+@click.argument(
+    "config_file", required=False, type=click.Path(exists=True), metavar="CONFIG"
+)
+@click.option("--profile", default=None, help="AWS CLI profile to use")
+@region_option(help="AWS region for configurations that do not set a Region")
+@click.option("--show-patch", is_flag=True, help="Print the JSON Patch of each update")
+def plan(config_file, profile, region, show_patch):
+    """Show what applying the configurations would change, without changing anything"""
+
+    config_file = config_file or resources_dir()
+    sources = []
+    bodies = []
+    for source, template in load_templates(config_file):
+        operation, body = prepare_template(template)
+        if operation in ("create", "update") and "Properties" in body:
+            sources.append(source)
+            bodies.append(body)
+    if not bodies:
         console.print(
-            f"[bold red]Error: {response.status_code} - {response.json().get('detail')}[/bold red]"
+            f"[bold red]Error: No configurations with Properties found in {config_file}[/bold red]"
+        )
+        return
+
+    headers = aws_headers(profile)
+    with progress_spinner(f"Planning {len(bodies)} resources...") as progress:
+        task = progress.add_task("waiting", total=None)
+        plans = request_plans(bodies, headers, region)
+        progress.update(task, advance=1)
+    if plans is None:
+        return
+
+    console.print(render_plans(sources, plans))
+    if show_patch:
+        for source, plan in zip(sources, plans):
+            if plan.get("PatchDocument"):
+                console.print(f"[bold]{os.path.relpath(source)}[/bold]")
+                console.print_json(data=plan["PatchDocument"])
+
+    counts = {}
+    for plan in plans:
+        counts[plan["Action"]] = counts.get(plan["Action"], 0) + 1
+    console.print(
+        ", ".join(
+            f"{counts.get(action, 0)} to {action}"
+            for action in ("create", "update", "replace")
         )
+        + f", {counts.get('no-op', 0)} unchanged"
+        + (
+            f", [bold red]{counts['error']} failed[/bold red]"
+            if "error" in counts
+            else ""
+        )
+    )
 
 
 @cli.command()
 @click.argument("config_file", type=click.Path(exists=True))
 @click.option("--monitor", is_flag=True, help="Monitor the resource creation status")
 @click.option("--profile", default=None, help="AWS CLI profile to use")
-def apply(config_file, monitor, profile):
-    """Apply the resource configuration to AWS based on the given config file"""
-
-    session = boto3.Session(profile_name=profile) if profile else boto3.Session()
-    credentials = session.get_credentials()
-    headers = {
-        "aws-access-key": credentials.access_key,
-        "aws-secret-key": credentials.secret_key,
-        "aws-session-token": credentials.token if credentials.token else "",
-    }
-    with open(config_file, "r") as f:
-        generated_template = json.load(f)
+@click.option(
+    "--max-concurrency",
+    default=5,
+    show_default=True,
+    help="Parallel submissions when applying several resources",
+)
+@region_option(help="AWS region for configurations that do not set a Region")
+def apply(config_file, monitor, profile, max_concurrency, region):
+    """Apply the resource configuration to AWS based on the given config file or directory"""
 
-    operation = generated_template.get("Metadata", {}).get("Operation", "").lower()
+    headers = aws_headers(profile)
+    templates = load_templates(config_file)
+    if not templates:
+        console.print(
+            f"[bold red]Error: No resources found in {config_file}[/bold red]"
+        )
+        return
+    if len(templates) > 1:
+        apply_batch(templates, headers, monitor, max_concurrency, region)
+        return
 
-    # Delete the Metadata field before sending the request
-    if "Metadata" in generated_template:
-        del generated_template["Metadata"]
-
-    operations = {
-        "create": "create-resource",
-        "read": "read-resource",
-        "update": "update-resource",
-        "delete": "delete-resource",
-        "list": "list-resource",
-    }
+    operation, generated_template = prepare_template(templates[0][1])
+    if region and not generated_template.get("Regions"):
+        generated_template.setdefault("Region", region)
+    if is_desired_state(operation, generated_template):
+        planned = plan_updates([(operation, generated_template)], headers)
+        if planned is None:
+            return
+        generated_template, error = planned[0]
+        if error:
+            console.print(f"[bold red]Error: {error}[/bold red]")
+            return
+        if generated_template is None:
+            console.print(
+                "[bold green]No changes: the resource already matches the configuration.[/bold green]"
+            )
+            return
+        console.print_json(generated_template["PatchDocument"])
 
-    if operation not in operations:
+    if operation not in OPERATION_ENDPOINTS:
         console.print(
-            f"[bold red]Error: Invalid operation type. Supported operations: {', '.join(operations.keys())}[/bold red]"
+            f"[bold red]Error: Invalid operation type. Supported operations: {', '.join(OPERATION_ENDPOINTS.keys())}[/bold red]"
         )
         return
 
-    operation_endpoint = operations[operation]
-    # Convert PatchDocument list to JSON string for update operation
-    if operation == "update":
-        if "PatchDocument" in generated_template:
-            generated_template["PatchDocument"] = json.dumps(
-                generated_template["PatchDocument"]
-            )
+    operation_endpoint = OPERATION_ENDPOINTS[operation]
     console.print(
         f"[bold yellow]Do you want to proceed with applying the configuration with {operation} operation...?[/bold yellow]"
     )
     confirm = click.confirm("Please confirm")
-    if confirm:
-        with Progress(
-            SpinnerColumn(),
-            TextColumn(f"{operation.capitalize()} operation in progress..."),
-            TimeElapsedColumn(),
-            console=console,
+    if confirm and operation == "list":
+        stream_resource_list(generated_template, headers)
+    elif confirm:
+        with progress_spinner(
+            f"{operation.capitalize()} operation in progress..."
         ) as progress:
             task = progress.add_task("waiting", total=None)
-            response = requests.post(
-                f"{BASE_URL}/{operation_endpoint}",
+            response = get_api().post(
+                f"/{operation_endpoint}",
                 json=generated_template,
                 headers=headers,
             )
@@ -188,14 +594,22 @@ def apply(config_file, monitor, profile):
             console.print("[bold green]Request submitted successfully.[/bold green]")
             formatted_response = json.dumps(response.json(), indent=4)
             console.print_json(formatted_response)
-            if monitor:
+            record_submission(
+                operation, generated_template, response.json(), config_file
+            )
+            if monitor and operation != "read":
                 request_token = response.json()["details"]["ProgressEvent"][
                     "RequestToken"
                 ]
                 console.print(
                     f"Monitoring status for request token: [bold]{request_token}[/bold]"
                 )
-                monitor_status(request_token, headers, operation)
+                monitor_status(
+                    request_token,
+                    headers,
+                    operation,
+                    generated_template.get("Region"),
+                )
         else:
             console.print(
                 f"[bold red]Error: {response.status_code} - {response.json().get('detail')}[/bold red]"
@@ -205,6 +619,388 @@ def apply(config_file, monitor, profile):
         return
 
 
+def stream_resource_list(list_request, headers):
+    """Print listed resources as the server streams them"""
+    count = 0
+    next_token = None
+    next_tokens = {}
+    with get_api().post(
+        "/list-resource", json=list_request, headers=headers, stream=True
+    ) as response:
+        if response.status_code != 200:
+            console.print(
+                f"[bold red]Error: {response.status_code} - {response.json().get('detail')}[/bold red]"
+            )
+            return
+
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            row = json.loads(line)
+            if "error" in row and "Region" in row:
+                # One region of a fan-out failed; the others keep streaming.
+                console.print(
+                    f"[bold red]Error in {row['Region']}: {row['error']}[/bold red]"
+                )
+                continue
+            if "error" in row:
+                console.print(f"[bold red]Error: {row['error']}[/bold red]")
+                return
+            if "Identifier" not in row:
+                next_token = row.get("NextToken")
+                next_tokens = row.get("NextTokens") or {}
+                continue
+            count += 1
+            region = f"[magenta]{row['Region']}[/magenta] " if "Region" in row else ""
+            console.print(
+                f"{region}[cyan]{row['Identifier']}[/cyan] {json.dumps(row['Properties'])}",
+                soft_wrap=True,
+            )
+
+    console.print(
+        f"[bold green]{count} {list_request.get('TypeName')} resources listed.[/bold green]"
+    )
+    if next_token:
+        console.print(f"More results are available with NextToken: {next_token}")
+    next_tokens = {region: token for region, token in next_tokens.items() if token}
+    if next_tokens:
+        console.print(
+            f"More results are available with NextTokens: {json.dumps(next_tokens)}"
+        )
+
+
+def apply_batch(templates, headers, monitor, max_concurrency, region=None):
+    """Submit several resource configurations through the /batch endpoint"""
+    from rich.table import Table
+
+    operations = []
+    sources = []
+    for source, template in templates:
+        operation, body = prepare_template(template)
+        if operation not in BATCH_OPERATIONS:
+            console.print(
+                f"[bold red]Error: {os.path.relpath(source)} uses '{operation}'. Only {', '.join(BATCH_OPERATIONS)} can be applied together.[/bold red]"
+            )
+            return
+        if region:
+            body.setdefault("Region", region)
+        operations.append({"Operation": operation, **body})
+        sources.append(source)
+
+    # Desired-state updates are sent as the patch to the live resource, and
+    # not at all when there is nothing to change.
+    planned = plan_updates(
+        [(operation["Operation"], operation) for operation in operations], headers
+    )
+    if planned is None:
+        return
+    submitted = []
+    unchanged = []
+    for source, (body, error) in zip(sources, planned):
+        if error:
+            console.print(
+                f"[bold red]Error: {os.path.relpath(source)}: {error}[/bold red]"
+            )
+            return
+        if body is None:
+            unchanged.append(os.path.relpath(source))
+        else:
+            submitted.append((source, body))
+    if unchanged:
+        console.print(f"[bold green]Unchanged: {', '.join(unchanged)}[/bold green]")
+    sources = [source for source, _ in submitted]
+    operations = [operation for _, operation in submitted]
+    if not operations:
+        return
+
+    console.print(
+        f"[bold yellow]Do you want to proceed with applying {len(operations)} resource configurations...?[/bold yellow]"
+    )
+    if not click.confirm("Please confirm"):
+        console.print("[bold red]Request cancelled.[/bold red]")
+        return
+
+    with progress_spinner(f"Submitting {len(operations)} operations...") as progress:
+        task = progress.add_task("waiting", total=None)
+        response = get_api().post(
+            "/batch",
+            json={
+                "Operations": operations,
+                "MaxConcurrency": max_concurrency,
+                "Region": region,
+            },
+            headers=headers,
+        )
+        progress.update(task, advance=1)
+
+    if response.status_code != 200:
+        console.print(
+            f"[bold red]Error: {response.status_code} - {response.json().get('detail')}[/bold red]"
+        )
+        return
+
+    results = response.json()["results"]
+    table = Table(title="Batch Submission")
+    table.add_column("Config File", style="cyan")
+    table.add_column("Resource Type", style="magenta")
+    table.add_column("Operation", style="blue")
+    table.add_column("Region")
+    table.add_column("Request Token / Error")
+    for result in results:
+        index = result["index"]
+        if result["status"] == "success":
+            outcome = f"[green]{result['RequestToken']}[/green]"
+        else:
+            outcome = f"[red]{result['error']}[/red]"
+        table.add_row(
+            os.path.relpath(sources[index]),
+            result["TypeName"],
+            operations[index]["Operation"],
+            result.get("Region") or "",
+            outcome,
+        )
+    console.print(table)
+    for result in results:
+        if result["status"] == "success":
+            index = result["index"]
+            record_submission(
+                operations[index]["Operation"],
+                operations[index],
+                result,
+                sources[index],
+            )
+
+    if monitor:
+        submitted = [result for result in results if result["status"] == "success"]
+        if submitted:
+            monitor_requests(
+                [result["RequestToken"] for result in submitted],
+                headers,
+                regions=sorted({result.get("Region") for result in submitted}),
+            )
+
+
+def build_nodes(templates):
+    """Turn (source file, template) pairs into scheduler nodes named after Metadata.Name or the file"""
+    from .scheduler import ResourceNode
+
+    per_source = {}
+    for source, _ in templates:
+        per_source[source] = per_source.get(source, 0) + 1
+
+    nodes = []
+    seen = {}
+    for source, template in templates:
+        metadata = template.get("Metadata", {})
+        operation, body = prepare_template(template)
+        name = metadata.get("Name")
+        if not name:
+            name = os.path.splitext(os.path.basename(source))[0]
+            if per_source[source] > 1:
+                seen[source] = seen.get(source, 0) + 1
+                name = f"{name}[{seen[source] - 1}]"
+        depends_on = metadata.get("DependsOn", [])
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        nodes.append(ResourceNode(name, source, operation, body, depends_on))
+    return nodes
+
+
+def wait_for_request(request_token, headers, timeout=60 * 30, region=None):
+    """Poll the resource status until the request reaches a terminal status"""
+    wait_time = 2
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = get_api().post(
+            "/resource-status/wait",
+            json={"request_token": request_token, "timeout": 60, "region": region},
+            headers=headers,
+        )
+        if response.status_code == 200:
+            if response.json().get("terminal"):
+                return response.json()["details"]
+            continue
+
+        # Exponential backoff with jitter
+        time.sleep(wait_time)
+        wait_time = min(30, wait_time * 2 + random.uniform(0, 1))
+    raise TimeoutError(f"Timed out waiting for {request_token}")
+
+
+def render_nodes(nodes):
+    from rich.table import Table
+
+    styles = {
+        "PENDING": "dim",
+        "IN_PROGRESS": "yellow",
+        "SUCCESS": "green",
+        "FAILED": "red",
+        "SKIPPED": "red",
+    }
+    table = Table(title="Deployment")
+    table.add_column("Resource", style="cyan")
+    table.add_column("Resource Type", style="magenta")
+    table.add_column("Operation", style="blue")
+    table.add_column("Depends On")
+    table.add_column("Status")
+    table.add_column("Identifier / Error")
+    for node in nodes:
+        style = styles.get(node.status, "")
+        table.add_row(
+            node.name,
+            node.body.get("TypeName", "N/A"),
+            node.operation,
+            ", ".join(sorted(node.dependencies)),
+            f"[{style}]{node.status}[/{style}]",
+            node.error or node.identifier or "",
+        )
+    return table
+
+
+@cli.command()
+@click.argument(
+    "directory", required=False, type=click.Path(exists=True, file_okay=False)
+)
+@click.option(
+    "--workers",
+    default=4,
+    show_default=True,
+    help="Resources to wait on in parallel",
+)
+@click.option("--dry-run", is_flag=True, help="Only show the execution order")
+@click.option(
+    "--infer-dependencies",
+    is_flag=True,
+    help="Also order resources whose properties quote another one's name or ARN",
+)
+@click.option("--profile", default=None, help="AWS CLI profile to use")
+@region_option(help="AWS region for configurations that do not set a Region")
+def deploy(directory, workers, dry_run, infer_dependencies, profile, region):
+    """Apply every configuration in a directory in dependency order, running independent resources in parallel"""
+    import requests
+    from rich.live import Live
+
+    from .scheduler import DagScheduler, build_graph, execution_levels
+
+    directory = directory or resources_dir()
+    nodes = build_nodes(load_templates(directory))
+    if not nodes:
+        console.print(f"[bold red]Error: No resources found in {directory}[/bold red]")
+        return
+    try:
+        build_graph(nodes, match_values=infer_dependencies)
+    except ValueError as e:
+        console.print(f"[bold red]Error: {e}[/bold red]")
+        return
+
+    for number, level in enumerate(execution_levels(nodes), start=1):
+        console.print(f"[bold blue]Step {number}:[/bold blue] {', '.join(level)}")
+    if dry_run:
+        return
+
+    invalid = [node.name for node in nodes if node.operation not in BATCH_OPERATIONS]
+    if invalid:
+        console.print(
+            f"[bold red]Error: Only {', '.join(BATCH_OPERATIONS)} can be deployed: {', '.join(invalid)}[/bold red]"
+        )
+        return
+
+    headers = aws_headers(profile)
+    if region:
+        for node in nodes:
+            node.body.setdefault("Region", region)
+
+    console.print(
+        f"[bold yellow]Do you want to proceed with deploying {len(nodes)} resources...?[/bold yellow]"
+    )
+    if not click.confirm("Please confirm"):
+        console.print("[bold red]Request cancelled.[/bold red]")
+        return
+
+    def submit(ready):
+        results = [None] * len(ready)
+        # Bodies only have their references resolved now, so desired-state
+        # updates are planned as their nodes become ready.
+        desired = [
+            index
+            for index, node in enumerate(ready)
+            if is_desired_state(node.operation, node.body)
+        ]
+        if desired:
+            plans = request_plans([ready[index].body for index in desired], headers)
+            if plans is None:
+                plans = [{"Action": "error", "error": "Planning failed"}] * len(desired)
+            for index, plan in zip(desired, plans):
+                body, error = planned_update(ready[index].body, plan)
+                if error:
+                    results[index] = {"status": "error", "error": error}
+                elif body is None:
+                    results[index] = {
+                        "status": "unchanged",
+                        "ResourceModel": plan.get("ResourceModel"),
+                    }
+                    update_state(
+                        "record_resource",
+                        plan["TypeName"],
+                        plan["Identifier"],
+                        region=plan.get("Region"),
+                        source=os.path.abspath(ready[index].source),
+                        properties=plan.get("ResourceModel"),
+                    )
+                else:
+                    ready[index].body = body
+
+        pending = [index for index, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+        operations = [
+            {"Operation": ready[index].operation, **ready[index].body}
+            for index in pending
+        ]
+        try:
+            response = get_api().post(
+                "/batch",
+                json={"Operations": operations, "MaxConcurrency": workers},
+                headers=headers,
+            )
+        except requests.RequestException as e:
+            batch_results = [{"status": "error", "error": str(e)} for _ in pending]
+        else:
+            if response.status_code != 200:
+                error = response_error(response)
+                batch_results = [{"status": "error", "error": error} for _ in pending]
+            else:
+                batch_results = response.json()["results"]
+        for index, result in zip(pending, batch_results):
+            results[index] = result
+            if result["status"] == "success":
+                node = ready[index]
+                record_submission(node.operation, node.body, result, node.source)
+        return results
+
+    def wait(node):
+        details = wait_for_request(
+            node.request_token, headers, region=node.body.get("Region")
+        )
+        update_state("record_status", details.get("ProgressEvent", {}))
+        return details
+
+    with Live(render_nodes(nodes), console=get_console(), refresh_per_second=4) as live:
+        DagScheduler(
+            nodes,
+            submit,
+            wait,
+            workers=workers,
+            on_update=lambda node: live.update(render_nodes(nodes)),
+        ).run()
+
+    succeeded = sum(node.status == "SUCCESS" for node in nodes)
+    color = "green" if succeeded == len(nodes) else "red"
+    console.print(
+        f"[bold {color}]{succeeded}/{len(nodes)} resources deployed.[/bold {color}]"
+    )
+
+
 # Refactor this code..
 @cli.command()
 @click.argument("action", required=False)
@@ -216,7 +1012,8 @@ def apply(config_file, monitor, profile):
 )
 @click.option("--monitor", is_flag=True, help="Monitor the resource creation status")
 @click.option("--profile", default=None, help="AWS CLI profile to use")
-def resource(action, monitor, profile, interactive, config_file):
+@region_option(help="AWS region to create the resource in")
+def resource(action, monitor, profile, interactive, config_file, region):
     """Handle CRUD operations on resources"""
 
     if not action:
@@ -224,13 +1021,7 @@ def resource(action, monitor, profile, interactive, config_file):
             "Enter the action to perform (e.g. create an S3 bucket, create a DynamoDB table)"
         )
 
-    session = boto3.Session(profile_name=profile) if profile else boto3.Session()
-    credentials = session.get_credentials()
-    headers = {
-        "aws-access-key": credentials.access_key,
-        "aws-secret-key": credentials.secret_key,
-        "aws-session-token": credentials.token if credentials.token else "",
-    }
+    headers = aws_headers(profile)
 
     # Generate initial configuration from bedrock model
     data = {
@@ -238,9 +1029,7 @@ def resource(action, monitor, profile, interactive, config_file):
         "prompt": "Create an SNS topic resource configuration in JSON format that is compatible with AWS Cloud Control API. The JSON should include the TypeName and Properties fields."
     }
     # Add call to the /generate-template path
-    response = requests.post(
-        f"{BASE_URL}/generate-template", json=data, headers=headers
-    )
+    response = get_api().post("/generate-template", json=data, headers=headers)
     formatted_response = json.dumps(response.json(), indent=4)
     console.print_json(formatted_response)
     if response.status_code == 200:
@@ -269,13 +1058,14 @@ def resource(action, monitor, profile, interactive, config_file):
     console.print("[bold yellow]Do you want to proceed with the request?[/bold yellow]")
     confirm = click.confirm("Please confirm")
     if confirm:
-        response = requests.post(
-            f"{BASE_URL}/message", json=generated_template, headers=headers
-        )
+        if region:
+            generated_template["Region"] = region
+        response = get_api().post("/message", json=generated_template, headers=headers)
         if response.status_code == 200:
             console.print("[bold green]Request submitted successfully.[/bold green]")
             formatted_response = json.dumps(response.json(), indent=4)
             console.print_json(formatted_response)
+            record_submission("create", generated_template, response.json())
             if monitor:
                 request_token = response.json()["details"]["ProgressEvent"][
                     "RequestToken"
@@ -283,7 +1073,7 @@ def resource(action, monitor, profile, interactive, config_file):
                 console.print(
                     f"Monitoring status for request token: [bold]{request_token}[/bold]"
                 )
-                monitor_status(request_token, headers)
+                monitor_status(request_token, headers, region=region)
         else:
             console.print(
                 f"[bold red]Error: {response.status_code} - {response.json().get('detail')}[/bold red]"
@@ -293,22 +1083,25 @@ def resource(action, monitor, profile, interactive, config_file):
         return
 
 
-def monitor_status(request_token, headers, operation):
+def monitor_status(request_token, headers, operation="N/A", region=None):
     """Monitor the status of the resource creation"""
     console.print("[bold blue]Checking resource creation status...[/bold blue]")
-    max_attempts = 10
-    wait_time = 2  # Initial wait time in seconds
-    max_wait_time = 60 * 15  # Maximum wait time in seconds
+    max_attempts = 15
+    wait_time = 2  # Initial wait time in seconds, used after errors
+    max_wait_time = 60  # Maximum wait time in seconds
 
     for attempt in range(max_attempts):
         click.echo(request_token)
-        response = requests.post(
-            f"{BASE_URL}/resource-status",
-            json={"request_token": request_token},
+        # The server holds the request open until the operation finishes or
+        # the timeout expires, so no client-side sleep is needed in between.
+        response = get_api().post(
+            "/resource-status/wait",
+            json={"request_token": request_token, "timeout": 60, "region": region},
             headers=headers,
         )
         if response.status_code == 200:
             details = response.json().get("details", {})
+            update_state("record_status", details.get("ProgressEvent", {}))
             status = details.get("ProgressEvent", {}).get("OperationStatus")
             if status in ["SUCCESS", "FAILED"]:
                 console.print(f"Operation Status: [bold]{status}[/bold]")
@@ -323,8 +1116,9 @@ def monitor_status(request_token, headers, operation):
                 break
             else:
                 console.print(
-                    f"Current Status: [yellow]{status}[/yellow]. Checking again in {wait_time} seconds..."
+                    f"Current Status: [yellow]{status}[/yellow]. Still waiting..."
                 )
+                continue
         else:
             console.print(
                 f"[bold red]Error: {response.status_code} - {response.json().get('detail')}[/bold red]"
@@ -342,6 +1136,8 @@ def monitor_status(request_token, headers, operation):
 
 def display_resource_details(details, operation):
 
+    from rich.table import Table
+
     table = Table(title="Resource Details")
     table.add_column("Resource ID", justify="left", style="cyan", no_wrap=True)
     table.add_column("Resource Type", style="magenta")
@@ -357,21 +1153,326 @@ def display_resource_details(details, operation):
     console.print(table)
 
 
+ACTIVE_STATUSES = ("PENDING", "IN_PROGRESS", "CANCEL_IN_PROGRESS")
+
+
+def render_requests(events):
+    from rich.table import Table
+
+    table = Table(title="Resource Requests")
+    table.add_column("Request Token", style="cyan", no_wrap=True)
+    table.add_column("Resource Type", style="magenta")
+    table.add_column("Operation", style="blue")
+    show_region = any("Region" in event for event in events)
+    if show_region:
+        table.add_column("Region")
+    table.add_column("Status")
+    table.add_column("Identifier / Message")
+    styles = {"SUCCESS": "green", "FAILED": "red", "CANCEL_COMPLETE": "red"}
+    for event in events:
+        status = event.get("OperationStatus", "N/A")
+        style = styles.get(status, "yellow")
+        region = [event.get("Region", "")] if show_region else []
+        table.add_row(
+            event.get("RequestToken", "N/A"),
+            event.get("TypeName", "N/A"),
+            event.get("Operation", "N/A"),
+            *region,
+            f"[{style}]{status}[/{style}]",
+            event.get("StatusMessage") or event.get("Identifier") or "",
+        )
+    return table
+
+
+def monitor_requests(request_tokens, headers, interval=5, regions=()):
+    """Refresh many requests with one call per interval in a single live table
+
+    With several regions the server queries them all at once on each refresh.
+    Each refresh asks only about the requests still in flight.
+    """
+    from rich.live import Live
+    from rich.text import Text
+
+    regions = region_query(regions)
+    query = {"request_tokens": list(request_tokens), **regions}
+    if not request_tokens:
+        query["operation_statuses"] = list(ACTIVE_STATUSES)
+
+    with Live(Text("Loading..."), console=get_console(), refresh_per_second=4) as live:
+        events = {}
+        while True:
+            response = get_api().post("/resource-requests", json=query, headers=headers)
+            if response.status_code != 200:
+                console.print(
+                    f"[bold red]Error: {response.status_code} - {response.json().get('detail')}[/bold red]"
+                )
+                return
+            for region, error in (response.json().get("errors") or {}).items():
+                console.print(f"[bold red]Error in {region}: {error}[/bold red]")
+            for event in response.json()["details"]:
+                events[event["RequestToken"]] = event
+                update_state("record_status", event)
+            live.update(render_requests(events.values()))
+
+            active = [
+                token
+                for token, event in events.items()
+                if event.get("OperationStatus") in ACTIVE_STATUSES
+            ]
+            if not active:
+                break
+            # Only the requests still in flight need refreshing; the rest
+            # keep the final status already shown.
+            query = {"request_tokens": active, **regions}
+            time.sleep(interval)
+
+    if not events:
+        console.print("[bold blue]No in-flight resource requests.[/bold blue]")
+
+
 @cli.command()
-@click.argument("request_token")
+@click.argument("request_tokens", nargs=-1)
+@click.option(
+    "--all", "all_requests", is_flag=True, help="Monitor every in-flight request"
+)
+@click.option(
+    "--interval",
+    default=5,
+    show_default=True,
+    help="Seconds between refreshes when monitoring several requests",
+)
 @click.option("--profile", default=None, help="AWS CLI profile to use")
-def monitor(request_token, profile):
-    """Monitor the status of the resource creation using a request token"""
-
-    session = boto3.Session(profile_name=profile) if profile else boto3.Session()
-    credentials = session.get_credentials()
-    headers = {
-        "aws-access-key": credentials.access_key,
-        "aws-secret-key": credentials.secret_key,
-        "aws-session-token": credentials.token if credentials.token else "",
-    }
+@region_option(
+    multiple=True,
+    help="AWS region to query; repeat to watch several regions at once",
+)
+def monitor(request_tokens, all_requests, interval, profile, region):
+    """Monitor the status of resource operations using one or more request tokens"""
+
+    if not request_tokens and not all_requests:
+        raise click.UsageError("Provide request tokens or --all")
+
+    headers = aws_headers(profile)
+
+    if len(request_tokens) == 1 and not all_requests and len(region) <= 1:
+        monitor_status(request_tokens[0], headers, region=region[0] if region else None)
+    else:
+        monitor_requests(
+            () if all_requests else request_tokens, headers, interval, region
+        )
+
+
+@cli.group()
+def state():
+    """Query the local index of resources managed through cloudysetup"""
+    if get_state_store() is None:
+        raise click.UsageError("The state index is disabled (CLOUDYSETUP_STATE_DB)")
+
+
+def render_state(rows):
+    from rich.table import Table
 
-    monitor_status(request_token, headers)
+    styles = {"SUCCESS": "green", "FAILED": "red", "MISSING": "red"}
+    table = Table(title="Managed Resources")
+    table.add_column("Resource Type", style="magenta")
+    table.add_column("Identifier", style="cyan")
+    table.add_column("Region")
+    table.add_column("Status")
+    table.add_column("Last Request Token")
+    table.add_column("Config File")
+    for row in rows:
+        style = styles.get(row["status"], "yellow")
+        table.add_row(
+            row["type_name"],
+            row["identifier"] or "",
+            row["region"],
+            f"[{style}]{row['status']}[/{style}]",
+            row["request_token"] or "",
+            os.path.relpath(row["source"]) if row["source"] else "",
+        )
+    return table
+
+
+@state.command("list")
+@click.option("--type", "type_name", help="Only resources of this TypeName")
+@click.option("--identifier", help="Only the resource with this identifier")
+@click.option("--request-token", help="Only the resource this request was for")
+@click.option(
+    "--source",
+    type=click.Path(),
+    help="Only resources applied from this config file",
+)
+@click.option("--status", help="Only resources in this status, e.g. MISSING")
+@click.option("--json", "as_json", is_flag=True, help="Print the rows as JSON")
+def list_state(type_name, identifier, request_token, source, status, as_json):
+    """List managed resources from the local index without calling AWS"""
+    rows = get_state_store().query(
+        type_name=type_name,
+        identifier=identifier,
+        request_token=request_token,
+        source=os.path.abspath(source) if source else None,
+        status=status,
+    )
+    if as_json:
+        for row in rows:
+            if row["properties"]:
+                row["properties"] = json.loads(row["properties"])
+        click.echo(json.dumps(rows, indent=4))
+    elif rows:
+        console.print(render_state(rows))
+    else:
+        console.print(
+            "[bold blue]No matching resources in the state index.[/bold blue]"
+        )
+
+
+def reconcile_type(type_name, region, headers, page_size=100):
+    """Stream ListResources for one type into the index, a page at a time
+
+    Returns (listed, marked missing). Resources are only marked MISSING after
+    a complete listing, so a failure part-way leaves them as they were.
+    """
+    store = get_state_store()
+    started_at = time.time()
+    listed = 0
+    page = []
+    next_token = None
+    with get_api().post(
+        "/list-resource",
+        json={"TypeName": type_name, "Region": region or None},
+        headers=headers,
+        stream=True,
+    ) as response:
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"{response.status_code} - {response.json().get('detail')}"
+            )
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            row = json.loads(line)
+            if "error" in row:
+                raise RuntimeError(row["error"])
+            if "Identifier" not in row:
+                next_token = row.get("NextToken")
+                continue
+            page.append(row)
+            listed += 1
+            if len(page) >= page_size:
+                store.reconcile_page(type_name, region, page, started_at)
+                page = []
+    if page:
+        store.reconcile_page(type_name, region, page, started_at)
+    if next_token:
+        raise RuntimeError("The listing ended before the last page")
+    return listed, store.finish_reconcile(type_name, region, started_at)
+
+
+def settle_request(request_token, region, headers):
+    """Record the current status of a request the index still has in flight"""
+    response = get_api().post(
+        "/resource-status",
+        json={"request_token": request_token, "region": region or None},
+        headers=headers,
+    )
+    if response.status_code != 200:
+        raise RuntimeError(response_error(response))
+    event = response.json()["details"].get("ProgressEvent", {})
+    update_state("record_status", event)
+    return event.get("OperationStatus")
+
+
+@state.command()
+@click.option(
+    "--type",
+    "type_names",
+    multiple=True,
+    help="Only reconcile this TypeName; repeat for several",
+)
+@click.option(
+    "--max-age",
+    default=0,
+    show_default=True,
+    help="Skip types reconciled within this many seconds",
+)
+@click.option(
+    "--workers",
+    default=4,
+    show_default=True,
+    help="Resource types to list in parallel",
+)
+@click.option(
+    "--background",
+    is_flag=True,
+    help="Reconcile in a detached process and return at once",
+)
+@click.option("--profile", default=None, help="AWS CLI profile to use")
+def reconcile(type_names, max_age, workers, background, profile):
+    """Refresh the index from ListResources and mark resources gone from AWS as MISSING"""
+    if background:
+        import subprocess
+        import sys
+
+        command = [sys.executable, "-m", "cloudysetup.cli_tool.cli", "state"]
+        command += ["reconcile", "--max-age", str(max_age)]
+        command += ["--workers", str(workers)]
+        for type_name in type_names:
+            command += ["--type", type_name]
+        if profile:
+            command += ["--profile", profile]
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        console.print(
+            f"[bold blue]Reconciling in the background (pid {process.pid}).[/bold blue]"
+        )
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    store = get_state_store()
+    headers = aws_headers(profile)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        # Requests left in flight (say by an interrupted apply) first get
+        # their outcome, and with it the identifier a listing is matched on.
+        active = store.active_tokens()
+        futures = {
+            request_token: pool.submit(settle_request, request_token, region, headers)
+            for request_token, region in active
+        }
+        for request_token, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                console.print(f"[bold red]Error: {request_token}: {e}[/bold red]")
+        if active:
+            console.print(
+                f"[bold blue]Checked {len(active)} requests still in progress.[/bold blue]"
+            )
+
+        targets = store.reconcile_targets(max_age, type_names)
+        if not targets:
+            console.print("[bold blue]The state index is up to date.[/bold blue]")
+            return
+
+        futures = {
+            target: pool.submit(reconcile_type, *target, headers) for target in targets
+        }
+        for (type_name, region), future in futures.items():
+            label = f"{type_name} ({region})" if region else type_name
+            try:
+                listed, missing = future.result()
+            except Exception as e:
+                console.print(f"[bold red]Error: {label}: {e}[/bold red]")
+                continue
+            color = "red" if missing else "green"
+            console.print(
+                f"[bold {color}]{label}: {listed} listed, {missing} missing.[/bold {color}]"
+            )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,135 @@
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import click
+
+# Cached credentials are dropped this long before they expire, so a command
+# never starts with a token that runs out while it is still talking to AWS.
+EXPIRY_MARGIN = timedelta(
+    seconds=int(os.getenv("CLOUDYSETUP_CREDENTIAL_EXPIRY_MARGIN", "300"))
+)
+CACHE_ENABLED = os.getenv("CLOUDYSETUP_CREDENTIAL_CACHE", "1") != "0"
+
+
+def cache_key(profile):
+    return profile or os.getenv("AWS_PROFILE") or "default"
+
+
+def load_state(path):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if isinstance(state, dict) else {}
+
+
+def save_state(path, state):
+    """Atomically write the state file, readable by the current user only"""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".cloudysetup_state.")
+    try:
+        # mkstemp already creates the file as 0600; chmod guards odd umasks.
+        os.chmod(tmp_path, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def cached_credentials(path, profile):
+    """Return the cached credentials for the profile if they are still valid"""
+    entry = load_state(path).get("credentials", {}).get(cache_key(profile))
+    if not entry:
+        return None
+    try:
+        expiry = datetime.fromisoformat(entry["expiry"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if expiry - EXPIRY_MARGIN <= datetime.now(timezone.utc):
+        return None
+    return entry
+
+
+def store_credentials(path, profile, access_key, secret_key, token, expiry):
+    state = load_state(path)
+    credentials = state.setdefault("credentials", {})
+    now = datetime.now(timezone.utc)
+    # Drop other profiles' expired entries while we are rewriting the file.
+    for key, entry in list(credentials.items()):
+        try:
+            if datetime.fromisoformat(entry["expiry"]) <= now:
+                del credentials[key]
+        except (KeyError, TypeError, ValueError):
+            del credentials[key]
+    credentials[cache_key(profile)] = {
+        "access_key": access_key,
+        "secret_key": secret_key,
+        "token": token,
+        "expiry": expiry.astimezone(timezone.utc).isoformat(),
+    }
+    save_state(path, state)
+
+
+def clear_credentials(path, profile):
+    state = load_state(path)
+    if state.get("credentials", {}).pop(cache_key(profile), None) is not None:
+        save_state(path, state)
+
+
+def credentials_expiry(credentials):
+    """Expiry of temporary (SSO, assume-role, process) credentials, else None.
+
+    botocore only exposes the expiry on RefreshableCredentials, through the
+    private ``_expiry_time`` attribute.
+    """
+    expiry = getattr(credentials, "_expiry_time", None)
+    if isinstance(expiry, datetime) and expiry.tzinfo is not None:
+        return expiry
+    return None
+
+
+def resolve_credentials(path, profile, refresh=False):
+    """Resolve (access key, secret key, token) for the profile, using the cache.
+
+    Only temporary credentials with a known expiry are cached: static keys are
+    cheap to resolve and already live in the AWS config files. Credentials
+    exported through the environment bypass the cache entirely so they always
+    take precedence, as they do for boto3.
+    """
+    use_cache = CACHE_ENABLED and not os.getenv("AWS_ACCESS_KEY_ID")
+    if use_cache and not refresh:
+        entry = cached_credentials(path, profile)
+        if entry is not None:
+            return entry["access_key"], entry["secret_key"], entry["token"]
+
+    import boto3
+
+    session = boto3.Session(profile_name=profile) if profile else boto3.Session()
+    credentials = session.get_credentials()
+    if credentials is None:
+        raise click.ClickException(
+            f"No AWS credentials found for profile {cache_key(profile)}"
+        )
+    # Freezing may refresh the credentials, so read the expiry afterwards.
+    frozen = credentials.get_frozen_credentials()
+    expiry = credentials_expiry(credentials)
+
+    if use_cache:
+        if expiry is not None:
+            store_credentials(
+                path,
+                profile,
+                frozen.access_key,
+                frozen.secret_key,
+                frozen.token or "",
+                expiry,
+            )
+        elif refresh:
+            clear_credentials(path, profile)
+    return frozen.access_key, frozen.secret_key, frozen.token or ""
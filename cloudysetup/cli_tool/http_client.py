@@ -0,0 +1,127 @@
+import os
+import uuid
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CONNECT_TIMEOUT = float(os.getenv("CLOUDYSETUP_CONNECT_TIMEOUT", "5"))
+# Long enough for template generation and the 60 second status long-poll.
+READ_TIMEOUT = float(os.getenv("CLOUDYSETUP_READ_TIMEOUT", "120"))
+RETRIES = int(os.getenv("CLOUDYSETUP_RETRIES", "3"))
+BACKOFF_FACTOR = float(os.getenv("CLOUDYSETUP_BACKOFF_FACTOR", "0.5"))
+BACKOFF_JITTER = float(os.getenv("CLOUDYSETUP_BACKOFF_JITTER", "0.5"))
+POOL_SIZE = int(os.getenv("CLOUDYSETUP_POOL_SIZE", "10"))
+
+RETRY_STATUSES = (429, 502, 503, 504)
+
+# Endpoints that only read state, so a POST to them can be retried safely
+# after a read timeout or a 5xx. Other POSTs are retried only when the
+# connection could not be made, since the request then never reached the
+# server.
+READ_ONLY_PATHS = (
+    "/generate-template",
+    "/suggestions",
+    "/resource-status",
+    "/resource-requests",
+    "/read-resource",
+    "/list-resource",
+)
+
+# Submissions that carry a ClientToken chosen here, once per call, so a retry
+# is passed to Cloud Control with the same token and returns the first
+# request instead of provisioning again, whichever server worker it reaches.
+IDEMPOTENT_PATHS = (
+    "/create-resource",
+    "/update-resource",
+    "/delete-resource",
+    "/message",
+    "/batch",
+)
+
+
+def build_retry(retry_post: bool):
+    kwargs = {
+        "total": RETRIES,
+        "backoff_factor": BACKOFF_FACTOR,
+        "status_forcelist": RETRY_STATUSES,
+        "respect_retry_after_header": True,
+        "raise_on_status": False,
+    }
+    if retry_post:
+        kwargs["allowed_methods"] = None
+    try:
+        return Retry(backoff_jitter=BACKOFF_JITTER, **kwargs)
+    except TypeError:
+        # urllib3 < 2 has no jitter support.
+        return Retry(**kwargs)
+
+
+def new_token():
+    return str(uuid.uuid4())
+
+
+def with_client_tokens(path: str, body):
+    """The body of a submission with a ClientToken on it and each batch operation.
+
+    Tokens the caller already set are kept. The body is copied, so the
+    caller's configuration is left as it was.
+    """
+    if path not in IDEMPOTENT_PATHS or not isinstance(body, dict):
+        return body
+    if path == "/batch":
+        return {
+            **body,
+            "Operations": [
+                {
+                    **operation,
+                    "ClientToken": operation.get("ClientToken") or new_token(),
+                }
+                for operation in body.get("Operations", [])
+            ],
+        }
+    return {**body, "ClientToken": body.get("ClientToken") or new_token()}
+
+
+class ApiClient:
+    """Pooled keep-alive session for talking to the cloudysetup API.
+
+    requests advertises gzip and decodes compressed responses transparently.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+        pool_size: int = POOL_SIZE,
+    ):
+        self.base_url = (base_url or "").rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+        default_adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=build_retry(retry_post=False),
+        )
+        retrying_adapter = HTTPAdapter(max_retries=build_retry(retry_post=True))
+        # Retries are passed per request, so both adapters can draw from the
+        # same connection pool and every call reuses one keep-alive connection.
+        retrying_adapter.poolmanager = default_adapter.poolmanager
+        self.session.mount("http://", default_adapter)
+        self.session.mount("https://", default_adapter)
+        for path in READ_ONLY_PATHS + IDEMPOTENT_PATHS:
+            self.session.mount(f"{self.base_url}{path}", retrying_adapter)
+
+    def post(self, path: str, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        if "json" in kwargs:
+            kwargs["json"] = with_client_tokens(path, kwargs["json"])
+        return self.session.post(f"{self.base_url}{path}", **kwargs)
+
+    def get(self, path: str, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(f"{self.base_url}{path}", **kwargs)
+
+    def close(self):
+        self.session.close()
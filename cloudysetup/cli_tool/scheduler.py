@@ -0,0 +1,283 @@
+import json
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# With value matching on, top-level properties whose values identify a
+# resource and may be quoted verbatim (or as the tail of an ARN) by the
+# resources that use it.
+IDENTITY_SUFFIXES = ("Name", "Arn")
+# Free-form properties that merely mention other resources.
+IGNORED_IDENTITY_KEYS = ("DisplayName", "Description")
+IGNORED_VALUE_KEYS = ("Tags", "Description")
+
+
+class ResourceNode:
+    def __init__(self, name, source, operation, body, depends_on=()):
+        self.name = name
+        self.source = source
+        self.operation = operation
+        self.body = body
+        self.depends_on = list(depends_on)
+        self.dependencies = set()
+        self.dependents = set()
+        self.status = "PENDING"
+        self.request_token = None
+        self.identifier = body.get("Identifier")
+        self.resource_model = {}
+        self.error = None
+
+
+def find_references(value):
+    """Yield resource names referenced through Ref or Fn::GetAtt."""
+    if isinstance(value, dict):
+        if set(value) == {"Ref"} and isinstance(value["Ref"], str):
+            yield value["Ref"]
+            return
+        if set(value) == {"Fn::GetAtt"}:
+            target = value["Fn::GetAtt"]
+            if isinstance(target, str):
+                target = target.split(".", 1)
+            yield target[0]
+            return
+        for item in value.values():
+            yield from find_references(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from find_references(item)
+
+
+def string_values(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            if key not in IGNORED_VALUE_KEYS:
+                yield from string_values(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from string_values(item)
+
+
+def identity_values(node):
+    values = set()
+    if node.identifier:
+        values.add(node.identifier)
+    for key, value in node.body.get("Properties", {}).items():
+        if (
+            key.endswith(IDENTITY_SUFFIXES)
+            and key not in IGNORED_IDENTITY_KEYS
+            and isinstance(value, str)
+            and value
+        ):
+            values.add(value)
+    return values
+
+
+def value_references(node, owners):
+    """Names of the nodes whose identifying values this node's properties quote."""
+    names = set()
+    for value in string_values(node.body.get("Properties", {})):
+        # Exact value, or the resource part of an ARN / URL.
+        for candidate in (
+            value,
+            value.rsplit(":", 1)[-1],
+            value.rsplit("/", 1)[-1],
+        ):
+            owner = owners.get(candidate)
+            if owner is not None:
+                names.add(owner)
+    return names
+
+
+def build_graph(nodes, match_values=False):
+    """Link nodes by their dependencies and check the graph is acyclic.
+
+    Dependencies come from Ref / Fn::GetAtt and DependsOn. With
+    ``match_values``, property values quoting another node's name, ARN or
+    Identifier count as well; that guess can link unrelated resources, so
+    it is off unless asked for.
+    """
+    by_name = {node.name: node for node in nodes}
+    owners = {}
+    if match_values:
+        for node in nodes:
+            for value in identity_values(node):
+                owners.setdefault(value, node.name)
+
+    for node in nodes:
+        names = set(node.depends_on) | set(find_references(node.body))
+        if match_values:
+            names |= value_references(node, owners)
+        names.discard(node.name)
+
+        unknown = names - set(by_name)
+        if unknown:
+            raise ValueError(
+                f"{node.name} depends on unknown resources: {', '.join(sorted(unknown))}"
+            )
+        for name in names:
+            dependent, dependency = node, by_name[name]
+            # A resource can only be deleted once everything using it is gone.
+            if dependent.operation == "delete" and dependency.operation == "delete":
+                dependent, dependency = dependency, dependent
+            dependent.dependencies.add(dependency.name)
+            dependency.dependents.add(dependent.name)
+
+    execution_levels(nodes)
+    return by_name
+
+
+def execution_levels(nodes):
+    """Group nodes into levels that can run in parallel (Kahn's algorithm)."""
+    remaining = {node.name: len(node.dependencies) for node in nodes}
+    by_name = {node.name: node for node in nodes}
+    level = [name for name, count in remaining.items() if count == 0]
+    levels = []
+    while level:
+        levels.append(sorted(level))
+        next_level = []
+        for name in level:
+            for dependent in by_name[name].dependents:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    next_level.append(dependent)
+        level = next_level
+
+    if sum(len(level) for level in levels) != len(nodes):
+        cycle = sorted(name for name, count in remaining.items() if count > 0)
+        raise ValueError(f"Dependency cycle between: {', '.join(cycle)}")
+    return levels
+
+
+def resolve_references(value, by_name):
+    """Replace Ref / Fn::GetAtt with values from completed dependencies."""
+    if isinstance(value, dict):
+        if set(value) == {"Ref"} and value["Ref"] in by_name:
+            return by_name[value["Ref"]].identifier
+        if set(value) == {"Fn::GetAtt"}:
+            target = value["Fn::GetAtt"]
+            if isinstance(target, str):
+                target = target.split(".", 1)
+            name, attribute = target
+            model = by_name[name].resource_model
+            if attribute not in model:
+                raise ValueError(f"{name} has no attribute {attribute}")
+            return model[attribute]
+        return {key: resolve_references(item, by_name) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_references(item, by_name) for item in value]
+    return value
+
+
+class DagScheduler:
+    """Run resource operations in dependency order.
+
+    The nodes must already have been linked by ``build_graph``.
+    ``submit`` takes the list of nodes that just became ready and returns one
+    batch result per node, or a result with status "unchanged" (and the live
+    ResourceModel) for a node that needs no operation; ``wait`` blocks until
+    a submitted node reaches a terminal status and returns the status
+    details. Independent branches are waited on in parallel by ``workers``
+    threads.
+    """
+
+    def __init__(self, nodes, submit, wait, workers=4, on_update=None):
+        self.nodes = nodes
+        self.by_name = {node.name: node for node in nodes}
+        self.submit = submit
+        self.wait = wait
+        self.workers = workers
+        self.on_update = on_update or (lambda node: None)
+
+    def _set_status(self, node, status, error=None):
+        node.status = status
+        node.error = error
+        self.on_update(node)
+
+    def _skip_dependents(self, node):
+        for name in node.dependents:
+            dependent = self.by_name[name]
+            if dependent.status == "PENDING":
+                self._set_status(dependent, "SKIPPED", f"{node.name} did not succeed")
+                self._skip_dependents(dependent)
+
+    def _fail(self, node, error):
+        self._set_status(node, "FAILED", error)
+        self._skip_dependents(node)
+
+    def _submit_ready(self, ready, pool, futures):
+        """Submit ready nodes; returns the nodes unchanged ones made ready."""
+        released = []
+        submittable = []
+        for node in ready:
+            try:
+                node.body = resolve_references(node.body, self.by_name)
+            except Exception as e:
+                self._fail(node, str(e))
+                continue
+            submittable.append(node)
+        if not submittable:
+            return released
+
+        try:
+            results = self.submit(submittable)
+        except Exception as e:
+            for node in submittable:
+                self._fail(node, str(e))
+            return released
+
+        for node, result in zip(submittable, results):
+            if result["status"] == "unchanged":
+                event = {"OperationStatus": "SUCCESS"}
+                if result.get("ResourceModel") is not None:
+                    event["ResourceModel"] = json.dumps(result["ResourceModel"])
+                released.extend(self._complete(node, {"ProgressEvent": event}))
+                continue
+            if result["status"] != "success":
+                self._fail(node, result.get("error"))
+                continue
+            node.request_token = result["RequestToken"]
+            self._set_status(node, "IN_PROGRESS")
+            futures[pool.submit(self.wait, node)] = node
+        return released
+
+    def _complete(self, node, details):
+        event = details.get("ProgressEvent", {})
+        status = event.get("OperationStatus")
+        if status != "SUCCESS":
+            self._fail(node, event.get("StatusMessage") or status)
+            return []
+
+        node.identifier = event.get("Identifier") or node.identifier
+        if event.get("ResourceModel"):
+            node.resource_model = json.loads(event["ResourceModel"])
+        self._set_status(node, "SUCCESS")
+
+        ready = []
+        for name in node.dependents:
+            dependent = self.by_name[name]
+            if dependent.status == "PENDING" and all(
+                self.by_name[dependency].status == "SUCCESS"
+                for dependency in dependent.dependencies
+            ):
+                ready.append(dependent)
+        return ready
+
+    def run(self):
+        ready = [node for node in self.nodes if not node.dependencies]
+        futures = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while ready or futures:
+                if ready:
+                    ready = self._submit_ready(ready, pool, futures)
+                    continue
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = futures.pop(future)
+                    try:
+                        details = future.result()
+                    except Exception as e:
+                        self._fail(node, str(e))
+                        continue
+                    ready.extend(self._complete(node, details))
+        return self.nodes
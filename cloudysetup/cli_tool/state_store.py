@@ -0,0 +1,304 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+ACTIVE_STATUSES = ("PENDING", "IN_PROGRESS", "CANCEL_IN_PROGRESS")
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS resources ("
+    "id INTEGER PRIMARY KEY, "
+    "type_name TEXT NOT NULL, "
+    "identifier TEXT, "
+    "region TEXT NOT NULL DEFAULT '', "
+    "request_token TEXT, "
+    "operation TEXT, "
+    "status TEXT NOT NULL, "
+    "source TEXT, "
+    "properties TEXT, "
+    "status_message TEXT, "
+    "updated_at REAL NOT NULL, "
+    "reconciled_at REAL)",
+    # Leads with type_name, so it also serves lookups by type.
+    "CREATE UNIQUE INDEX IF NOT EXISTS resources_identity "
+    "ON resources (type_name, region, identifier)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS resources_request_token "
+    "ON resources (request_token)",
+    "CREATE INDEX IF NOT EXISTS resources_identifier ON resources (identifier)",
+    "CREATE INDEX IF NOT EXISTS resources_source ON resources (source)",
+    "CREATE TABLE IF NOT EXISTS reconcile_runs ("
+    "type_name TEXT NOT NULL, region TEXT NOT NULL, finished_at REAL NOT NULL, "
+    "PRIMARY KEY (type_name, region))",
+)
+
+COLUMNS = (
+    "type_name",
+    "identifier",
+    "region",
+    "request_token",
+    "operation",
+    "status",
+    "source",
+    "properties",
+    "status_message",
+    "updated_at",
+    "reconciled_at",
+)
+
+
+def as_json(properties):
+    if properties is None or isinstance(properties, str):
+        return properties
+    return json.dumps(properties, sort_keys=True)
+
+
+class StateStore:
+    """SQLite index of the resources created and changed through the CLI
+
+    Rows are keyed on the resource (TypeName, region, Identifier) once it is
+    known and on the last request token until then. Every lookup the CLI
+    makes is served by an index, without calling AWS.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        with conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+        try:
+            os.chmod(path, 0o600)
+        except OSError:
+            pass
+
+    def _connection(self):
+        # Deploy waits on resources from several threads; each gets its own.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _find(self, conn, type_name, region, identifier):
+        return conn.execute(
+            "SELECT * FROM resources WHERE type_name = ? AND region = ? "
+            "AND identifier = ?",
+            (type_name, region or "", identifier),
+        ).fetchone()
+
+    def record_submission(
+        self,
+        operation,
+        type_name,
+        request_token,
+        region=None,
+        identifier=None,
+        source=None,
+        properties=None,
+    ):
+        """Note a request the API accepted; it stays IN_PROGRESS until its status is seen"""
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            existing = conn.execute(
+                "SELECT id FROM resources WHERE request_token = ?", (request_token,)
+            ).fetchone()
+            if existing is None and identifier:
+                existing = self._find(conn, type_name, region, identifier)
+            if existing is not None:
+                conn.execute(
+                    "UPDATE resources SET request_token = ?, operation = ?, "
+                    "status = 'IN_PROGRESS', status_message = NULL, "
+                    "source = COALESCE(?, source), "
+                    "properties = COALESCE(?, properties), updated_at = ? "
+                    "WHERE id = ?",
+                    (
+                        request_token,
+                        operation,
+                        source,
+                        as_json(properties),
+                        now,
+                        existing["id"],
+                    ),
+                )
+                return
+            conn.execute(
+                "INSERT INTO resources (type_name, identifier, region, "
+                "request_token, operation, status, source, properties, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 'IN_PROGRESS', ?, ?, ?)",
+                (
+                    type_name,
+                    identifier,
+                    region or "",
+                    request_token,
+                    operation,
+                    source,
+                    as_json(properties),
+                    now,
+                ),
+            )
+
+    def record_status(self, event):
+        """Apply a ProgressEvent to the resource its request token belongs to
+
+        Tokens the index does not know are ignored, so watching requests made
+        elsewhere does not add them. A successful delete drops the row.
+        """
+        request_token = event.get("RequestToken")
+        if not request_token:
+            return
+        conn = self._connection()
+        with conn:
+            row = conn.execute(
+                "SELECT * FROM resources WHERE request_token = ?", (request_token,)
+            ).fetchone()
+            if row is None:
+                return
+            status = event.get("OperationStatus") or row["status"]
+            operation = (event.get("Operation") or row["operation"] or "").lower()
+            if status == "SUCCESS" and operation == "delete":
+                conn.execute("DELETE FROM resources WHERE id = ?", (row["id"],))
+                return
+
+            identifier = event.get("Identifier") or row["identifier"]
+            if identifier and identifier != row["identifier"]:
+                # An older row for the same resource gives way to this one.
+                conn.execute(
+                    "DELETE FROM resources WHERE type_name = ? AND region = ? "
+                    "AND identifier = ? AND id != ?",
+                    (row["type_name"], row["region"], identifier, row["id"]),
+                )
+            conn.execute(
+                "UPDATE resources SET identifier = ?, status = ?, "
+                "status_message = ?, properties = COALESCE(?, properties), "
+                "updated_at = ? WHERE id = ?",
+                (
+                    identifier,
+                    status,
+                    event.get("StatusMessage"),
+                    event.get("ResourceModel") or None,
+                    time.time(),
+                    row["id"],
+                ),
+            )
+
+    def record_resource(
+        self, type_name, identifier, region=None, source=None, properties=None
+    ):
+        """Record a resource known to exist as it is, e.g. one a plan left unchanged"""
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            existing = self._find(conn, type_name, region, identifier)
+            if existing is not None:
+                conn.execute(
+                    "UPDATE resources SET status = 'SUCCESS', "
+                    "source = COALESCE(?, source), "
+                    "properties = COALESCE(?, properties), updated_at = ? "
+                    "WHERE id = ?",
+                    (source, as_json(properties), now, existing["id"]),
+                )
+                return
+            conn.execute(
+                "INSERT INTO resources (type_name, identifier, region, status, "
+                "source, properties, updated_at) "
+                "VALUES (?, ?, ?, 'SUCCESS', ?, ?, ?)",
+                (type_name, identifier, region or "", source, as_json(properties), now),
+            )
+
+    def query(
+        self,
+        type_name=None,
+        identifier=None,
+        request_token=None,
+        source=None,
+        status=None,
+        region=None,
+    ):
+        filters = {
+            "type_name": type_name,
+            "identifier": identifier,
+            "request_token": request_token,
+            "source": source,
+            "status": status,
+            "region": region,
+        }
+        clauses = [f"{column} = ?" for column, value in filters.items() if value]
+        values = [value for value in filters.values() if value]
+        sql = f"SELECT {', '.join(COLUMNS)} FROM resources"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY type_name, identifier"
+        return [dict(row) for row in self._connection().execute(sql, values)]
+
+    def active_tokens(self):
+        """Request tokens still in flight, with their regions"""
+        placeholders = ", ".join("?" for _ in ACTIVE_STATUSES)
+        rows = self._connection().execute(
+            "SELECT request_token, region FROM resources "
+            f"WHERE status IN ({placeholders}) AND request_token IS NOT NULL",
+            ACTIVE_STATUSES,
+        )
+        return [(row["request_token"], row["region"]) for row in rows]
+
+    def reconcile_targets(self, max_age=0, type_names=()):
+        """(TypeName, region) pairs with resources not reconciled for max_age seconds"""
+        rows = self._connection().execute(
+            "SELECT DISTINCT r.type_name, r.region, runs.finished_at "
+            "FROM resources r LEFT JOIN reconcile_runs runs "
+            "ON runs.type_name = r.type_name AND runs.region = r.region "
+            "WHERE r.identifier IS NOT NULL"
+        )
+        cutoff = time.time() - max_age
+        return [
+            (row["type_name"], row["region"])
+            for row in rows
+            if (not type_names or row["type_name"] in type_names)
+            and (row["finished_at"] is None or row["finished_at"] < cutoff)
+        ]
+
+    def reconcile_page(self, type_name, region, rows, started_at):
+        """Refresh the indexed resources that appear in one page of ListResources"""
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "UPDATE resources SET properties = ?, reconciled_at = ?, "
+                "status = CASE WHEN status = 'MISSING' THEN 'SUCCESS' "
+                "ELSE status END "
+                "WHERE type_name = ? AND region = ? AND identifier = ?",
+                [
+                    (
+                        as_json(row.get("Properties")),
+                        started_at,
+                        type_name,
+                        region or "",
+                        row["Identifier"],
+                    )
+                    for row in rows
+                ],
+            )
+
+    def finish_reconcile(self, type_name, region, started_at):
+        """Mark indexed resources the full listing did not return as MISSING
+
+        Returns how many resources were marked.
+        """
+        conn = self._connection()
+        with conn:
+            marked = conn.execute(
+                "UPDATE resources SET status = 'MISSING' "
+                "WHERE type_name = ? AND region = ? AND status = 'SUCCESS' "
+                "AND identifier IS NOT NULL AND updated_at < ? "
+                "AND (reconciled_at IS NULL OR reconciled_at < ?)",
+                (type_name, region or "", started_at, started_at),
+            ).rowcount
+            conn.execute(
+                "INSERT OR REPLACE INTO reconcile_runs VALUES (?, ?, ?)",
+                (type_name, region or "", time.time()),
+            )
+        return marked
@@ -0,0 +1,122 @@
+import asyncio
+import os
+import random
+
+from botocore.exceptions import ClientError
+
+from .cloudcontrol_client import create_resource, delete_resource, update_resource
+from .executor import run_cloudcontrol
+from .idempotency import submission_dedup
+from .regions import resolve_region
+from .schema_registry import validate_request
+
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "10"))
+BATCH_MAX_RETRIES = int(os.getenv("BATCH_MAX_RETRIES", "5"))
+BATCH_BASE_DELAY = float(os.getenv("BATCH_BASE_DELAY", "0.5"))
+BATCH_MAX_DELAY = float(os.getenv("BATCH_MAX_DELAY", "20"))
+
+THROTTLING_ERRORS = {
+    "ThrottlingException",
+    "Throttling",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+}
+
+
+def is_throttling_error(error: Exception):
+    return (
+        isinstance(error, ClientError)
+        and error.response.get("Error", {}).get("Code") in THROTTLING_ERRORS
+    )
+
+
+async def call_with_backoff(func, *args, **kwargs):
+    """Run a Cloud Control call, backing off with full jitter when throttled.
+
+    The retries reuse the call's ClientToken, so none of them can apply twice.
+    """
+    for attempt in range(BATCH_MAX_RETRIES + 1):
+        try:
+            return await run_cloudcontrol(func, *args, **kwargs)
+        except Exception as e:
+            if not is_throttling_error(e) or attempt == BATCH_MAX_RETRIES:
+                raise
+            delay = min(BATCH_MAX_DELAY, BATCH_BASE_DELAY * 2**attempt)
+            await asyncio.sleep(random.uniform(0, delay))
+
+
+def operation_call(operation):
+    """Map one batch operation to its Cloud Control function and arguments."""
+    if operation.Operation == "create":
+        return create_resource, (operation.TypeName, operation.Properties)
+
+    if not operation.Identifier:
+        raise ValueError(f"Identifier is required for {operation.Operation}")
+
+    if operation.Operation == "delete":
+        return delete_resource, (operation.TypeName, operation.Identifier)
+
+    if not operation.PatchDocument:
+        raise ValueError("PatchDocument is required for update")
+    return update_resource, (
+        operation.TypeName,
+        operation.Identifier,
+        operation.PatchDocument,
+    )
+
+
+async def run_batch(
+    operations, credentials, max_concurrency: int = None, region: str = None
+):
+    """Submit operations concurrently, returning one result per operation in order.
+
+    Each operation runs in its own Region when it names one, else in ``region``.
+    """
+    limit = min(max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run_one(index, operation):
+        operation_region = operation.Region or region
+        try:
+            operation_region = resolve_region(operation_region)
+            func, args = operation_call(operation)
+            await validate_request(
+                operation.TypeName,
+                credentials,
+                properties=(
+                    operation.Properties if operation.Operation == "create" else None
+                ),
+                patch_document=(
+                    operation.PatchDocument if operation.Operation == "update" else None
+                ),
+            )
+            async with semaphore:
+                response, deduplicated = await submission_dedup.submit(
+                    func,
+                    args,
+                    credentials,
+                    operation_region,
+                    operation.ClientToken,
+                    call=call_with_backoff,
+                )
+        except Exception as e:
+            return {
+                "index": index,
+                "status": "error",
+                "TypeName": operation.TypeName,
+                "Region": operation_region,
+                "error": str(e),
+            }
+        return {
+            "index": index,
+            "status": "success",
+            "TypeName": operation.TypeName,
+            "Region": operation_region,
+            "RequestToken": response.get("ProgressEvent", {}).get("RequestToken"),
+            "deduplicated": deduplicated,
+            "details": response,
+        }
+
+    return await asyncio.gather(
+        *(run_one(index, operation) for index, operation in enumerate(operations))
+    )
@@ -0,0 +1,233 @@
+import hashlib
+import importlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import boto3
+from botocore.config import Config
+
+from .metrics import instrument_client
+
+# Clients built from long-term keys can live for a while; clients built from
+# temporary credentials are expired on the shortest STS session lifetime
+# (15 minutes) so we never hand out a client whose token has run out.
+DEFAULT_MAX_SIZE = int(os.getenv("CLOUDCONTROL_CLIENT_POOL_SIZE", "64"))
+DEFAULT_TTL = int(os.getenv("CLOUDCONTROL_CLIENT_TTL", "3600"))
+DEFAULT_SESSION_TTL = int(os.getenv("CLOUDCONTROL_SESSION_CLIENT_TTL", "900"))
+# Region used when a request does not name one. Clients are pooled per region.
+DEFAULT_REGION = os.getenv("CLOUDCONTROL_DEFAULT_REGION", "us-east-1")
+# Optional "module:function" called with every new boto3 client, e.g. to
+# answer its calls from the load-test stand-in in benchmarks/fake_aws.py.
+# Nothing is imported unless it is set.
+AWS_CLIENT_HOOK = os.getenv("AWS_CLIENT_HOOK")
+_client_hook = None
+
+
+def apply_client_hook(client):
+    """Pass a new client to AWS_CLIENT_HOOK, importing the hook on first use."""
+    global _client_hook
+    if not AWS_CLIENT_HOOK:
+        return client
+    if _client_hook is None:
+        module, _, name = AWS_CLIENT_HOOK.partition(":")
+        _client_hook = getattr(importlib.import_module(module), name or "install")
+    _client_hook(client)
+    return client
+
+
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "20"))
+BEDROCK_MAX_ATTEMPTS = int(os.getenv("BEDROCK_MAX_ATTEMPTS", "3"))
+BEDROCK_RETRY_MODE = os.getenv("BEDROCK_RETRY_MODE", "adaptive")
+BEDROCK_READ_TIMEOUT = int(os.getenv("BEDROCK_READ_TIMEOUT", "120"))
+
+
+def credentials_key(
+    aws_access_key: str,
+    aws_secret_key: str,
+    aws_session_token: str = None,
+    region_name: str = None,
+):
+    """Hash the caller credentials so raw secrets are never kept as pool keys."""
+    digest = hashlib.sha256()
+    region_name = region_name or DEFAULT_REGION
+    for part in (aws_access_key, aws_secret_key, aws_session_token or "", region_name):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def access_key_digest(aws_access_key: str):
+    return hashlib.sha256(aws_access_key.encode("utf-8")).hexdigest()
+
+
+class ClientPool:
+    """Bounded LRU + TTL pool of boto3 clients keyed by caller credentials."""
+
+    def __init__(
+        self,
+        service_name: str,
+        max_size: int = DEFAULT_MAX_SIZE,
+        ttl: int = DEFAULT_TTL,
+        session_ttl: int = DEFAULT_SESSION_TTL,
+    ):
+        self.service_name = service_name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.session_ttl = session_ttl
+        self._clients = OrderedDict()
+        # access key digest -> number of pooled clients built from it
+        self._access_keys = {}
+        self._lock = threading.Lock()
+        self._create_lock = threading.Lock()
+        self._session = boto3.session.Session()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_client(
+        self,
+        aws_access_key: str,
+        aws_secret_key: str,
+        aws_session_token: str = None,
+        region_name: str = None,
+    ):
+        region_name = region_name or DEFAULT_REGION
+        key = credentials_key(
+            aws_access_key, aws_secret_key, aws_session_token, region_name
+        )
+
+        client = self._lookup(key)
+        if client is not None:
+            return client
+
+        # boto3 sessions are not thread safe, so client construction is
+        # serialised; the lookup is repeated in case another thread won.
+        with self._create_lock:
+            client = self._lookup(key, count=False)
+            if client is not None:
+                return client
+
+            kwargs = {
+                "region_name": region_name,
+                "aws_access_key_id": aws_access_key,
+                "aws_secret_access_key": aws_secret_key,
+            }
+            if aws_session_token:
+                kwargs["aws_session_token"] = aws_session_token
+            client = instrument_client(
+                self._session.client(self.service_name, **kwargs)
+            )
+            apply_client_hook(client)
+
+            ttl = self.session_ttl if aws_session_token else self.ttl
+            self._store(
+                key, client, time.monotonic() + ttl, access_key_digest(aws_access_key)
+            )
+            return client
+
+    def knows_access_key(self, aws_access_key: str):
+        """Whether a client built from this access key is pooled."""
+        with self._lock:
+            return access_key_digest(aws_access_key) in self._access_keys
+
+    def _lookup(self, key, count=True):
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return None
+
+            client, expires_at, _ = entry
+            if expires_at <= time.monotonic():
+                self._discard(key)
+                self.expirations += 1
+                if count:
+                    self.misses += 1
+                return None
+
+            self._clients.move_to_end(key)
+            if count:
+                self.hits += 1
+            return client
+
+    def _store(self, key, client, expires_at, access_key):
+        with self._lock:
+            self._discard(key)
+            self._clients[key] = (client, expires_at, access_key)
+            self._access_keys[access_key] = self._access_keys.get(access_key, 0) + 1
+            while len(self._clients) > self.max_size:
+                self._discard(next(iter(self._clients)))
+                self.evictions += 1
+
+    def _discard(self, key):
+        """Remove a pooled client; the caller holds the lock."""
+        entry = self._clients.pop(key, None)
+        if entry is None:
+            return
+        access_key = entry[2]
+        self._access_keys[access_key] -= 1
+        if not self._access_keys[access_key]:
+            del self._access_keys[access_key]
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+            self._access_keys.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "service": self.service_name,
+                "size": len(self._clients),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+cloudcontrol_pool = ClientPool("cloudcontrol")
+cloudformation_pool = ClientPool("cloudformation")
+
+
+def known_access_key(aws_access_key: str):
+    """Whether this worker has built an AWS client from the access key."""
+    return cloudcontrol_pool.knows_access_key(
+        aws_access_key
+    ) or cloudformation_pool.knows_access_key(aws_access_key)
+
+
+_bedrock_client = None
+_bedrock_lock = threading.Lock()
+
+
+def get_bedrock_client():
+    """Return the process-wide bedrock-runtime client, creating it on first use."""
+    global _bedrock_client
+    if _bedrock_client is None:
+        with _bedrock_lock:
+            if _bedrock_client is None:
+                config = Config(
+                    max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS,
+                    tcp_keepalive=True,
+                    read_timeout=BEDROCK_READ_TIMEOUT,
+                    retries={
+                        "max_attempts": BEDROCK_MAX_ATTEMPTS,
+                        "mode": BEDROCK_RETRY_MODE,
+                    },
+                )
+                # Uses the task role on ECS and the local profile otherwise.
+                _bedrock_client = instrument_client(
+                    boto3.session.Session().client(
+                        service_name="bedrock-runtime", config=config
+                    )
+                )
+                apply_client_hook(_bedrock_client)
+    return _bedrock_client
@@ -1,7 +1,16 @@
-import boto3
 import json
-import os
-import re
+
+from .client_pool import cloudcontrol_pool, cloudformation_pool, get_bedrock_client
+from .json_extract import extract_json_array, extract_json_object
+from .logging_setup import get_logger, payload_fields
+from .metrics import record_bedrock_tokens
+
+logger = get_logger("bedrock")
+
+
+def client_token_kwargs(client_token: str = None):
+    """ClientToken makes Cloud Control treat a repeated request as a retry."""
+    return {"ClientToken": client_token} if client_token else {}
 
 
 def create_resource(
@@ -10,26 +19,18 @@ def create_resource(
     aws_access_key: str,
     aws_secret_key: str,
     aws_session_token: str = None,
+    region_name: str = None,
+    client_token: str = None,
 ):
 
-    if aws_session_token:
-        cloudcontrol_client = boto3.client(
-            "cloudcontrol",
-            region_name="us-east-1",
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret_key,
-            aws_session_token=aws_session_token,
-        )
-    else:
-        cloudcontrol_client = boto3.client(
-            "cloudcontrol",
-            region_name="us-east-1",
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret_key,
-        )
+    cloudcontrol_client = cloudcontrol_pool.get_client(
+        aws_access_key, aws_secret_key, aws_session_token, region_name
+    )
 
     response = cloudcontrol_client.create_resource(
-        TypeName=type_name, DesiredState=json.dumps(desired_state)
+        TypeName=type_name,
+        DesiredState=json.dumps(desired_state),
+        **client_token_kwargs(client_token),
     )
 
     return response
@@ -41,26 +42,18 @@ def delete_resource(
     aws_access_key: str,
     aws_secret_key: str,
     aws_session_token: str = None,
+    region_name: str = None,
+    client_token: str = None,
 ):
 
-    if aws_session_token:
-        cloudcontrol_client = boto3.client(
-            "cloudcontrol",
-            region_name="us-east-1",
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret_key,
-            aws_session_token=aws_session_token,
-        )
-    else:
-        cloudcontrol_client = boto3.client(
-            "cloudcontrol",
-            region_name="us-east-1",
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret_key,
-        )
+    cloudcontrol_client = cloudcontrol_pool.get_client(
+        aws_access_key, aws_secret_key, aws_session_token, region_name
+    )
 
     response = cloudcontrol_client.delete_resource(
-        TypeName=type_name, Identifier=identifier
+        TypeName=type_name,
+        Identifier=identifier,
+        **client_token_kwargs(client_token),
     )
 
     return response
@@ -73,136 +66,244 @@ def update_resource(
     aws_access_key: str,
     aws_secret_key: str,
     aws_session_token: str = None,
+    region_name: str = None,
+    client_token: str = None,
 ):
 
-    if aws_session_token:
-        cloudcontrol_client = boto3.client(
-            "cloudcontrol",
-            region_name="us-east-1",
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret_key,
-            aws_session_token=aws_session_token,
-        )
-    else:
-        cloudcontrol_client = boto3.client(
-            "cloudcontrol",
-            region_name="us-east-1",
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret_key,
-        )
+    cloudcontrol_client = cloudcontrol_pool.get_client(
+        aws_access_key, aws_secret_key, aws_session_token, region_name
+    )
 
     response = cloudcontrol_client.update_resource(
         TypeName=type_name,
         Identifier=identifier,
         PatchDocument=patch_document,
+        **client_token_kwargs(client_token),
     )
 
     return response
 
 
+def describe_resource_type(
+    type_name: str,
+    aws_access_key: str,
+    aws_secret_key: str,
+    aws_session_token: str = None,
+    region_name: str = None,
+):
+    cloudformation_client = cloudformation_pool.get_client(
+        aws_access_key, aws_secret_key, aws_session_token, region_name
+    )
+    response = cloudformation_client.describe_type(Type="RESOURCE", TypeName=type_name)
+    return response
+
+
 def get_resource_request_status(
-    request_token: str, aws_access_key: str, aws_secret_key: str, aws_session_token: str
+    request_token: str,
+    aws_access_key: str,
+    aws_secret_key: str,
+    aws_session_token: str,
+    region_name: str = None,
 ):
-    if aws_session_token:
-        cloudcontrol_client = boto3.client(
-            "cloudcontrol",
-            region_name="us-east-1",
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret_key,
-            aws_session_token=aws_session_token,
-        )
-    else:
-        cloudcontrol_client = boto3.client(
-            "cloudcontrol",
-            region_name="us-east-1",
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret_key,
-        )
+    cloudcontrol_client = cloudcontrol_pool.get_client(
+        aws_access_key, aws_secret_key, aws_session_token, region_name
+    )
     response = cloudcontrol_client.get_resource_request_status(
         RequestToken=request_token
     )
     return response
 
 
-def invoke_bedrock_model(prompt: str):
+def get_resource(
+    type_name: str,
+    identifier: str,
+    aws_access_key: str,
+    aws_secret_key: str,
+    aws_session_token: str = None,
+    region_name: str = None,
+):
+    cloudcontrol_client = cloudcontrol_pool.get_client(
+        aws_access_key, aws_secret_key, aws_session_token, region_name
+    )
+    response = cloudcontrol_client.get_resource(
+        TypeName=type_name, Identifier=identifier
+    )
+    return response
+
+
+def list_resources_page(
+    type_name: str,
+    aws_access_key: str,
+    aws_secret_key: str,
+    aws_session_token: str = None,
+    next_token: str = None,
+    max_results: int = None,
+    resource_model: dict = None,
+    region_name: str = None,
+):
+    """Fetch a single page of ListResources so callers can stream page by page."""
+    cloudcontrol_client = cloudcontrol_pool.get_client(
+        aws_access_key, aws_secret_key, aws_session_token, region_name
+    )
 
-    if "ECS_CONTAINER_METADATA_URI" in os.environ:
-        bedrock = boto3.client(service_name="bedrock-runtime")
-    else:
-        session = boto3.Session()
-        bedrock = session.client(service_name="bedrock-runtime")
-
-    native_request = {
-        "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": 300,
-        "temperature": 1,
-        "top_p": 0.999,
-        "top_k": 250,
-        "stop_sequences": [],
-        "messages": [
-            {
-                "role": "user",
-                "content": [{"type": "text", "text": prompt}],
-            }
-        ],
-    }
-
-    request = json.dumps(native_request)
-
-    MODEL_ID = "anthropic.claude-v2"
+    kwargs = {"TypeName": type_name}
+    if next_token:
+        kwargs["NextToken"] = next_token
+    if max_results:
+        kwargs["MaxResults"] = max_results
+    if resource_model:
+        kwargs["ResourceModel"] = json.dumps(resource_model)
+    return cloudcontrol_client.list_resources(**kwargs)
+
+
+def list_resource_requests(
+    aws_access_key: str,
+    aws_secret_key: str,
+    aws_session_token: str = None,
+    operation_statuses: list = None,
+    operations: list = None,
+    region_name: str = None,
+):
+    """Return the status summaries of recent requests, following every page."""
+    cloudcontrol_client = cloudcontrol_pool.get_client(
+        aws_access_key, aws_secret_key, aws_session_token, region_name
+    )
+
+    status_filter = {}
+    if operation_statuses:
+        status_filter["OperationStatuses"] = operation_statuses
+    if operations:
+        status_filter["Operations"] = operations
+
+    kwargs = {"ResourceRequestStatusFilter": status_filter} if status_filter else {}
+    paginator = cloudcontrol_client.get_paginator("list_resource_requests")
+    summaries = []
+    for page in paginator.paginate(**kwargs):
+        summaries.extend(page.get("ResourceRequestStatusSummaries", []))
+    return summaries
+
+
+MODEL_ID = "anthropic.claude-v2"
+
+INFERENCE_PARAMS = {
+    "max_tokens": 300,
+    "temperature": 1,
+    "top_p": 0.999,
+    "top_k": 250,
+    "stop_sequences": [],
+}
+
+# The combined mode returns template and suggestions in one reply, so it
+# needs room for both.
+COMBINED_MAX_TOKENS = 800
+
+SUGGESTIONS_PROMPT = "Create a suggested changes for each objects such as unique name and more descriptive etc. without suggesting values  and expand  for this AWS cloud control API request body and generate the suggestions in a array of strings. {template}"
+
+COMBINED_PROMPT = """{prompt}
+
+Respond with a single JSON object of the form {{"template": <the AWS Cloud Control API request body>, "suggestions": [<strings>]}}. The suggestions should describe changes for each object such as a unique name or a more descriptive value, without suggesting values."""
+
+
+def build_native_request(prompt: str, max_tokens: int = None):
+    native_request = {"anthropic_version": "bedrock-2023-05-31", **INFERENCE_PARAMS}
+    if max_tokens is not None:
+        native_request["max_tokens"] = max_tokens
+    native_request["messages"] = [
+        {
+            "role": "user",
+            "content": [{"type": "text", "text": prompt}],
+        }
+    ]
+    return native_request
+
+
+def invoke_model_text(prompt: str, max_tokens: int = None):
+    """Invoke the Bedrock model and return the text of its reply."""
+
+    bedrock = get_bedrock_client()
+
+    request = json.dumps(build_native_request(prompt, max_tokens))
     response = bedrock.invoke_model(
         body=request,
         modelId=MODEL_ID,
     )
 
     model_response = json.loads(response["body"].read())
-    response_text = model_response["content"][0]["text"]
-    json_match = re.search(r"\{.*\}", response_text, re.DOTALL)
-    if json_match:
-        response_json = json.loads(json_match.group())
-        print(response_json)
-        return response_json
-    else:
-        raise ValueError("No valid JSON found in the model response")
+    record_bedrock_tokens(MODEL_ID, model_response.get("usage"))
+    return model_response["content"][0]["text"]
 
 
-def ai_suggestions(prompt: str):
+def stream_model_text(prompt: str, max_tokens: int = None):
+    """Invoke the Bedrock model with response streaming, yielding text deltas."""
 
-    if "ECS_CONTAINER_METADATA_URI" in os.environ:
-        bedrock = boto3.client(service_name="bedrock-runtime")
-    else:
-        session = boto3.Session()
-        bedrock = session.client(service_name="bedrock-runtime")
-
-    native_request = {
-        "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": 300,
-        "temperature": 1,
-        "top_p": 0.999,
-        "top_k": 250,
-        "stop_sequences": [],
-        "messages": [
-            {
-                "role": "user",
-                "content": [{"type": "text", "text": prompt}],
-            }
-        ],
-    }
-
-    request = json.dumps(native_request)
-
-    MODEL_ID = "anthropic.claude-v2"
-    response = bedrock.invoke_model(
+    bedrock = get_bedrock_client()
+
+    request = json.dumps(build_native_request(prompt, max_tokens))
+    response = bedrock.invoke_model_with_response_stream(
         body=request,
         modelId=MODEL_ID,
     )
 
-    model_response = json.loads(response["body"].read())
-    response_text = model_response["content"][0]["text"]
-    json_match = re.search(r"\[.*?\]", response_text, re.DOTALL)
-    if json_match:
-        response_json = json.loads(json_match.group())
-        print(response_json)
-        return response_json
-    else:
-        raise ValueError("No valid JSON found in the model response")
+    try:
+        for event in response["body"]:
+            chunk = event.get("chunk")
+            if chunk is None:
+                continue
+            payload = json.loads(chunk["bytes"])
+            if payload.get("type") == "message_start":
+                # The output count here is a placeholder; message_delta
+                # carries the final one.
+                usage = payload["message"].get("usage", {})
+                record_bedrock_tokens(
+                    MODEL_ID, {"input_tokens": usage.get("input_tokens")}
+                )
+            elif payload.get("type") == "message_delta":
+                record_bedrock_tokens(MODEL_ID, payload.get("usage"))
+            elif payload.get("type") == "content_block_delta":
+                text = payload.get("delta", {}).get("text")
+                if text:
+                    yield text
+    finally:
+        response["body"].close()
+
+
+def invoke_bedrock_model(prompt: str):
+
+    response_text = invoke_model_text(prompt)
+    response_json = extract_json_object(response_text)
+    logger.info(
+        "template generated",
+        extra={
+            "type_name": response_json.get("TypeName"),
+            **payload_fields(response_json),
+        },
+    )
+    return response_json
+
+
+def ai_suggestions(prompt: str):
+
+    response_text = invoke_model_text(prompt)
+    response_json = extract_json_array(response_text)
+    logger.info(
+        "suggestions generated",
+        extra={"count": len(response_json), **payload_fields(response_json)},
+    )
+    return response_json
+
+
+def generate_template_with_suggestions(prompt: str):
+    """Produce the template and its suggestions from a single model call."""
+
+    response_text = invoke_model_text(
+        COMBINED_PROMPT.format(prompt=prompt), max_tokens=COMBINED_MAX_TOKENS
+    )
+    response_json = extract_json_object(response_text)
+    if "template" not in response_json:
+        # The model ignored the envelope; treat the whole object as the template.
+        return response_json, []
+
+    suggestions = response_json.get("suggestions") or []
+    if not isinstance(suggestions, list):
+        suggestions = [str(suggestions)]
+    return response_json["template"], suggestions
@@ -0,0 +1,53 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Bedrock and Cloud Control calls get separate bounded pools so a handful of
+# slow model invocations can never take every thread needed for status polls.
+BEDROCK_WORKERS = int(os.getenv("BEDROCK_EXECUTOR_WORKERS", "8"))
+CLOUDCONTROL_WORKERS = int(os.getenv("CLOUDCONTROL_EXECUTOR_WORKERS", "16"))
+# SQLite allows one writer at a time, so a couple of threads are plenty.
+CACHE_WORKERS = int(os.getenv("CACHE_EXECUTOR_WORKERS", "2"))
+
+bedrock_executor = ThreadPoolExecutor(
+    max_workers=BEDROCK_WORKERS, thread_name_prefix="bedrock"
+)
+cloudcontrol_executor = ThreadPoolExecutor(
+    max_workers=CLOUDCONTROL_WORKERS, thread_name_prefix="cloudcontrol"
+)
+cache_executor = ThreadPoolExecutor(
+    max_workers=CACHE_WORKERS, thread_name_prefix="cache"
+)
+
+
+async def run_in_executor(executor, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Carry the request's context into the thread so per-request timings
+    # recorded there end up on the right response.
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        executor, functools.partial(context.run, func, *args, **kwargs)
+    )
+
+
+async def run_bedrock(func, *args, **kwargs):
+    """Run a blocking Bedrock call without blocking the event loop."""
+    return await run_in_executor(bedrock_executor, func, *args, **kwargs)
+
+
+async def run_cloudcontrol(func, *args, **kwargs):
+    """Run a blocking Cloud Control call without blocking the event loop."""
+    return await run_in_executor(cloudcontrol_executor, func, *args, **kwargs)
+
+
+async def run_cache(func, *args, **kwargs):
+    """Run a blocking cache read or write (SQLite) without blocking the event loop."""
+    return await run_in_executor(cache_executor, func, *args, **kwargs)
+
+
+def shutdown_executors():
+    bedrock_executor.shutdown(wait=False)
+    cloudcontrol_executor.shutdown(wait=False)
+    cache_executor.shutdown(wait=False)
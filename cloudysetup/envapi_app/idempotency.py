@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+from .client_pool import credentials_key
+from .executor import run_cloudcontrol
+from .singleflight import SingleFlight
+from .status_poller import TERMINAL_STATUSES, operation_status, status_poller
+
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "1") != "0"
+# A submission is answered from the dedup table while it is repeated within
+# this many seconds of the last time it was seen. It covers client retries of
+# one request, not the same configuration submitted again as new work.
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "30"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "4096"))
+
+
+def canonical_argument(value):
+    """JSON documents compare by content, whatever their key order or spacing."""
+    if isinstance(value, str) and value[:1] in ("{", "["):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+    return value
+
+
+def submission_material(func, args, region: str):
+    """The operation, region, TypeName and canonical payload of a submission."""
+    return json.dumps(
+        {
+            "call": func.__name__,
+            "region": region,
+            "args": [canonical_argument(arg) for arg in args],
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+
+
+def derive_client_token(access_key: str, material: str, salt: str):
+    """A ClientToken for one submission, unique to it through the salt."""
+    payload = f"{access_key}\n{salt}\n{material}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+def submission_resource(func, args):
+    """The (TypeName, Identifier) a submission acts on; creates have no Identifier yet."""
+    if func.__name__ == "create_resource":
+        return args[0], None
+    return args[0], args[1]
+
+
+class SubmissionDedup:
+    """Recent create, update and delete submissions of this worker.
+
+    A repeated submission (same credentials, region, TypeName and canonical
+    DesiredState or patch) is answered with the first one's response without
+    calling Cloud Control while it is retried within the TTL and its request
+    has not finished, and identical submissions in flight at once share one
+    call. Any other update or delete of the same resource drops what is
+    recorded for it, so a configuration submitted again after the resource
+    changed is carried out rather than replayed. A submission without a
+    ClientToken gets a fresh one; the CLI sends its own with every
+    submission, so a retry that reaches another worker, or arrives after the
+    TTL, is still recognised by Cloud Control.
+    """
+
+    def __init__(
+        self,
+        ttl: int = IDEMPOTENCY_TTL,
+        max_entries: int = IDEMPOTENCY_MAX_ENTRIES,
+        enabled: bool = IDEMPOTENCY_ENABLED,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        # key -> (response, last seen, resources the entry is filed under)
+        self._entries = OrderedDict()
+        # resource -> keys of the entries filed under it
+        self._by_resource = {}
+        # resource -> count of the updates and deletes submitted for it
+        self._generations = {}
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    def _lookup(self, key, credentials, region):
+        """The recorded response while it may still be replayed."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        response, seen_at, _ = entry
+        if time.monotonic() - seen_at >= self.ttl:
+            self._drop(key)
+            return None
+        request_token = response.get("ProgressEvent", {}).get("RequestToken")
+        details = status_poller.last_known(request_token, credentials, region)
+        if details is not None and operation_status(details) in TERMINAL_STATUSES:
+            # A finished request is not retried by anyone; the same
+            # submission again is new work.
+            self._drop(key)
+            return None
+        self._entries[key] = (response, time.monotonic(), entry[2])
+        self._entries.move_to_end(key)
+        return response
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for resource in entry[2]:
+            keys = self._by_resource.get(resource)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_resource[resource]
+
+    def _invalidate(self, resource):
+        """Forget every submission recorded for a resource about to change."""
+        self._generations[resource] = self._generations.get(resource, 0) + 1
+        for key in list(self._by_resource.get(resource, ())):
+            self._drop(key)
+            self.invalidated += 1
+
+    def _store(self, key, response, resources):
+        self._drop(key)
+        self._entries[key] = (response, time.monotonic(), resources)
+        for resource in resources:
+            self._by_resource.setdefault(resource, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    async def _submit(
+        self, key, call, func, args, credentials, region, client_token, resource
+    ):
+        generation = self._generations.get(resource, 0)
+        response = await call(
+            func, *args, *credentials, region, client_token=client_token
+        )
+        if self._generations.get(resource, 0) != generation:
+            # The resource was changed by another submission meanwhile.
+            return response
+        resources = (resource,)
+        identifier = response.get("ProgressEvent", {}).get("Identifier")
+        if resource[2] is None and identifier:
+            resources += ((resource[0], resource[1], identifier),)
+        self._store(key, response, resources)
+        return response
+
+    async def submit(
+        self,
+        func,
+        args: tuple,
+        credentials,
+        region: str,
+        client_token: str = None,
+        call=run_cloudcontrol,
+    ):
+        """Run ``func(*args, *credentials, region, client_token=...)`` at most once.
+
+        Returns ``(response, deduplicated)``. A ``client_token`` given by the
+        caller is used as is instead of a fresh one.
+        """
+        if not self.enabled:
+            response = await call(
+                func, *args, *credentials, region, client_token=client_token
+            )
+            return response, False
+
+        material = submission_material(func, args, region)
+        if client_token:
+            material += "\n" + client_token
+        scope = credentials_key(*credentials, region_name=region)
+        key = (scope, material)
+        response = self._lookup(key, credentials, region)
+        if response is not None:
+            self.hits += 1
+            return response, True
+
+        self.misses += 1
+        resource = (scope, *submission_resource(func, args))
+        if resource[2] is not None and not self._flight.inflight(key):
+            # Creates of this type may have made the resource, so they go too.
+            self._invalidate(resource)
+            self._invalidate((scope, resource[1], None))
+        if not client_token:
+            client_token = derive_client_token(
+                credentials[0], material, uuid.uuid4().hex
+            )
+        response = await self._flight.do(
+            key,
+            self._submit,
+            key,
+            call,
+            func,
+            args,
+            credentials,
+            region,
+            client_token,
+            resource,
+        )
+        return response, False
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidated": self.invalidated,
+            "coalesced": self._flight.coalesced,
+        }
+
+
+submission_dedup = SubmissionDedup()
@@ -0,0 +1,241 @@
+import json
+import re
+from typing import Any, NamedTuple
+
+_CLOSERS = {"{": "}", "[": "]"}
+_STRUCTURE = re.compile(r'[{}\[\]"]')
+_STRING = re.compile(r'["\\]')
+# Characters of failed spans that may be scanned again, per character fed.
+RESCAN_BUDGET = 4
+# Bracket pairs nested deeper than this are not decoded, which keeps
+# json.loads well inside the recursion limit; values inside them still are.
+MAX_NESTING = 256
+
+
+class JsonCandidate(NamedTuple):
+    value: Any
+    # Character offsets into everything fed so far; end is exclusive.
+    start: int
+    end: int
+
+
+def decode(text: str):
+    """The value of a JSON object or array, or None if text is not one."""
+    try:
+        return json.loads(text)
+    except (ValueError, RecursionError):
+        return None
+
+
+class JsonExtractor:
+    """Single-pass scanner for JSON objects and arrays embedded in model text.
+
+    Text can be fed in arbitrary chunks. Each top-level span whose brackets
+    balance is decoded once it closes. The scanner remembers where every
+    matched bracket pair inside the span starts and ends, so when the span is
+    not JSON (prose such as "a {placeholder}", a mismatched bracket, or text
+    still open at ``finish``) the valid values nested in it are decoded from
+    those offsets without scanning the span again.
+
+    A stray quote can hide values instead, by swallowing the real object into
+    a "string". A failed span with a bracket inside one of its strings is
+    therefore scanned again from its second character, but only up to
+    RESCAN_BUDGET characters per character fed; past that it is treated like
+    any other failed span, and values hidden that way are not found. The cost
+    stays linear in the length of the text whatever it holds.
+    """
+
+    def __init__(self, kinds: str = "{["):
+        self.kinds = kinds
+        self._start_re = re.compile("[" + re.escape(kinds) + "]")
+        self._offset = 0
+        self._budget = 0
+        self._reset()
+
+    def _reset(self):
+        self._root_start = None
+        # Open brackets as [closer, start, matched pairs directly inside,
+        # nesting depth of those pairs]; a matched pair is (start, end,
+        # matched pairs directly inside, nesting depth).
+        self._stack = []
+        self._buffer = []
+        self._in_string = False
+        self._escaped = False
+        # Whether a string in the span held a bracket that could start a value.
+        self._hidden = False
+
+    def feed(self, text: str):
+        """Scan the next chunk and return the candidates completed by it."""
+        self._budget += RESCAN_BUDGET * len(text)
+        found = self._scan([(text, self._offset, 0)])
+        self._offset += len(text)
+        return found
+
+    def finish(self):
+        """Flush an unterminated span, returning any complete values inside it."""
+        found = []
+        while self._root_start is not None:
+            span = "".join(self._buffer)
+            values, rescan = self._give_up(span, self._matched())
+            found.extend(values)
+            if rescan is not None:
+                found.extend(self._scan([rescan]))
+        return found
+
+    def _matched(self):
+        """The bracket pairs matched so far inside the open span, in order."""
+        return [pair for entry in self._stack for pair in entry[2]]
+
+    def _give_up(self, span: str, pairs: list):
+        """Drop a failed span, returning its values or the part to scan again."""
+        root_start, hidden = self._root_start, self._hidden
+        self._reset()
+        if hidden and len(span) - 1 <= self._budget:
+            self._budget -= len(span) - 1
+            return [], (span[1:], root_start + 1, 0)
+        return self._values(span, root_start, pairs), None
+
+    def _values(self, span: str, base: int, pairs: list):
+        """Decode the outermost valid values among matched bracket pairs.
+
+        A pair is valid when the pairs inside it are and its own text, with
+        each of them replaced by null, is JSON. Checked innermost first, that
+        reads every character once however deeply the pairs nest.
+        """
+        valid = {}
+        pending = [(pair, False) for pair in reversed(pairs)]
+        while pending:
+            pair, checked_inner = pending.pop()
+            start, end, inner, depth = pair
+            if not checked_inner:
+                pending.append((pair, True))
+                pending.extend((child, False) for child in reversed(inner))
+                continue
+            if depth > MAX_NESTING or not all(valid[child[0]] for child in inner):
+                valid[start] = False
+                continue
+            pieces = []
+            position = start - base
+            for child_start, child_end, _, _ in inner:
+                pieces.append(span[position : child_start - base])
+                pieces.append("null")
+                position = child_end - base
+            pieces.append(span[position : end - base])
+            valid[start] = decode("".join(pieces)) is not None
+
+        found = []
+        pending = list(reversed(pairs))
+        while pending:
+            start, end, inner, _ = pending.pop()
+            if valid[start] and span[start - base] in self.kinds:
+                value = decode(span[start - base : end - base])
+                if value is not None:
+                    found.append(JsonCandidate(value, start, end))
+                    continue
+            pending.extend(reversed(inner))
+        return found
+
+    def _scan(self, work: list):
+        """Scan (text, offset of text, position) items, last one first."""
+        found = []
+        while work:
+            text, base, pos = work.pop()
+            segment_start = pos
+            length = len(text)
+            failed = False
+
+            while pos < length:
+                if self._root_start is None:
+                    match = self._start_re.search(text, pos)
+                    if match is None:
+                        break
+                    pos = match.start()
+                    self._root_start = base + pos
+                    self._stack.append([_CLOSERS[text[pos]], base + pos, [], 0])
+                    segment_start = pos
+                    pos += 1
+                    continue
+
+                if self._in_string:
+                    if self._escaped:
+                        self._escaped = False
+                        pos += 1
+                        continue
+                    match = _STRING.search(text, pos)
+                    stop = length if match is None else match.start()
+                    if not self._hidden and self._start_re.search(text, pos, stop):
+                        self._hidden = True
+                    if match is None:
+                        pos = length
+                    elif match.group() == "\\":
+                        self._escaped = True
+                        pos = match.end()
+                    else:
+                        self._in_string = False
+                        pos = match.end()
+                    continue
+
+                match = _STRUCTURE.search(text, pos)
+                if match is None:
+                    pos = length
+                    continue
+
+                pos = match.end()
+                char = match.group()
+                if char == '"':
+                    self._in_string = True
+                    continue
+                if char in _CLOSERS:
+                    self._stack.append([_CLOSERS[char], base + match.start(), [], 0])
+                    continue
+
+                if char == self._stack[-1][0]:
+                    _, start, inner, depth = self._stack.pop()
+                    if self._stack:
+                        parent = self._stack[-1]
+                        parent[2].append((start, base + pos, inner, depth + 1))
+                        parent[3] = max(parent[3], depth + 1)
+                        continue
+                    span = "".join(self._buffer) + text[segment_start:pos]
+                    value = decode(span)
+                    if value is not None:
+                        found.append(JsonCandidate(value, start, base + pos))
+                        self._reset()
+                        continue
+                    values, rescan = self._give_up(span, inner)
+                else:
+                    # A mismatched bracket ends the span here.
+                    span = "".join(self._buffer) + text[segment_start:pos]
+                    values, rescan = self._give_up(span, self._matched())
+                found.extend(values)
+                work.append((text, base, pos))
+                if rescan is not None:
+                    work.append(rescan)
+                failed = True
+                break
+
+            if not failed and self._root_start is not None:
+                self._buffer.append(text[segment_start:])
+        return found
+
+
+def extract_json_values(text: str, kinds: str = "{["):
+    """Return every valid JSON object/array in text with its offsets."""
+    extractor = JsonExtractor(kinds)
+    return extractor.feed(text) + extractor.finish()
+
+
+def extract_first_json(text: str, kinds: str = "{["):
+    extractor = JsonExtractor(kinds)
+    candidates = extractor.feed(text) or extractor.finish()
+    if not candidates:
+        raise ValueError("No valid JSON found in the model response")
+    return candidates[0].value
+
+
+def extract_json_object(text: str):
+    return extract_first_json(text, "{")
+
+
+def extract_json_array(text: str):
+    return extract_first_json(text, "[")
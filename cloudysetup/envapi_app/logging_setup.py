@@ -0,0 +1,226 @@
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import time
+import traceback
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Share of log lines that carry the full model output or configuration.
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.1"))
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+# Keys whose values never reach the logs, matched case-insensitively.
+LOG_REDACT_KEYS = {
+    key.strip().lower()
+    for key in os.getenv(
+        "LOG_REDACT_KEYS",
+        "aws-access-key,aws-secret-key,aws-session-token,aws_access_key,"
+        "aws_secret_key,aws_session_token,secretaccesskey,sessiontoken,"
+        "password,masteruserpassword,secretstring,authorization",
+    ).split(",")
+    if key.strip()
+}
+# "values" keeps the shape of resource properties but masks every value;
+# "none" logs them as they are.
+LOG_REDACT_PROPERTIES = os.getenv("LOG_REDACT_PROPERTIES", "values")
+PROPERTY_KEYS = {"properties", "desiredstate", "resourcemodel", "patchdocument"}
+REDACTED = "***"
+
+# Fields every LogRecord has; anything else was passed through ``extra``.
+RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message",
+    "asctime",
+    "request_id",
+}
+
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+_listener = None
+
+
+def mask_values(value):
+    if isinstance(value, dict):
+        return {key: mask_values(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [mask_values(item) for item in value]
+    return REDACTED
+
+
+def redact(value, mask_properties: bool = None):
+    """Copy value with credentials removed and, if configured, properties masked."""
+    if mask_properties is None:
+        mask_properties = LOG_REDACT_PROPERTIES == "values"
+    if isinstance(value, dict):
+        redacted = {}
+        for key, item in value.items():
+            lowered = str(key).lower()
+            if lowered in LOG_REDACT_KEYS:
+                redacted[key] = REDACTED
+            elif mask_properties and lowered in PROPERTY_KEYS:
+                redacted[key] = mask_values(item)
+            else:
+                redacted[key] = redact(item, mask_properties)
+        return redacted
+    if isinstance(value, list):
+        return [redact(item, mask_properties) for item in value]
+    return value
+
+
+def payload_fields(payload, mask_properties: bool = None):
+    """Log fields for a verbose payload, included only for a sample of calls."""
+    if random.random() >= LOG_PAYLOAD_SAMPLE_RATE:
+        return {"payload_sampled": False}
+    text = json.dumps(redact(payload, mask_properties), default=str)
+    if len(text) > LOG_PAYLOAD_MAX_CHARS:
+        text = text[:LOG_PAYLOAD_MAX_CHARS] + "...(truncated)"
+    return {"payload_sampled": True, "payload": text}
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key in RECORD_FIELDS or key.startswith("_"):
+                continue
+            if key.lower() in LOG_REDACT_KEYS:
+                entry[key] = REDACTED
+            else:
+                entry[key] = redact(value, mask_properties=False)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Hand records to the listener thread; drop them rather than block when full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Only resolve what cannot cross threads; JSON encoding happens on
+        # the listener.
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level: str = LOG_LEVEL):
+    """Route the app's loggers through a background JSON writer. Idempotent."""
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+    app_logger = logging.getLogger("cloudysetup")
+    app_logger.handlers = [queue_handler]
+    app_logger.setLevel(level)
+    app_logger.propagate = False
+
+
+def stop_logging():
+    """Flush queued records; called on shutdown."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str):
+    return logging.getLogger(f"cloudysetup.{name}")
+
+
+class RequestLogMiddleware:
+    """Give each request an id (X-Request-ID) and write one access log line.
+
+    The id is kept in a context variable, which the executor helpers carry
+    into their threads, so every log line of the request shares it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.logger = get_logger("access")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers", []))
+        supplied = headers.get(b"x-request-id", b"").decode("latin-1")
+        # A caller-supplied id (e.g. from the CLI) is kept if it is sane.
+        if REQUEST_ID_PATTERN.match(supplied):
+            request_id = supplied
+        else:
+            request_id = uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (b"x-request-id", request_id.encode("latin-1")),
+                    ],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or scope["path"]
+            self.logger.info(
+                "request",
+                extra={
+                    "method": scope["method"],
+                    "route": route,
+                    "status": status,
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                },
+            )
+            request_id_var.reset(token)
@@ -1,37 +1,109 @@
-from fastapi import FastAPI, HTTPException, Request
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Literal, Optional
+
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel
 from .cloudcontrol_client import (
     create_resource,
     delete_resource,
     update_resource,
-    get_resource_request_status,
+    get_resource,
+    list_resources_page,
     invoke_bedrock_model,
     ai_suggestions,
+    generate_template_with_suggestions,
+    stream_model_text,
+    SUGGESTIONS_PROMPT,
+    MODEL_ID,
+    INFERENCE_PARAMS,
 )
+from .batch import run_batch
+from .client_pool import cloudcontrol_pool, cloudformation_pool
+from .executor import run_bedrock, run_cloudcontrol, shutdown_executors
+from .idempotency import submission_dedup
+from .json_extract import JsonExtractor
+from .logging_setup import (
+    RequestLogMiddleware,
+    get_logger,
+    payload_fields,
+    setup_logging,
+    stop_logging,
+)
+from .metrics import (
+    MetricsMiddleware,
+    monitor_event_loop_lag,
+    set_type_name_check,
+    stats_collector,
+)
+from .plan import run_plan
+from .rate_limit import limiter
+from .regions import fan_out, resolve_region, resolve_regions
+from .schema_registry import schema_registry, validate_request
+from .singleflight import SingleFlight
+from .status_poller import TERMINAL_STATUSES, operation_status, status_poller
+from .template_cache import cache_key, template_cache
 from .utils import extract_aws_credentials
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
 
+setup_logging()
+logger = get_logger("api")
 
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestLogMiddleware)
+
+event_loop_monitor = None
+
 
-# Initialize the limiter
-limiter = Limiter(key_func=get_remote_address)
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+@app.on_event("startup")
+async def startup_event():
+    global event_loop_monitor
+    event_loop_monitor = asyncio.ensure_future(monitor_event_loop_lag())
 
-app.add_middleware(SlowAPIMiddleware)
+
+@app.on_event("shutdown")
+def shutdown_event():
+    if event_loop_monitor is not None:
+        event_loop_monitor.cancel()
+    shutdown_executors()
+    stop_logging()
 
 
 class MessageRequest(BaseModel):
     TypeName: str
     Properties: dict
+    Region: Optional[str] = None
+    # Overrides the ClientToken the server derives from the request.
+    ClientToken: Optional[str] = None
 
 
 class ResourceRequestStatus(BaseModel):
     request_token: str
+    region: Optional[str] = None
+    # Look the token up in each of these regions at once when its region
+    # is not known.
+    regions: List[str] = []
+
+
+class ResourceRequestsQuery(BaseModel):
+    request_tokens: List[str] = []
+    operation_statuses: List[str] = []
+    operations: List[str] = []
+    region: Optional[str] = None
+    # Query every listed region concurrently and merge the summaries.
+    regions: List[str] = []
+
+
+class ResourceStatusWaitRequest(BaseModel):
+    request_token: str
+    # Seconds to hold the request open; capped by STATUS_MAX_WAIT.
+    timeout: float = 25
+    region: Optional[str] = None
 
 
 class MessageResponse(BaseModel):
@@ -42,27 +114,94 @@ class MessageResponse(BaseModel):
 class TemplateRequest(BaseModel):
     prompt: str
     properties: dict = {}
+    # "pipeline" runs separate template and suggestions calls, "single" asks
+    # the model for both in one structured reply.
+    mode: Literal["pipeline", "single"] = "pipeline"
+    # Only used by the pipeline mode: "defer" returns immediately with a
+    # suggestions_id that can be fetched from /suggestions/{suggestions_id}.
+    suggestions: Literal["inline", "skip", "defer"] = "inline"
 
 
 class TemplateResponse(BaseModel):
     request_data: dict
     suggestions: list = []
+    suggestions_id: Optional[str] = None
+    cached: bool = False
 
 
 class ResourceRequest(BaseModel):
     TypeName: str
     Properties: dict
+    Region: Optional[str] = None
+    ClientToken: Optional[str] = None
 
 
 class DeleteResourceRequest(BaseModel):
     TypeName: str
     Identifier: str
+    Region: Optional[str] = None
+    ClientToken: Optional[str] = None
 
 
 class UpdateResourceRequest(BaseModel):
     TypeName: str
     Identifier: str
     PatchDocument: str
+    Region: Optional[str] = None
+    ClientToken: Optional[str] = None
+
+
+class ReadResourceRequest(BaseModel):
+    TypeName: str
+    Identifier: str
+    Region: Optional[str] = None
+
+
+class ListResourceRequest(BaseModel):
+    TypeName: str
+    NextToken: Optional[str] = None
+    # Page size requested from Cloud Control (it caps this at 100).
+    MaxResults: Optional[int] = None
+    # Stop after this many pages and hand the NextToken back to the caller.
+    MaxPages: Optional[int] = None
+    ResourceModel: Optional[dict] = None
+    Region: Optional[str] = None
+    # List every region concurrently; rows carry their Region and are
+    # streamed as each region's pages arrive. MaxPages applies per region.
+    Regions: List[str] = []
+    # Per-region continuation tokens from the last line of a fan-out listing.
+    NextTokens: Dict[str, Optional[str]] = {}
+
+
+class BatchOperation(BaseModel):
+    Operation: Literal["create", "update", "delete"]
+    TypeName: str
+    Properties: dict = {}
+    Identifier: Optional[str] = None
+    PatchDocument: Optional[str] = None
+    # Overrides the batch Region for this operation.
+    Region: Optional[str] = None
+    ClientToken: Optional[str] = None
+
+
+class BatchRequest(BaseModel):
+    Operations: List[BatchOperation]
+    MaxConcurrency: Optional[int] = None
+    Region: Optional[str] = None
+
+
+class PlanResource(BaseModel):
+    TypeName: str
+    # The live resource to compare with; without one the plan is a create.
+    Identifier: Optional[str] = None
+    Properties: dict = {}
+    Region: Optional[str] = None
+
+
+class PlanRequest(BaseModel):
+    Resources: List[PlanResource]
+    MaxConcurrency: Optional[int] = None
+    Region: Optional[str] = None
 
 
 @app.get("/")
@@ -71,72 +210,318 @@ def read_root(request: Request):
     return {"message:": "Hello World"}
 
 
+MAX_DEFERRED_SUGGESTIONS = 256
+deferred_suggestions = OrderedDict()
+
+# Identical generations in flight at the same time share one Bedrock
+# invocation. Bedrock runs with the service's own credentials, so the result
+# can be handed to every caller.
+bedrock_flight = SingleFlight()
+
+
+async def coalesced_bedrock(func, prompt: str):
+    """Run a Bedrock helper, joining an identical call that is already running."""
+    key = cache_key(prompt, MODEL_ID, {**INFERENCE_PARAMS, "call": func.__name__})
+    return await bedrock_flight.do(key, run_bedrock, func, prompt)
+
+
+def defer_suggestions(template_data: dict):
+    suggestions_id = uuid.uuid4().hex
+    deferred_suggestions[suggestions_id] = asyncio.ensure_future(
+        coalesced_bedrock(
+            ai_suggestions, SUGGESTIONS_PROMPT.format(template=template_data)
+        )
+    )
+    while len(deferred_suggestions) > MAX_DEFERRED_SUGGESTIONS:
+        _, task = deferred_suggestions.popitem(last=False)
+        task.cancel()
+    return suggestions_id
+
+
+def format_server_timing(timings: dict):
+    return ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in timings.items())
+
+
+def cache_directives(request: Request):
+    header = request.headers.get("cache-control", "")
+    return {directive.strip().lower() for directive in header.split(",")}
+
+
+def template_cache_key(template: TemplateRequest):
+    return cache_key(
+        template.prompt,
+        MODEL_ID,
+        {
+            **INFERENCE_PARAMS,
+            "mode": template.mode,
+            "suggestions": template.suggestions,
+        },
+    )
+
+
 @app.post("/generate-template", response_model=TemplateResponse)
-async def generate_template(template: TemplateRequest, request: Request):
+async def generate_template(
+    template: TemplateRequest, request: Request, response: Response
+):
+    timings = {}
+    suggestions_id = None
+    suggestions_response = []
+
+    # Deferred suggestions hand out a per-request id, so only complete
+    # responses are cached. "no-cache" skips the lookup, "no-store" also
+    # skips storing the fresh result.
+    directives = cache_directives(request)
+    cacheable = template.suggestions != "defer"
+    key = template_cache_key(template)
+    if cacheable and not directives & {"no-cache", "no-store"}:
+        start = time.perf_counter()
+        cached_response = await template_cache.get(key)
+        if cached_response is not None:
+            timings["cache"] = (time.perf_counter() - start) * 1000
+            response.headers["Server-Timing"] = format_server_timing(timings)
+            response.headers["X-Cache"] = "HIT"
+            return {**cached_response, "cached": True}
+
+    try:
+        if template.mode == "single":
+            start = time.perf_counter()
+            bedrock_response, suggestions_response = await coalesced_bedrock(
+                generate_template_with_suggestions, template.prompt
+            )
+            timings["generate"] = (time.perf_counter() - start) * 1000
+        else:
+            # Invoke bedrock model
+            start = time.perf_counter()
+            bedrock_response = await coalesced_bedrock(
+                invoke_bedrock_model, template.prompt
+            )
+            timings["template"] = (time.perf_counter() - start) * 1000
+
+            # Invoke suggestions model to provide suggestions
+            if template.suggestions == "inline":
+                start = time.perf_counter()
+                suggestions_response = await coalesced_bedrock(
+                    ai_suggestions,
+                    SUGGESTIONS_PROMPT.format(template=bedrock_response),
+                )
+                timings["suggestions"] = (time.perf_counter() - start) * 1000
+            elif template.suggestions == "defer":
+                suggestions_id = defer_suggestions(bedrock_response)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = {
+        "request_data": bedrock_response,
+        "suggestions": suggestions_response,
+        "suggestions_id": suggestions_id,
+    }
+    if cacheable and "no-store" not in directives:
+        await template_cache.set(key, result)
+
+    response.headers["Server-Timing"] = format_server_timing(timings)
+    response.headers["X-Cache"] = "MISS"
+    return result
+
 
+def sse_event(event: str, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def iterate_bedrock_stream(prompt: str):
+    """Pull chunks from the blocking Bedrock stream on the Bedrock executor."""
+    chunks = await run_bedrock(stream_model_text, prompt)
+    done = object()
+    pending = None
     try:
-        # Invoke bedrock model
-        bedrock_response = invoke_bedrock_model(template.prompt)
+        while True:
+            # Shielded, so a disconnect cancels the wait and not the read.
+            pending = asyncio.ensure_future(run_bedrock(next, chunks, done))
+            chunk = await asyncio.shield(pending)
+            pending = None
+            if chunk is done:
+                return
+            yield chunk
+    finally:
+        # The generator cannot be closed while next() is still running in
+        # its thread, so let that read finish first.
+        if pending is not None:
+            try:
+                await pending
+            except Exception:
+                pass
+        # Stops reading the upstream stream when the template is complete
+        # or the client disconnects.
+        await run_bedrock(chunks.close)
+
+
+async def stream_template_events(template: TemplateRequest, directives: set):
+    key = template_cache_key(template)
+    cacheable = template.suggestions != "defer"
+
+    if cacheable and not directives & {"no-cache", "no-store"}:
+        cached_response = await template_cache.get(key)
+        if cached_response is not None:
+            yield sse_event("template", cached_response["request_data"])
+            yield sse_event("suggestions", cached_response["suggestions"])
+            yield sse_event("done", {"cached": True})
+            return
+
+    start = time.perf_counter()
+    timings = {}
+    suggestions_id = None
+    suggestions_response = []
+    extractor = JsonExtractor("{")
+    generated = None
+    try:
+        chunks = iterate_bedrock_stream(template.prompt)
+        try:
+            async for chunk in chunks:
+                if "first-token" not in timings:
+                    timings["first-token"] = (time.perf_counter() - start) * 1000
+                yield sse_event("token", {"text": chunk})
+                candidates = extractor.feed(chunk)
+                if candidates:
+                    # The template is complete; anything after it is prose.
+                    generated = candidates[0].value
+                    timings["template"] = (time.perf_counter() - start) * 1000
+                    yield sse_event("template", generated)
+                    break
+        finally:
+            await chunks.aclose()
+
+        if generated is None:
+            candidates = extractor.finish()
+            if candidates:
+                generated = candidates[0].value
+                yield sse_event("template", generated)
+        if generated is None:
+            raise ValueError("No valid JSON found in the model response")
+
+        if template.suggestions == "inline":
+            suggestions_start = time.perf_counter()
+            suggestions_response = await coalesced_bedrock(
+                ai_suggestions,
+                SUGGESTIONS_PROMPT.format(template=generated),
+            )
+            timings["suggestions"] = (time.perf_counter() - suggestions_start) * 1000
+            yield sse_event("suggestions", suggestions_response)
+        elif template.suggestions == "defer":
+            suggestions_id = defer_suggestions(generated)
+    except Exception as e:
+        yield sse_event("error", {"detail": str(e)})
+        return
+
+    if cacheable and "no-store" not in directives:
+        await template_cache.set(
+            key,
+            {
+                "request_data": generated,
+                "suggestions": suggestions_response,
+                "suggestions_id": None,
+            },
+        )
+    yield sse_event(
+        "done", {"cached": False, "suggestions_id": suggestions_id, "timings": timings}
+    )
+
 
-        # Invoke suggestions model to provide suggestions
-        suggestions_response = ai_suggestions(
-            f"Create a suggested changes for each objects such as unique name and more descriptive etc. without suggesting values  and expand  for this AWS cloud control API request body and generate the suggestions in a array of strings. {bedrock_response}"
+@app.post("/generate-template/stream")
+async def generate_template_stream(template: TemplateRequest, request: Request):
+    if template.mode != "pipeline":
+        raise HTTPException(
+            status_code=400, detail="Streaming only supports the pipeline mode"
         )
-        print("Suggested response:", suggestions_response)
-        suggestions = [
-            "Change the TopicName to a unique value",
-            "Set DisplayName to something more descriptive",
-        ]
-        return {"request_data": bedrock_response, "suggestions": suggestions_response}
+    return StreamingResponse(
+        stream_template_events(template, cache_directives(request)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/suggestions/{suggestions_id}")
+async def get_deferred_suggestions(suggestions_id: str, response: Response):
+    task = deferred_suggestions.get(suggestions_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Unknown suggestions id")
+
+    start = time.perf_counter()
+    try:
+        suggestions = await asyncio.shield(task)
     except Exception as e:
+        deferred_suggestions.pop(suggestions_id, None)
         raise HTTPException(status_code=400, detail=str(e))
+    response.headers["Server-Timing"] = format_server_timing(
+        {"suggestions-wait": (time.perf_counter() - start) * 1000}
+    )
+    return {"suggestions": suggestions}
 
 
 @app.post("/create-resource")
 @limiter.limit("3/minute")
-def create_resource_endpoint(resource_request: ResourceRequest, request: Request):
+async def create_resource_endpoint(resource_request: ResourceRequest, request: Request):
     aws_access_key, aws_secret_key, aws_session_token = extract_aws_credentials(request)
 
     resource_type = resource_request.TypeName
     configuration = resource_request.Properties
 
     try:
-        response = create_resource(
+        region = resolve_region(resource_request.Region)
+        await validate_request(
             resource_type,
-            configuration,
-            aws_access_key,
-            aws_secret_key,
-            aws_session_token,
+            (aws_access_key, aws_secret_key, aws_session_token),
+            properties=configuration,
         )
-        return {"status": "success", "details": response}
+        response, deduplicated = await submission_dedup.submit(
+            create_resource,
+            (resource_type, configuration),
+            (aws_access_key, aws_secret_key, aws_session_token),
+            region,
+            resource_request.ClientToken,
+        )
+        return {
+            "status": "success",
+            "details": response,
+            "deduplicated": deduplicated,
+            "Region": region,
+        }
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @app.post("/delete-resource")
 @limiter.limit("3/minute")
-def delete_resource_endpoint(resource_request: DeleteResourceRequest, request: Request):
+async def delete_resource_endpoint(
+    resource_request: DeleteResourceRequest, request: Request
+):
     aws_access_key, aws_secret_key, aws_session_token = extract_aws_credentials(request)
 
     resource_type = resource_request.TypeName
     identifier = resource_request.Identifier
 
     try:
-        response = delete_resource(
-            resource_type,
-            identifier,
-            aws_access_key,
-            aws_secret_key,
-            aws_session_token,
+        region = resolve_region(resource_request.Region)
+        response, deduplicated = await submission_dedup.submit(
+            delete_resource,
+            (resource_type, identifier),
+            (aws_access_key, aws_secret_key, aws_session_token),
+            region,
+            resource_request.ClientToken,
         )
-        return {"status": "success", "details": response}
+        return {
+            "status": "success",
+            "details": response,
+            "deduplicated": deduplicated,
+            "Region": region,
+        }
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @app.post("/update-resource")
 @limiter.limit("3/minute")
-def update_resource_endpoint(resource_request: UpdateResourceRequest, request: Request):
+async def update_resource_endpoint(
+    resource_request: UpdateResourceRequest, request: Request
+):
     aws_access_key, aws_secret_key, aws_session_token = extract_aws_credentials(request)
 
     resource_type = resource_request.TypeName
@@ -144,22 +529,179 @@ def update_resource_endpoint(resource_request: UpdateResourceRequest, request: R
     identifier = resource_request.Identifier
 
     try:
-        response = update_resource(
+        region = resolve_region(resource_request.Region)
+        await validate_request(
             resource_type,
-            identifier,
-            patch_document,
+            (aws_access_key, aws_secret_key, aws_session_token),
+            patch_document=patch_document,
+        )
+        response, deduplicated = await submission_dedup.submit(
+            update_resource,
+            (resource_type, identifier, patch_document),
+            (aws_access_key, aws_secret_key, aws_session_token),
+            region,
+            resource_request.ClientToken,
+        )
+        return {
+            "status": "success",
+            "details": response,
+            "deduplicated": deduplicated,
+            "Region": region,
+        }
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/read-resource")
+# Read-only, so clients may catch up in a larger burst.
+@limiter.limit("3/minute", burst=10)
+async def read_resource_endpoint(
+    resource_request: ReadResourceRequest, request: Request
+):
+    aws_access_key, aws_secret_key, aws_session_token = extract_aws_credentials(request)
+
+    try:
+        region = resolve_region(resource_request.Region)
+        response = await run_cloudcontrol(
+            get_resource,
+            resource_request.TypeName,
+            resource_request.Identifier,
             aws_access_key,
             aws_secret_key,
             aws_session_token,
+            region,
         )
         return {"status": "success", "details": response}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+def resource_row(description: dict):
+    properties = description.get("Properties")
+    try:
+        properties = json.loads(properties) if properties else {}
+    except ValueError:
+        pass
+    return {"Identifier": description.get("Identifier"), "Properties": properties}
+
+
+async def resource_pages(
+    list_request: ListResourceRequest, credentials, region: str, next_token=None
+):
+    """Yield ListResources pages of one region, fetching the next page meanwhile."""
+
+    def fetch(next_token):
+        return asyncio.ensure_future(
+            run_cloudcontrol(
+                list_resources_page,
+                list_request.TypeName,
+                *credentials,
+                next_token=next_token,
+                max_results=list_request.MaxResults,
+                resource_model=list_request.ResourceModel,
+                region_name=region,
+            )
+        )
+
+    pages = 0
+    pending = fetch(next_token)
+    try:
+        while pending is not None:
+            page = await pending
+            pages += 1
+            next_token = page.get("NextToken")
+            more = next_token and (
+                not list_request.MaxPages or pages < list_request.MaxPages
+            )
+            pending = fetch(next_token) if more else None
+            yield page
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+async def stream_resource_rows(list_request: ListResourceRequest, credentials):
+    """Yield NDJSON rows one page at a time, ending with the NextToken."""
+    next_token = list_request.NextToken
+    try:
+        region = resolve_region(list_request.Region)
+        async for page in resource_pages(list_request, credentials, region, next_token):
+            next_token = page.get("NextToken")
+            for description in page.get("ResourceDescriptions", []):
+                yield json.dumps(resource_row(description)) + "\n"
+    except Exception as e:
+        yield json.dumps({"error": str(e)}) + "\n"
+        return
+
+    yield json.dumps({"NextToken": next_token}) + "\n"
+
+
+async def stream_fan_out_rows(list_request: ListResourceRequest, credentials):
+    """Yield NDJSON rows of several regions, interleaved as their pages arrive.
+
+    A region that fails reports an error line and the others carry on; the
+    last line holds each region's NextToken.
+    """
+    try:
+        regions = resolve_regions(list_request.Region, list_request.Regions)
+    except ValueError as e:
+        yield json.dumps({"error": str(e)}) + "\n"
+        return
+
+    done = object()
+    pages = asyncio.Queue()
+    next_tokens = {
+        region: list_request.NextTokens.get(region) or list_request.NextToken
+        for region in regions
+    }
+
+    async def list_region(region):
+        try:
+            async for page in resource_pages(
+                list_request, credentials, region, next_tokens[region]
+            ):
+                await pages.put((region, page))
+        except Exception as e:
+            await pages.put((region, e))
+        finally:
+            await pages.put((region, done))
+
+    tasks = [asyncio.ensure_future(list_region(region)) for region in regions]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            region, page = await pages.get()
+            if page is done:
+                remaining -= 1
+            elif isinstance(page, Exception):
+                yield json.dumps({"Region": region, "error": str(page)}) + "\n"
+            else:
+                next_tokens[region] = page.get("NextToken")
+                for description in page.get("ResourceDescriptions", []):
+                    row = {"Region": region, **resource_row(description)}
+                    yield json.dumps(row) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    yield json.dumps({"NextTokens": next_tokens}) + "\n"
+
+
+@app.post("/list-resource")
+# Read-only, so clients may catch up in a larger burst.
+@limiter.limit("3/minute", burst=10)
+async def list_resource_endpoint(list_request: ListResourceRequest, request: Request):
+    credentials = extract_aws_credentials(request)
+    if list_request.Regions:
+        rows = stream_fan_out_rows(list_request, credentials)
+    else:
+        rows = stream_resource_rows(list_request, credentials)
+    return StreamingResponse(rows, media_type="application/x-ndjson")
+
+
 @app.post("/message")
 @limiter.limit("3/minute")
-def get_message(msgrequest: MessageRequest, request: Request):
+async def get_message(msgrequest: MessageRequest, request: Request):
     if not msgrequest.TypeName or not msgrequest.Properties:
         raise HTTPException(status_code=400, detail="Request is invalid..")
 
@@ -168,34 +710,252 @@ def get_message(msgrequest: MessageRequest, request: Request):
     resource_type = msgrequest.TypeName
     configuration = msgrequest.Properties
 
-    print(f"Resource Type: {resource_type}")
-    print(f"Configuration: {configuration}")
+    logger.info(
+        "message received",
+        extra={
+            "type_name": resource_type,
+            **payload_fields({"Properties": configuration}),
+        },
+    )
 
     try:
-        response = create_resource(
-            resource_type,
-            configuration,
-            aws_access_key,
-            aws_secret_key,
-            aws_session_token,
+        region = resolve_region(msgrequest.Region)
+        response, deduplicated = await submission_dedup.submit(
+            create_resource,
+            (resource_type, configuration),
+            (aws_access_key, aws_secret_key, aws_session_token),
+            region,
+            msgrequest.ClientToken,
         )
-        return {"status": "success", "details": response}
+        return {
+            "status": "success",
+            "details": response,
+            "deduplicated": deduplicated,
+            "Region": region,
+        }
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+async def find_request_status(request_token: str, credentials, regions: list):
+    """Ask every region for a token at once; the first region that knows it wins."""
+    errors = {}
+    async for region, details, error in fan_out(
+        regions, status_poller.get_status, request_token, credentials
+    ):
+        if error is None:
+            return {**details, "Region": region}
+        errors[region] = str(error)
+    raise ValueError(
+        f"Request {request_token} was not found in any region: {json.dumps(errors)}"
+    )
+
+
 @app.post("/resource-status")
-def get_resource_status(request: ResourceRequestStatus, req: Request):
-    aws_access_key, aws_secret_key, aws_session_token = extract_aws_credentials(req)
+async def get_resource_status(request: ResourceRequestStatus, req: Request):
+    credentials = extract_aws_credentials(req)
+    try:
+        if request.regions:
+            regions = resolve_regions(request.region, request.regions)
+            response = await find_request_status(
+                request.request_token, credentials, regions
+            )
+        else:
+            response = await status_poller.get_status(
+                request.request_token, credentials, resolve_region(request.region)
+            )
+        return {"status": "success", "details": response}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def fan_out_resource_requests(query: ResourceRequestsQuery, credentials):
+    """Merge the request summaries of several regions, tagged with their Region.
+
+    Tokens may belong to any of the regions, so tokens no region lists as in
+    progress are looked up afterwards, only in the region they were last
+    seen in when that is known.
+    """
+    regions = resolve_regions(query.region, query.regions)
+    summaries = []
+    errors = {}
+    async for region, details, error in fan_out(
+        regions,
+        status_poller.refresh_many,
+        credentials,
+        query.request_tokens,
+        query.operation_statuses,
+        query.operations,
+        fetch_missing=False,
+    ):
+        if error is not None:
+            errors[region] = str(error)
+            continue
+        summaries.extend({**summary, "Region": region} for summary in details)
+
+    listed = {summary.get("RequestToken") for summary in summaries}
+    missing = [token for token in query.request_tokens if token not in listed]
+    if missing and not query.operation_statuses and not query.operations:
+
+        async def locate(token):
+            known = [
+                region
+                for region in regions
+                if status_poller.last_known(token, credentials, region) is not None
+            ]
+            details = await find_request_status(token, credentials, known or regions)
+            return {**details.get("ProgressEvent", {}), "Region": details["Region"]}
+
+        located = await asyncio.gather(
+            *(locate(token) for token in missing), return_exceptions=True
+        )
+        summaries.extend(
+            summary for summary in located if not isinstance(summary, Exception)
+        )
+
+    if query.request_tokens:
+        order = {token: index for index, token in enumerate(query.request_tokens)}
+        summaries.sort(key=lambda summary: order[summary.get("RequestToken")])
+    return summaries, errors
+
+
+@app.post("/resource-requests")
+async def list_resource_requests_endpoint(query: ResourceRequestsQuery, req: Request):
+    credentials = extract_aws_credentials(req)
     try:
-        response = get_resource_request_status(
-            request.request_token, aws_access_key, aws_secret_key, aws_session_token
+        if query.regions:
+            response, errors = await fan_out_resource_requests(query, credentials)
+            if errors and not response:
+                raise ValueError(json.dumps(errors))
+            return {
+                "status": "partial" if errors else "success",
+                "details": response,
+                "errors": errors,
+            }
+        response = await status_poller.refresh_many(
+            credentials,
+            query.request_tokens,
+            query.operation_statuses,
+            query.operations,
+            resolve_region(query.region),
         )
         return {"status": "success", "details": response}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@app.post("/resource-status/wait")
+async def wait_resource_status(request: ResourceStatusWaitRequest, req: Request):
+    credentials = extract_aws_credentials(req)
+    try:
+        response = await status_poller.wait(
+            request.request_token,
+            credentials,
+            request.timeout,
+            resolve_region(request.region),
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "status": "success",
+        "terminal": operation_status(response) in TERMINAL_STATUSES,
+        "details": response,
+    }
+
+
+async def stream_status_events(
+    request_token: str, credentials, timeout: float, region: str = None
+):
+    try:
+        async for details in status_poller.watch(
+            request_token, credentials, timeout, resolve_region(region)
+        ):
+            yield sse_event("status", details)
+    except Exception as e:
+        yield sse_event("error", {"detail": str(e)})
+        return
+    yield sse_event("done", {})
+
+
+@app.post("/resource-status/stream")
+async def stream_resource_status(request: ResourceStatusWaitRequest, req: Request):
+    credentials = extract_aws_credentials(req)
+    return StreamingResponse(
+        stream_status_events(
+            request.request_token, credentials, request.timeout, request.region
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/batch")
+@limiter.limit("3/minute")
+async def batch_endpoint(batch_request: BatchRequest, request: Request):
+    credentials = extract_aws_credentials(request)
+    if not batch_request.Operations:
+        raise HTTPException(status_code=400, detail="No operations provided")
+
+    results = await run_batch(
+        batch_request.Operations,
+        credentials,
+        batch_request.MaxConcurrency,
+        batch_request.Region,
+    )
+    failed = sum(result["status"] == "error" for result in results)
+    return {
+        "status": "success" if not failed else "partial",
+        "submitted": len(results) - failed,
+        "failed": failed,
+        "results": results,
+    }
+
+
+@app.post("/plan")
+# Read-only, so clients may catch up in a larger burst.
+@limiter.limit("3/minute", burst=10)
+async def plan_endpoint(plan_request: PlanRequest, request: Request):
+    credentials = extract_aws_credentials(request)
+    if not plan_request.Resources:
+        raise HTTPException(status_code=400, detail="No resources provided")
+
+    plans = await run_plan(
+        plan_request.Resources,
+        credentials,
+        plan_request.MaxConcurrency,
+        plan_request.Region,
+    )
+    failed = sum(plan["Action"] == "error" for plan in plans)
+    return {
+        "status": "success" if not failed else "partial",
+        "changes": sum(plan["Action"] not in ("no-op", "error") for plan in plans),
+        "failed": failed,
+        "plans": plans,
+    }
+
+
+set_type_name_check(schema_registry.known)
+stats_collector.register("cloudcontrol_client_pool", cloudcontrol_pool.stats)
+stats_collector.register("cloudformation_client_pool", cloudformation_pool.stats)
+stats_collector.register("template_cache", template_cache.stats)
+stats_collector.register("status_poller", status_poller.stats)
+stats_collector.register("schema_registry", schema_registry.stats)
+stats_collector.register("bedrock_single_flight", bedrock_flight.stats)
+stats_collector.register("rate_limit", limiter.stats)
+stats_collector.register("submission_dedup", submission_dedup.stats)
+
+
+@app.get("/metrics")
+def get_metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/debug/stats")
+def get_debug_stats():
+    """The raw counters behind /metrics, per component."""
+    return stats_collector.snapshot()
+
+
 @app.get("/")
 def read_root():
     return {"message:": "Hello World"}
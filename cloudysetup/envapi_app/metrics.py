@@ -0,0 +1,260 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+
+from .logging_setup import get_logger
+
+logger = get_logger("aws")
+
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.5"))
+
+# Bedrock calls take seconds; everything else is expected in milliseconds.
+FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SLOW_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+REQUEST_LATENCY = Histogram(
+    "cloudysetup_request_duration_seconds",
+    "Time to serve an API request, until the last body chunk is sent",
+    ["route", "method", "status"],
+    buckets=FAST_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "cloudysetup_requests_in_progress", "API requests being served"
+)
+BEDROCK_LATENCY = Histogram(
+    "cloudysetup_bedrock_invoke_duration_seconds",
+    "Bedrock call latency; for streaming calls, the time to the first byte",
+    ["operation", "model_id", "outcome"],
+    buckets=SLOW_BUCKETS,
+)
+BEDROCK_TOKENS = Counter(
+    "cloudysetup_bedrock_tokens_total",
+    "Tokens consumed by Bedrock invocations",
+    ["model_id", "direction"],
+)
+AWS_CALL_LATENCY = Histogram(
+    "cloudysetup_aws_call_duration_seconds",
+    "Cloud Control and CloudFormation API call latency, retries included",
+    ["service", "operation", "type_name", "outcome"],
+    buckets=FAST_BUCKETS,
+)
+EVENT_LOOP_LAG = Histogram(
+    "cloudysetup_event_loop_lag_seconds",
+    "How late the event loop woke a sleeping task",
+    buckets=LAG_BUCKETS,
+)
+
+# TypeName comes from the caller, so only types known to exist get their own
+# series; anything else is counted as "other". main wires in the check.
+_type_name_known = lambda type_name: False
+
+
+def set_type_name_check(check):
+    global _type_name_known
+    _type_name_known = check
+
+
+def type_name_label(type_name: str):
+    if not type_name:
+        return ""
+    return type_name if _type_name_known(type_name) else "other"
+
+
+# Per-request stage durations for the Server-Timing header. The value is
+# shared with executor threads through a copied context, so they add to it.
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+class StageTimings:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds * 1000
+
+    def header_items(self):
+        with self._lock:
+            return [f"{stage};dur={ms:.1f}" for stage, ms in self.stages.items()]
+
+
+def record_stage(stage: str, seconds: float):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+def record_bedrock_tokens(model_id: str, usage: dict):
+    """Count tokens from an Anthropic ``usage`` block."""
+    for direction in ("input", "output"):
+        tokens = (usage or {}).get(f"{direction}_tokens")
+        if tokens:
+            BEDROCK_TOKENS.labels(model_id, direction).inc(tokens)
+
+
+def instrument_client(client):
+    """Time every API call a boto3 client makes through its event hooks."""
+    service = client.meta.service_model.service_name
+    events = client.meta.events
+
+    def before_parameter_build(params, context, **kwargs):
+        context["metrics_start"] = time.perf_counter()
+        context["metrics_type_name"] = params.get("TypeName", "")
+        context["metrics_model_id"] = params.get("modelId", "")
+
+    def observe(model, context, outcome, aws_request_id=None):
+        start = context.get("metrics_start")
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        logger.info(
+            "aws call",
+            extra={
+                "service": service,
+                "operation": model.name,
+                "type_name": context.get("metrics_type_name") or None,
+                "outcome": outcome,
+                "duration_ms": round(elapsed * 1000, 1),
+                "aws_request_id": aws_request_id,
+            },
+        )
+        if service == "bedrock-runtime":
+            BEDROCK_LATENCY.labels(
+                model.name, context.get("metrics_model_id", ""), outcome
+            ).observe(elapsed)
+            record_stage("bedrock", elapsed)
+        else:
+            AWS_CALL_LATENCY.labels(
+                service,
+                model.name,
+                type_name_label(context.get("metrics_type_name", "")),
+                outcome,
+            ).observe(elapsed)
+            record_stage(service, elapsed)
+
+    def after_call(http_response, parsed, model, context, **kwargs):
+        status = getattr(http_response, "status_code", 200)
+        aws_request_id = (parsed or {}).get("ResponseMetadata", {}).get("RequestId")
+        observe(model, context, "success" if status < 300 else "error", aws_request_id)
+
+    def after_call_error(model, context, **kwargs):
+        observe(model, context, "error")
+
+    events.register("before-parameter-build", before_parameter_build)
+    events.register("after-call", after_call)
+    events.register("after-call-error", after_call_error)
+    return client
+
+
+class StatsCollector:
+    """Expose the components' stats() counters and cache hit ratios at scrape time."""
+
+    def __init__(self):
+        self.sources = {}
+
+    def register(self, component: str, stats):
+        self.sources[component] = stats
+
+    def snapshot(self):
+        """Every component's stats() as reported, non-numeric values included."""
+        snapshot = {}
+        for component, stats in self.sources.items():
+            try:
+                snapshot[component] = stats()
+            except Exception as e:
+                snapshot[component] = {"error": str(e)}
+        return snapshot
+
+    def collect(self):
+        values = GaugeMetricFamily(
+            "cloudysetup_component_stat",
+            "Numeric counters and sizes reported by the service components",
+            labels=["component", "stat"],
+        )
+        hit_ratio = GaugeMetricFamily(
+            "cloudysetup_cache_hit_ratio",
+            "Lookups answered from the cache since start",
+            labels=["component"],
+        )
+        for component, stats in self.sources.items():
+            try:
+                snapshot = stats()
+            except Exception:
+                continue
+            for stat, value in snapshot.items():
+                if isinstance(value, (bool, int, float)):
+                    values.add_metric([component, stat], float(value))
+            hits, misses = snapshot.get("hits"), snapshot.get("misses")
+            if isinstance(hits, int) and isinstance(misses, int):
+                lookups = hits + misses
+                hit_ratio.add_metric([component], hits / lookups if lookups else 0.0)
+        yield values
+        yield hit_ratio
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+async def monitor_event_loop_lag(interval: float = EVENT_LOOP_LAG_INTERVAL):
+    """Measure how late sleeps wake up; blocking work on the loop shows as lag."""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, time.perf_counter() - start - interval))
+
+
+class MetricsMiddleware:
+    """Record request latency per route and add stage timings to Server-Timing.
+
+    Timings a handler already put in Server-Timing are kept; the AWS time
+    spent for the request and the total app time are appended.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings = StageTimings()
+        token = _request_timings.set(timings)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                items = timings.header_items()
+                items.append(f"app;dur={(time.perf_counter() - start) * 1000:.1f}")
+                headers = list(message.get("headers", []))
+                for index, (name, value) in enumerate(headers):
+                    if name.lower() == b"server-timing":
+                        items.insert(0, value.decode("latin-1"))
+                        del headers[index]
+                        break
+                headers.append((b"server-timing", ", ".join(items).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            _request_timings.reset(token)
+            # The matched route template keeps label cardinality bounded.
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUEST_LATENCY.labels(route, scope["method"], str(status)).observe(
+                time.perf_counter() - start
+            )
@@ -0,0 +1,327 @@
+import asyncio
+import json
+import os
+
+from botocore.exceptions import ClientError
+
+from .cloudcontrol_client import get_resource
+from .executor import run_cloudcontrol
+from .regions import resolve_region
+from .schema_registry import get_resource_schema, unescape_pointer, validate_request
+
+PLAN_MAX_CONCURRENCY = int(os.getenv("PLAN_MAX_CONCURRENCY", "10"))
+
+# Fields that identify the elements of an array of objects, tried in order.
+# Arrays keyed this way are compared element by element whatever their order.
+ARRAY_KEYS = (
+    "Key",
+    "Name",
+    "Id",
+    "Arn",
+    "Sid",
+    "PolicyName",
+    "AttributeName",
+    "IndexName",
+)
+
+
+def escape_pointer(token):
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+class PropertySchema:
+    """The part of a resource type schema describing one value, if known."""
+
+    def __init__(self, node=None, definitions=None):
+        self.definitions = definitions or {}
+        # Follow "#/definitions/..." references, guarding against loops.
+        seen = set()
+        while isinstance(node, dict) and "$ref" in node and node["$ref"] not in seen:
+            seen.add(node["$ref"])
+            node = self.definitions.get(node["$ref"].rsplit("/", 1)[-1])
+        self.node = node if isinstance(node, dict) else {}
+
+    def child(self, key):
+        return PropertySchema(
+            self.node.get("properties", {}).get(key), self.definitions
+        )
+
+    def items(self):
+        return PropertySchema(self.node.get("items"), self.definitions)
+
+    @property
+    def is_string(self):
+        types = self.node.get("type")
+        return types == "string" or (isinstance(types, list) and "string" in types)
+
+    @property
+    def ordered(self):
+        """An array whose element order the schema says is significant."""
+        return self.node.get("insertionOrder") is True
+
+
+UNKNOWN = PropertySchema()
+
+
+def scalar_text(value):
+    """Cloud Control may hand back 30 for "30" or "true" for True."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def strict_equal(current, desired):
+    """Equality that keeps "30", 30 and True apart, unlike ==."""
+    if isinstance(current, dict) and isinstance(desired, dict):
+        return current.keys() == desired.keys() and all(
+            strict_equal(current[key], desired[key]) for key in current
+        )
+    if isinstance(current, list) and isinstance(desired, list):
+        return len(current) == len(desired) and all(
+            strict_equal(old, new) for old, new in zip(current, desired)
+        )
+    if isinstance(current, bool) or isinstance(desired, bool):
+        return type(current) is type(desired) and current == desired
+    if isinstance(current, (int, float)) and isinstance(desired, (int, float)):
+        return current == desired
+    return type(current) is type(desired) and current == desired
+
+
+def values_equal(current, desired, schema: PropertySchema = UNKNOWN):
+    if strict_equal(current, desired):
+        return True
+    # Only a property the schema declares as a string may come back as the
+    # text of the number or boolean it was given as, or the other way round.
+    if not schema.is_string:
+        return False
+    scalars = (str, int, float, bool)
+    if not isinstance(current, scalars) or not isinstance(desired, scalars):
+        return False
+    if isinstance(current, str) == isinstance(desired, str):
+        return False
+    return scalar_text(current) == scalar_text(desired)
+
+
+def array_key(current: list, desired: list, schema: PropertySchema = UNKNOWN):
+    """An ARRAY_KEYS field that is present and unique in both arrays.
+
+    When several fields qualify they must pair the same elements, otherwise
+    the arrays are compared in order, as are arrays the schema marks with
+    insertionOrder.
+    """
+    if schema.ordered:
+        return None
+    items = current + desired
+    if not items or not all(isinstance(item, dict) for item in items):
+        return None
+    found = None
+    pairing = None
+    for key in ARRAY_KEYS:
+        if not all(
+            key in item
+            and isinstance(item[key], (str, int, float))
+            and not isinstance(item[key], bool)
+            for item in items
+        ):
+            continue
+        if len({item[key] for item in current}) != len(current) or len(
+            {item[key] for item in desired}
+        ) != len(desired):
+            continue
+        positions = {item[key]: index for index, item in enumerate(current)}
+        key_pairing = [positions.get(item[key]) for item in desired]
+        if found is None:
+            found, pairing = key, key_pairing
+        elif key_pairing != pairing:
+            return None
+    return found
+
+
+def diff_keyed_arrays(
+    current: list, desired: list, key: str, path: str, ops: list, schema=UNKNOWN
+):
+    positions = {item[key]: index for index, item in enumerate(current)}
+    wanted = {item[key] for item in desired}
+    # Changes to kept elements first, while their indices still hold; then
+    # removals from the end so earlier indices do not shift; then additions.
+    for item in desired:
+        index = positions.get(item[key])
+        if index is not None:
+            diff_values(current[index], item, f"{path}/{index}", ops, schema)
+    for index in sorted(
+        (index for value, index in positions.items() if value not in wanted),
+        reverse=True,
+    ):
+        ops.append({"op": "remove", "path": f"{path}/{index}"})
+    for item in desired:
+        if item[key] not in positions:
+            ops.append({"op": "add", "path": f"{path}/-", "value": item})
+
+
+def diff_arrays(current: list, desired: list, path: str, ops: list, schema=UNKNOWN):
+    items = schema.items()
+    key = array_key(current, desired, schema)
+    if key is not None:
+        diff_keyed_arrays(current, desired, key, path, ops, items)
+        return
+
+    # Ordered arrays: skip the common head and tail, so a change in the
+    # middle of a long list costs one pass rather than a full rewrite.
+    shortest = min(len(current), len(desired))
+    start = 0
+    while start < shortest and values_equal(current[start], desired[start], items):
+        start += 1
+    end = 0
+    while end < shortest - start and values_equal(
+        current[len(current) - 1 - end], desired[len(desired) - 1 - end], items
+    ):
+        end += 1
+    old = current[start : len(current) - end]
+    new = desired[start : len(desired) - end]
+
+    if len(old) == len(new):
+        for offset, (old_item, new_item) in enumerate(zip(old, new)):
+            diff_values(old_item, new_item, f"{path}/{start + offset}", ops, items)
+    elif not old:
+        for offset, item in enumerate(new):
+            ops.append({"op": "add", "path": f"{path}/{start + offset}", "value": item})
+    elif not new:
+        for offset in reversed(range(len(old))):
+            ops.append({"op": "remove", "path": f"{path}/{start + offset}"})
+    else:
+        ops.append({"op": "replace", "path": path, "value": desired})
+
+
+def diff_objects(
+    current: dict, desired: dict, path: str, ops: list, schema=UNKNOWN, prune=True
+):
+    for key, value in desired.items():
+        child = f"{path}/{escape_pointer(key)}"
+        if key not in current:
+            ops.append({"op": "add", "path": child, "value": value})
+        else:
+            diff_values(current[key], value, child, ops, schema.child(key))
+    if prune:
+        for key in current:
+            if key not in desired:
+                ops.append({"op": "remove", "path": f"{path}/{escape_pointer(key)}"})
+
+
+def diff_values(current, desired, path: str, ops: list, schema=UNKNOWN):
+    if values_equal(current, desired, schema):
+        return
+    if isinstance(current, dict) and isinstance(desired, dict):
+        diff_objects(current, desired, path, ops, schema)
+    elif isinstance(current, list) and isinstance(desired, list):
+        diff_arrays(current, desired, path, ops, schema)
+    else:
+        ops.append({"op": "replace", "path": path, "value": desired})
+
+
+def diff_properties(current: dict, desired: dict, resource_schema=None):
+    """RFC 6902 operations turning the live properties into the desired ones.
+
+    Top-level properties the configuration leaves out are not removed: they
+    are usually defaults or read-only values Cloud Control reports. Below the
+    top level the configuration is the whole truth. Values are compared
+    strictly except where the type schema declares a string.
+    """
+    schema = UNKNOWN
+    if resource_schema is not None:
+        schema = PropertySchema(
+            {"properties": resource_schema.properties}, resource_schema.definitions
+        )
+    ops = []
+    diff_objects(current, desired, "", ops, schema, prune=False)
+    return ops
+
+
+def changed_properties(ops: list):
+    return {unescape_pointer(op["path"].split("/")[1]) for op in ops}
+
+
+async def plan_resource(resource, credentials, region: str):
+    """Compare one desired configuration with the live resource.
+
+    The Action is "create" when there is no resource yet, "no-op" when it
+    already matches, "update" with the PatchDocument to send, or "replace"
+    when a create-only property would change. Configurations are validated
+    against the type schema like the submissions they would become.
+    """
+    plan = {"TypeName": resource.TypeName, "Identifier": resource.Identifier}
+    region = resolve_region(resource.Region or region)
+    plan["Region"] = region
+
+    current = None
+    if resource.Identifier:
+        try:
+            response = await run_cloudcontrol(
+                get_resource,
+                resource.TypeName,
+                resource.Identifier,
+                *credentials,
+                region,
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ResourceNotFoundException":
+                raise
+        else:
+            current = json.loads(
+                response.get("ResourceDescription", {}).get("Properties") or "{}"
+            )
+
+    if current is None:
+        await validate_request(
+            resource.TypeName, credentials, properties=resource.Properties
+        )
+        return {**plan, "Action": "create", "PatchDocument": []}
+
+    # The live properties let a deployment resolve references to a resource
+    # it does not need to touch.
+    plan["ResourceModel"] = current
+    desired = resource.Properties
+    resource_schema = await get_resource_schema(resource.TypeName, credentials)
+    if resource_schema is not None:
+        ignored = resource_schema.read_only | resource_schema.write_only
+        desired = {key: value for key, value in desired.items() if key not in ignored}
+
+    ops = diff_properties(current, desired, resource_schema)
+    if not ops:
+        return {**plan, "Action": "no-op", "PatchDocument": []}
+
+    replacement = []
+    if resource_schema is not None:
+        replacement = sorted(changed_properties(ops) & resource_schema.create_only)
+    if replacement:
+        return {
+            **plan,
+            "Action": "replace",
+            "PatchDocument": ops,
+            "ReplacementProperties": replacement,
+        }
+    await validate_request(resource.TypeName, credentials, patch_document=ops)
+    return {**plan, "Action": "update", "PatchDocument": ops}
+
+
+async def run_plan(resources, credentials, max_concurrency: int = None, region=None):
+    """Plan every resource concurrently, returning one plan per resource in order."""
+    limit = min(max_concurrency or PLAN_MAX_CONCURRENCY, PLAN_MAX_CONCURRENCY)
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def plan_one(index, resource):
+        try:
+            async with semaphore:
+                plan = await plan_resource(resource, credentials, region)
+        except Exception as e:
+            return {
+                "index": index,
+                "TypeName": resource.TypeName,
+                "Identifier": resource.Identifier,
+                "Action": "error",
+                "error": str(e),
+            }
+        return {"index": index, **plan}
+
+    return await asyncio.gather(
+        *(plan_one(index, resource) for index, resource in enumerate(resources))
+    )
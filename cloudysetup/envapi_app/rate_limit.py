@@ -0,0 +1,224 @@
+import functools
+import hashlib
+import inspect
+import math
+import os
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+from .client_pool import known_access_key
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") != "0"
+# "memory" keeps buckets in this worker; "redis" shares them between every
+# task behind the load balancer through any Redis-protocol server.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
+# Number of proxies (the ALB) in front of the app that append to
+# X-Forwarded-For. The client address is the entry they appended, entries
+# further left are whatever the client chose to send.
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "1"))
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# Refill, spend and report atomically so every task sees the same bucket.
+# The server clock is used so tasks with skewed clocks still agree.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+
+def parse_rate(rate: str):
+    """Turn "3/minute" into (tokens per second, tokens per period)."""
+    count, period = rate.split("/", 1)
+    amount = 1
+    if " " in period.strip():
+        amount, period = period.split()
+    seconds = PERIODS[period.strip().rstrip("s")] * int(amount)
+    return int(count) / seconds, int(count)
+
+
+def client_key(request: Request, trusted_proxies: int = RATE_LIMIT_TRUSTED_PROXIES):
+    """Identify the caller by AWS access key, else by forwarded client address.
+
+    An access key only counts once this worker has built a client from it;
+    the limiter runs before the credentials are used, so otherwise any
+    made-up key would get a fresh bucket on every request.
+    """
+    access_key = request.headers.get("aws-access-key")
+    if access_key and known_access_key(access_key):
+        return "key:" + hashlib.sha256(access_key.encode()).hexdigest()[:32]
+
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded and trusted_proxies > 0:
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        if hops:
+            return "ip:" + hops[-min(trusted_proxies, len(hops))]
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+
+class MemoryBackend:
+    """Token buckets for this worker only, evicting the least recently used."""
+
+    name = "memory"
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    async def acquire(self, key: str, rate: float, burst: int, cost: int = 1):
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens >= cost:
+            tokens -= cost
+            allowed, retry_after = True, 0.0
+        else:
+            allowed, retry_after = False, (cost - tokens) / rate
+
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, tokens, retry_after
+
+    def stats(self):
+        return {"keys": len(self._buckets)}
+
+
+class RedisBackend:
+    """Token buckets shared through a Redis-protocol server."""
+
+    name = "redis"
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL, client=None):
+        if client is None:
+            import redis.asyncio as redis
+
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def acquire(self, key: str, rate: float, burst: int, cost: int = 1):
+        allowed, tokens, retry_after = await self._script(
+            keys=[key], args=[rate, burst, cost]
+        )
+        return bool(int(allowed)), float(tokens), float(retry_after)
+
+    def stats(self):
+        return {}
+
+
+def build_backend(name: str = RATE_LIMIT_BACKEND):
+    if name == "redis":
+        return RedisBackend()
+    if name == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown rate limit backend: {name}")
+
+
+class RateLimiter:
+    """Per-endpoint token bucket limits keyed on the calling client.
+
+    ``rate`` sets the sustained refill ("3/minute"); ``burst`` is how many
+    requests a client may make at once after being idle, and defaults to the
+    count in ``rate``. When the backend cannot be reached requests are let
+    through rather than failing the API.
+    """
+
+    def __init__(self, backend=None, enabled: bool = RATE_LIMIT_ENABLED):
+        self._backend = backend
+        self.enabled = enabled
+        self.allowed = 0
+        self.limited = 0
+        self.backend_errors = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = build_backend()
+        return self._backend
+
+    async def check(self, request: Request, scope: str, rate: str, burst=None):
+        if not self.enabled:
+            return
+        per_second, count = parse_rate(rate)
+        burst = burst or count
+        key = f"ratelimit:{scope}:{client_key(request)}"
+        try:
+            allowed, _, retry_after = await self.backend.acquire(key, per_second, burst)
+        except Exception:
+            self.backend_errors += 1
+            return
+        if allowed:
+            self.allowed += 1
+            return
+        self.limited += 1
+        raise HTTPException(
+            status_code=429,
+            detail=f"Rate limit exceeded: {rate} (burst {burst})",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    def limit(self, rate: str, burst: int = None):
+        """Decorate an endpoint that takes a ``Request`` argument."""
+        parse_rate(rate)
+
+        def decorator(func):
+            scope = func.__name__
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                request = next(
+                    (
+                        value
+                        for value in (*args, *kwargs.values())
+                        if isinstance(value, Request)
+                    ),
+                    None,
+                )
+                if request is None:
+                    raise RuntimeError(f"{scope} needs a Request argument")
+                await self.check(request, scope, rate, burst)
+                if inspect.iscoroutinefunction(func):
+                    return await func(*args, **kwargs)
+                return await run_in_threadpool(func, *args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def stats(self):
+        return {
+            "backend": self.backend.name,
+            "enabled": self.enabled,
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "backend_errors": self.backend_errors,
+            **self.backend.stats(),
+        }
+
+
+limiter = RateLimiter()
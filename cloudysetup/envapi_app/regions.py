@@ -0,0 +1,50 @@
+import asyncio
+import os
+import re
+
+from .client_pool import DEFAULT_REGION
+
+MAX_FANOUT_REGIONS = int(os.getenv("MAX_FANOUT_REGIONS", "20"))
+REGION_PATTERN = re.compile(r"^[a-z]{2}(-[a-z]+)+-\d{1,2}$")
+
+
+def resolve_region(region: str = None):
+    """The requested region, or the service default when none is given."""
+    if not region:
+        return DEFAULT_REGION
+    if not REGION_PATTERN.match(region):
+        raise ValueError(f"Invalid region: {region}")
+    return region
+
+
+def resolve_regions(region: str = None, regions: list = None):
+    """Validated, de-duplicated regions for a fan-out; a single region otherwise."""
+    if not regions:
+        return [resolve_region(region)]
+    resolved = list(dict.fromkeys(resolve_region(name) for name in regions))
+    if len(resolved) > MAX_FANOUT_REGIONS:
+        raise ValueError(f"At most {MAX_FANOUT_REGIONS} regions can be queried at once")
+    return resolved
+
+
+async def fan_out(regions: list, func, *args, **kwargs):
+    """Run ``func(*args, region=..., **kwargs)`` for every region concurrently.
+
+    Yields ``(region, result, error)`` as each region answers, so callers can
+    merge results in arrival order. Pending calls are cancelled if the
+    consumer stops early.
+    """
+
+    async def run(region):
+        try:
+            return region, await func(*args, region=region, **kwargs), None
+        except Exception as e:
+            return region, None, e
+
+    tasks = [asyncio.ensure_future(run(region)) for region in regions]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,391 @@
+import copy
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+import fastjsonschema
+
+from .cloudcontrol_client import describe_resource_type
+from .executor import run_cloudcontrol
+
+SCHEMA_VALIDATION = os.getenv("SCHEMA_VALIDATION", "1") != "0"
+SCHEMA_CACHE_DIR = os.getenv(
+    "SCHEMA_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "cloudysetup", "schemas"),
+)
+# How long a schema is trusted before describe_type is asked for the current
+# default version. An unchanged version keeps the compiled validator.
+SCHEMA_CACHE_TTL = int(os.getenv("SCHEMA_CACHE_TTL", "86400"))
+# Types no schema was found for (or the caller may not describe) are retried
+# after this long.
+SCHEMA_MISSING_TTL = int(os.getenv("SCHEMA_MISSING_TTL", "300"))
+# Never call describe_type; use the disk cache and the bundled snapshot only.
+SCHEMA_OFFLINE = os.getenv("SCHEMA_OFFLINE", "0") == "1"
+
+BUNDLED_SCHEMA_DIR = os.path.join(os.path.dirname(__file__), "schemas")
+BUNDLED_VERSION = "bundled"
+
+PATCH_OPERATIONS = {"add", "remove", "replace", "move", "copy", "test"}
+
+
+class SchemaValidationError(ValueError):
+    pass
+
+
+def schema_file_name(type_name: str):
+    """AWS::SNS::Topic -> aws-sns-topic.json, as the registry names its files."""
+    return type_name.replace("::", "-").lower() + ".json"
+
+
+def strip_unsupported_patterns(schema):
+    """Drop regexes Python cannot compile, such as Java's \\p{L} classes.
+
+    The rest of the schema still applies; Cloud Control enforces the pattern.
+    """
+    if isinstance(schema, dict):
+        pattern = schema.get("pattern")
+        if isinstance(pattern, str):
+            try:
+                re.compile(pattern)
+            except re.error:
+                schema = {
+                    key: value for key, value in schema.items() if key != "pattern"
+                }
+        return {key: strip_unsupported_patterns(value) for key, value in schema.items()}
+    if isinstance(schema, list):
+        return [strip_unsupported_patterns(item) for item in schema]
+    return schema
+
+
+def property_names(pointers):
+    """Top-level property names from "/properties/Name" pointers."""
+    names = set()
+    for pointer in pointers or ():
+        parts = pointer.split("/")
+        if len(parts) >= 3 and parts[1] == "properties":
+            names.add(parts[2])
+    return names
+
+
+def unescape_pointer(token: str):
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+class ResourceSchema:
+    """A resource type schema with its validators compiled once."""
+
+    def __init__(self, type_name: str, schema: dict, version: str):
+        self.type_name = type_name
+        self.version = version
+        schema = strip_unsupported_patterns(schema)
+        self.properties = schema.get("properties", {})
+        self.definitions = schema.get("definitions", {})
+        self.additional_properties = schema.get("additionalProperties", True)
+        self.read_only = property_names(schema.get("readOnlyProperties"))
+        self.create_only = property_names(schema.get("createOnlyProperties"))
+        # Never returned by GetResource, so they cannot be compared.
+        self.write_only = property_names(schema.get("writeOnlyProperties"))
+        self._validate = fastjsonschema.compile(schema)
+        self._property_validators = {}
+        self._lock = threading.Lock()
+
+    def _property_validator(self, name: str):
+        validator = self._property_validators.get(name)
+        if validator is None:
+            with self._lock:
+                validator = self._property_validators.get(name)
+                if validator is None:
+                    # Keep the definitions so "#/definitions/..." refs resolve.
+                    schema = {"definitions": self.definitions, **self.properties[name]}
+                    validator = fastjsonschema.compile(schema)
+                    self._property_validators[name] = validator
+        return validator
+
+    def _error(self, message):
+        return SchemaValidationError(f"Invalid {self.type_name}: {message}")
+
+    def validate_properties(self, properties: dict):
+        """Validate the DesiredState of a create request."""
+        if not isinstance(properties, dict):
+            raise self._error("Properties must be an object")
+        try:
+            self._validate(properties)
+        except fastjsonschema.JsonSchemaValueException as e:
+            raise self._error(e.message.replace("data", "Properties", 1))
+        read_only = sorted(self.read_only & set(properties))
+        if read_only:
+            raise self._error(
+                f"read-only properties cannot be set: {', '.join(read_only)}"
+            )
+
+    def _check_path(self, path, operation):
+        if not isinstance(path, str) or not path.startswith("/"):
+            raise self._error(f"patch path must be a JSON pointer: {path!r}")
+        name = unescape_pointer(path.split("/")[1])
+        if name not in self.properties:
+            if self.additional_properties is False:
+                raise self._error(f"unknown property {name}")
+            return None
+        if name in self.read_only:
+            raise self._error(f"{name} is read-only")
+        if name in self.create_only and operation != "test":
+            raise self._error(f"{name} can only be set when the resource is created")
+        return name
+
+    def validate_patch(self, patch_document):
+        """Validate an RFC 6902 PatchDocument of an update request.
+
+        Values replacing a whole top-level property are validated against
+        that property's schema; deeper paths only have their property checked.
+        """
+        if isinstance(patch_document, str):
+            try:
+                patch_document = json.loads(patch_document)
+            except ValueError as e:
+                raise self._error(f"PatchDocument is not valid JSON: {e}")
+        if not isinstance(patch_document, list):
+            raise self._error("PatchDocument must be a list of operations")
+
+        for index, operation in enumerate(patch_document):
+            if not isinstance(operation, dict):
+                raise self._error(f"patch operation {index} must be an object")
+            op = operation.get("op")
+            if op not in PATCH_OPERATIONS:
+                raise self._error(f"patch operation {index} has unknown op {op!r}")
+            path = operation.get("path")
+            name = self._check_path(path, op)
+            if op in ("move", "copy"):
+                self._check_path(operation.get("from"), op)
+            if op in ("add", "replace", "test") and "value" not in operation:
+                raise self._error(f"patch operation {index} needs a value")
+            if name is not None and op in ("add", "replace") and path.count("/") == 1:
+                try:
+                    self._property_validator(name)(operation["value"])
+                except fastjsonschema.JsonSchemaValueException as e:
+                    raise self._error(e.message.replace("data", name, 1))
+
+
+class SchemaRegistry:
+    """Resource type schemas from memory, disk, describe_type or the bundled snapshot.
+
+    Lookups after the first are a dictionary read. Types with no schema
+    anywhere are not validated, leaving the decision to Cloud Control.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = SCHEMA_CACHE_DIR,
+        ttl: int = SCHEMA_CACHE_TTL,
+        offline: bool = SCHEMA_OFFLINE,
+        bundled_dir: str = BUNDLED_SCHEMA_DIR,
+    ):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.offline = offline
+        self.bundled_dir = bundled_dir
+        self._schemas = {}
+        # Types with no schema anywhere, so describe_type is not retried on
+        # every request for them.
+        self._missing = {}
+        # Guards the dictionaries only; loading a type holds that type's
+        # lock, so a slow describe_type never holds up other types.
+        self._lock = threading.Lock()
+        self._type_locks = {}
+        self.hits = 0
+        self.disk_loads = 0
+        self.fetches = 0
+        self.fetch_errors = 0
+        self.bundled_loads = 0
+        self.compiles = 0
+
+    def cached(self, type_name: str):
+        """The compiled schema if it is in memory and fresh, else None."""
+        entry = self._schemas.get(type_name)
+        if entry is None:
+            return None
+        resource_schema, checked_at = entry
+        if time.time() - checked_at >= self.ttl and not self.offline:
+            return None
+        self.hits += 1
+        return resource_schema
+
+    def known(self, type_name: str):
+        """Whether a schema for the type has been loaded, fresh or not."""
+        return type_name in self._schemas
+
+    def _disk_path(self, type_name: str):
+        return os.path.join(self.cache_dir, schema_file_name(type_name))
+
+    def _read_disk(self, type_name: str):
+        try:
+            with open(self._disk_path(type_name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, record: dict):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(record, f)
+            os.replace(tmp_path, self._disk_path(record["TypeName"]))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _read_bundled(self, type_name: str):
+        try:
+            with open(os.path.join(self.bundled_dir, schema_file_name(type_name))) as f:
+                schema = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return {
+            "TypeName": type_name,
+            "VersionId": BUNDLED_VERSION,
+            "CheckedAt": 0,
+            "Schema": schema,
+        }
+
+    def _fetch(self, type_name: str, credentials):
+        response = describe_resource_type(type_name, *credentials)
+        return {
+            "TypeName": type_name,
+            "VersionId": response.get("DefaultVersionId") or response.get("Arn"),
+            "CheckedAt": time.time(),
+            "Schema": json.loads(response["Schema"]),
+        }
+
+    def _remember(self, record: dict):
+        type_name = record["TypeName"]
+        entry = self._schemas.get(type_name)
+        if entry is not None and entry[0].version == record["VersionId"]:
+            resource_schema = entry[0]
+        else:
+            schema = record["Schema"]
+            if isinstance(schema, str):
+                schema = json.loads(schema)
+            resource_schema = ResourceSchema(type_name, schema, record["VersionId"])
+            self.compiles += 1
+        with self._lock:
+            self._schemas[type_name] = (resource_schema, record["CheckedAt"])
+        return resource_schema
+
+    def _type_lock(self, type_name: str):
+        with self._lock:
+            lock = self._type_locks.get(type_name)
+            if lock is None:
+                lock = self._type_locks[type_name] = threading.Lock()
+            return lock
+
+    def load(self, type_name: str, credentials=None):
+        """Blocking lookup that may read disk or call describe_type.
+
+        Concurrent loads of one type wait for a single fetch; other types
+        are not held up by it.
+        """
+        resource_schema = self.cached(type_name)
+        if resource_schema is not None:
+            return resource_schema
+        with self._type_lock(type_name):
+            resource_schema = self.cached(type_name)
+            if resource_schema is not None:
+                return resource_schema
+
+            missing_since = self._missing.get(type_name)
+            if (
+                missing_since is not None
+                and time.time() - missing_since < SCHEMA_MISSING_TTL
+            ):
+                return None
+
+            record = self._read_disk(type_name)
+            if record is not None:
+                self.disk_loads += 1
+                if self.offline or time.time() - record.get("CheckedAt", 0) < self.ttl:
+                    return self._remember(record)
+
+            if not self.offline and credentials is not None:
+                try:
+                    fetched = self._fetch(type_name, credentials)
+                except Exception:
+                    self.fetch_errors += 1
+                else:
+                    self.fetches += 1
+                    with self._lock:
+                        self._missing.pop(type_name, None)
+                    try:
+                        self._write_disk(fetched)
+                    except OSError:
+                        pass
+                    return self._remember(fetched)
+
+            # Stale copy in memory or on disk, then the snapshot shipped with
+            # the service.
+            entry = self._schemas.get(type_name)
+            if record is None and entry is not None:
+                with self._lock:
+                    self._schemas[type_name] = (entry[0], time.time())
+                return entry[0]
+            if record is None:
+                record = self._read_bundled(type_name)
+                if record is None:
+                    with self._lock:
+                        self._missing[type_name] = time.time()
+                    return None
+                self.bundled_loads += 1
+            # Retry describe_type after another ttl, not on every request.
+            record = copy.copy(record)
+            record["CheckedAt"] = time.time()
+            return self._remember(record)
+
+    def stats(self):
+        return {
+            "enabled": SCHEMA_VALIDATION,
+            "offline": self.offline,
+            "types": {
+                type_name: resource_schema.version
+                for type_name, (resource_schema, _) in self._schemas.items()
+            },
+            "hits": self.hits,
+            "disk_loads": self.disk_loads,
+            "fetches": self.fetches,
+            "fetch_errors": self.fetch_errors,
+            "bundled_loads": self.bundled_loads,
+            "compiles": self.compiles,
+        }
+
+
+schema_registry = SchemaRegistry()
+
+
+async def get_resource_schema(type_name: str, credentials):
+    """The type's schema, or None when there is none anywhere."""
+    resource_schema = schema_registry.cached(type_name)
+    if resource_schema is None:
+        resource_schema = await run_cloudcontrol(
+            schema_registry.load, type_name, credentials
+        )
+    return resource_schema
+
+
+async def validate_request(
+    type_name: str, credentials, properties=None, patch_document=None
+):
+    """Validate create Properties or an update PatchDocument before sending it.
+
+    Raises SchemaValidationError; types without a schema pass unchecked.
+    """
+    if not SCHEMA_VALIDATION:
+        return
+    resource_schema = await get_resource_schema(type_name, credentials)
+    if resource_schema is None:
+        return
+    if properties is not None:
+        resource_schema.validate_properties(properties)
+    if patch_document is not None:
+        resource_schema.validate_patch(patch_document)
@@ -0,0 +1,195 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+from .client_pool import credentials_key
+from .cloudcontrol_client import get_resource_request_status, list_resource_requests
+from .executor import run_cloudcontrol
+from .singleflight import SingleFlight
+
+TERMINAL_STATUSES = ("SUCCESS", "FAILED", "CANCEL_COMPLETE")
+ACTIVE_STATUSES = ("PENDING", "IN_PROGRESS", "CANCEL_IN_PROGRESS")
+
+STATUS_CACHE_SIZE = int(os.getenv("STATUS_CACHE_SIZE", "4096"))
+STATUS_CACHE_TTL = int(os.getenv("STATUS_CACHE_TTL", "3600"))
+# A non-terminal status is reused for this long, so clients polling the same
+# token at once share a single upstream call.
+STATUS_FRESHNESS = float(os.getenv("STATUS_FRESHNESS", "1"))
+STATUS_POLL_INTERVAL = float(os.getenv("STATUS_POLL_INTERVAL", "1"))
+STATUS_MAX_POLL_INTERVAL = float(os.getenv("STATUS_MAX_POLL_INTERVAL", "5"))
+STATUS_MAX_WAIT = float(os.getenv("STATUS_MAX_WAIT", "60"))
+
+
+def operation_status(details: dict):
+    return details.get("ProgressEvent", {}).get("OperationStatus")
+
+
+class StatusPoller:
+    """Shared view of Cloud Control request statuses for every client of this worker.
+
+    Entries are keyed on the caller's credentials and region as well as the
+    token, so a token is only ever answered for the credentials that could
+    read it, in the region that issued it.
+    """
+
+    def __init__(
+        self,
+        cache_size: int = STATUS_CACHE_SIZE,
+        cache_ttl: int = STATUS_CACHE_TTL,
+        freshness: float = STATUS_FRESHNESS,
+    ):
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.freshness = freshness
+        self._statuses = OrderedDict()
+        self._flight = SingleFlight()
+        self.upstream_calls = 0
+        self.cache_hits = 0
+
+    def _key(self, request_token, credentials, region=None):
+        return (credentials_key(*credentials, region_name=region), request_token)
+
+    def _cached(self, key):
+        entry = self._statuses.get(key)
+        if entry is None:
+            return None
+        details, fetched_at = entry
+        age = time.monotonic() - fetched_at
+        if operation_status(details) in TERMINAL_STATUSES:
+            if age < self.cache_ttl:
+                return details
+        elif age < self.freshness:
+            return details
+        return None
+
+    def _store(self, key, details):
+        self._statuses[key] = (details, time.monotonic())
+        self._statuses.move_to_end(key)
+        while len(self._statuses) > self.cache_size:
+            self._statuses.popitem(last=False)
+
+    async def _fetch(self, key, request_token, credentials, region=None):
+        self.upstream_calls += 1
+        details = await run_cloudcontrol(
+            get_resource_request_status, request_token, *credentials, region
+        )
+        self._store(key, details)
+        return details
+
+    def last_known(self, request_token: str, credentials, region: str = None):
+        """The last status seen for a token, however old, without calling out."""
+        entry = self._statuses.get(self._key(request_token, credentials, region))
+        return entry[0] if entry is not None else None
+
+    async def get_status(self, request_token: str, credentials, region: str = None):
+        key = self._key(request_token, credentials, region)
+        details = self._cached(key)
+        if details is not None:
+            self.cache_hits += 1
+            return details
+        return await self._flight.do(
+            key, self._fetch, key, request_token, credentials, region
+        )
+
+    async def refresh_many(
+        self,
+        credentials,
+        request_tokens: list = None,
+        operation_statuses: list = None,
+        operations: list = None,
+        region: str = None,
+        fetch_missing: bool = True,
+    ):
+        """Refresh many requests with one paginated ListResourceRequests call.
+
+        With tokens and no filter of the caller's, only requests still in
+        progress are listed, and only the tokens asked for are kept. Tokens
+        missing from that listing have finished (or are older than its
+        retention window) and fall back to individual, coalesced status
+        calls, which are answered from the cache once terminal, unless
+        ``fetch_missing`` is off, as when the tokens span several regions.
+        """
+        wanted = set(request_tokens or ())
+        narrowed = bool(wanted) and not operation_statuses and not operations
+        if narrowed:
+            operation_statuses = list(ACTIVE_STATUSES)
+
+        self.upstream_calls += 1
+        summaries = await run_cloudcontrol(
+            list_resource_requests,
+            *credentials,
+            operation_statuses=operation_statuses,
+            operations=operations,
+            region_name=region,
+        )
+        events = {}
+        for summary in summaries:
+            token = summary.get("RequestToken")
+            if wanted and token not in wanted:
+                continue
+            events[token] = summary
+            self._store(
+                self._key(token, credentials, region), {"ProgressEvent": summary}
+            )
+
+        if not request_tokens:
+            return list(events.values())
+
+        missing = [token for token in request_tokens if token not in events]
+        if missing and fetch_missing and narrowed:
+            fetched = await asyncio.gather(
+                *(self.get_status(token, credentials, region) for token in missing)
+            )
+            for token, details in zip(missing, fetched):
+                events[token] = details.get("ProgressEvent", {})
+        return [events[token] for token in request_tokens if token in events]
+
+    async def watch(
+        self, request_token: str, credentials, timeout: float, region: str = None
+    ):
+        """Yield each new status until the request is terminal or timeout expires."""
+        deadline = time.monotonic() + min(timeout, STATUS_MAX_WAIT)
+        interval = STATUS_POLL_INTERVAL
+        last_status = None
+        while True:
+            details = await self.get_status(request_token, credentials, region)
+            status = operation_status(details)
+            if status != last_status:
+                last_status = status
+                yield details
+            if status in TERMINAL_STATUSES:
+                return
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(min(interval, remaining))
+            interval = min(STATUS_MAX_POLL_INTERVAL, interval * 1.5)
+
+    async def wait(
+        self, request_token: str, credentials, timeout: float, region: str = None
+    ):
+        """Return the status once terminal, or the latest one when timeout expires."""
+        details = None
+        async for details in self.watch(request_token, credentials, timeout, region):
+            pass
+        return details
+
+    def stats(self):
+        tracked = len(self._statuses)
+        terminal = sum(
+            operation_status(details) in TERMINAL_STATUSES
+            for details, _ in self._statuses.values()
+        )
+        return {
+            "tracked": tracked,
+            "in_flight": tracked - terminal,
+            "terminal_cached": terminal,
+            "upstream_calls": self.upstream_calls,
+            "cache_hits": self.cache_hits,
+            "coalesced": self._flight.coalesced,
+        }
+
+
+status_poller = StatusPoller()
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .executor import run_cache
+
+TEMPLATE_CACHE_SIZE = int(os.getenv("TEMPLATE_CACHE_SIZE", "512"))
+TEMPLATE_CACHE_TTL = int(os.getenv("TEMPLATE_CACHE_TTL", "86400"))
+# Optional SQLite file shared by every uvicorn worker on the host.
+TEMPLATE_CACHE_DB = os.getenv("TEMPLATE_CACHE_DB")
+TEMPLATE_CACHE_DB_SIZE = int(os.getenv("TEMPLATE_CACHE_DB_SIZE", "10000"))
+# Expired and surplus rows are removed once every this many writes.
+TEMPLATE_CACHE_DB_PRUNE_EVERY = int(os.getenv("TEMPLATE_CACHE_DB_PRUNE_EVERY", "64"))
+
+
+def normalize_prompt(prompt: str):
+    return " ".join(prompt.split())
+
+
+def cache_key(prompt: str, model_id: str, params: dict):
+    """Content address of a generation: normalized prompt, model and parameters."""
+    payload = json.dumps(
+        {"prompt": normalize_prompt(prompt), "model_id": model_id, "params": params},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryTier:
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at=None):
+        with self._lock:
+            self._entries[key] = (value, expires_at or time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteTier:
+    """Shared tier on disk. Reads never write: rows leave by expiry, or
+    oldest first once the table outgrows max_size."""
+
+    def __init__(
+        self,
+        path: str,
+        max_size: int,
+        ttl: int,
+        prune_every: int = TEMPLATE_CACHE_DB_PRUNE_EVERY,
+    ):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.prune_every = prune_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(templates)")}
+        if "accessed_at" in columns:
+            # Tables from before reads stopped writing; it is only a cache.
+            conn.execute("DROP TABLE templates")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS templates ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS templates_expires ON templates (expires_at)"
+        )
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = (
+            self._connection()
+            .execute(
+                "SELECT value, expires_at FROM templates "
+                "WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value):
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO templates VALUES (?, ?, ?)",
+            (key, json.dumps(value), now + self.ttl),
+        )
+        # Writes run on several executor threads; exactly one of them
+        # prunes at each multiple of prune_every.
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.prune_every == 0
+        if due:
+            self.prune(now)
+        conn.commit()
+
+    def prune(self, now=None):
+        conn = self._connection()
+        conn.execute(
+            "DELETE FROM templates WHERE expires_at <= ?", (now or time.time(),)
+        )
+        conn.execute(
+            "DELETE FROM templates WHERE key IN (SELECT key FROM templates "
+            "ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,),
+        )
+
+
+class TemplateCache:
+    """Two-tier cache of generated templates: in-process LRU, then SQLite.
+
+    The SQLite tier is read and written on the cache executor, so a busy
+    database never stalls the event loop.
+    """
+
+    def __init__(
+        self,
+        max_size: int = TEMPLATE_CACHE_SIZE,
+        ttl: int = TEMPLATE_CACHE_TTL,
+        db_path: str = TEMPLATE_CACHE_DB,
+        db_size: int = TEMPLATE_CACHE_DB_SIZE,
+    ):
+        self.memory = MemoryTier(max_size, ttl)
+        self.disk = SQLiteTier(db_path, db_size, ttl) if db_path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    async def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        if self.disk is not None:
+            entry = await run_cache(self.disk.get, key)
+            if entry is not None:
+                value, expires_at = entry
+                self.memory.set(key, value, expires_at)
+                self.hits += 1
+                self.disk_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            await run_cache(self.disk.set, key, value)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.memory),
+            "max_size": self.memory.max_size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "disk": self.disk.path if self.disk is not None else None,
+        }
+
+
+template_cache = TemplateCache()
@@ -0,0 +1,43 @@
+import asyncio
+import threading
+
+from cloudysetup.envapi_app import main
+
+
+def test_disconnect_closes_the_stream_after_the_read_in_flight(monkeypatch):
+    reading = threading.Event()
+    release = threading.Event()
+    closed = []
+
+    def stream_model_text(prompt):
+        try:
+            yield "first"
+            reading.set()
+            assert release.wait(5)
+            yield "second"
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(main, "stream_model_text", stream_model_text)
+
+    async def consume(received):
+        async for chunk in main.iterate_bedrock_stream("prompt"):
+            received.append(chunk)
+
+    async def scenario():
+        received = []
+        task = asyncio.ensure_future(consume(received))
+        while not reading.is_set():
+            await asyncio.sleep(0.01)
+        # The client goes away while next() blocks in the Bedrock executor.
+        task.cancel()
+        await asyncio.sleep(0.05)
+        release.set()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return received
+
+    assert asyncio.run(scenario()) == ["first"]
+    assert closed == [True]
@@ -0,0 +1,74 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from cloudysetup.cli_tool.http_client import ApiClient, with_client_tokens
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Answers the first POST with 503 and the rest with 200, keeping each body."""
+
+    bodies = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.bodies.append(body)
+        status = 503 if len(self.bodies) == 1 else 200
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    FlakyHandler.bodies = []
+    httpd = HTTPServer(("127.0.0.1", 0), FlakyHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_retry_reuses_client_token(server):
+    api = ApiClient(server)
+    body = {"TypeName": "AWS::SNS::Topic", "Properties": {"TopicName": "orders"}}
+    response = api.post("/create-resource", json=body)
+    api.close()
+
+    assert response.status_code == 200
+    first, retry = FlakyHandler.bodies
+    assert first["ClientToken"]
+    assert retry["ClientToken"] == first["ClientToken"]
+    assert "ClientToken" not in body
+
+
+def test_each_submission_gets_its_own_token():
+    body = {"TypeName": "AWS::SNS::Topic", "Properties": {}}
+    first = with_client_tokens("/message", body)["ClientToken"]
+    second = with_client_tokens("/message", body)["ClientToken"]
+    assert first != second
+
+
+def test_batch_operations_get_tokens():
+    body = {
+        "Operations": [
+            {"Operation": "create", "TypeName": "AWS::SNS::Topic"},
+            {"Operation": "delete", "TypeName": "AWS::SNS::Topic", "ClientToken": "t"},
+        ]
+    }
+    first, second = with_client_tokens("/batch", body)["Operations"]
+    assert first["ClientToken"] and first["ClientToken"] != "t"
+    assert second["ClientToken"] == "t"
+
+
+def test_read_only_paths_are_left_alone():
+    body = {"request_token": "t"}
+    assert with_client_tokens("/resource-status", body) is body
@@ -0,0 +1,106 @@
+import asyncio
+import itertools
+import json
+
+from cloudysetup.envapi_app.cloudcontrol_client import (
+    create_resource,
+    delete_resource,
+    update_resource,
+)
+from cloudysetup.envapi_app.idempotency import SubmissionDedup
+from cloudysetup.envapi_app.status_poller import status_poller
+
+CREDENTIALS = ("access-key", "secret-key", None)
+REGION = "us-east-1"
+TYPE_NAME = "AWS::SNS::Topic"
+
+
+class FakeCall:
+    """Stands in for run_cloudcontrol and records what reached Cloud Control."""
+
+    def __init__(self):
+        self.calls = []
+        self._tokens = itertools.count(1)
+
+    async def __call__(self, func, *args, client_token=None):
+        self.calls.append((func.__name__, client_token))
+        event = {"RequestToken": f"token-{next(self._tokens)}"}
+        if func is create_resource:
+            event["Identifier"] = json.loads(args[1])["TopicName"]
+        return {"ProgressEvent": event}
+
+
+def submit(dedup, call, func, *args):
+    return asyncio.run(dedup.submit(func, args, CREDENTIALS, REGION, call=call))
+
+
+def patch(value):
+    return json.dumps([{"op": "replace", "path": "/DisplayName", "value": value}])
+
+
+def test_retry_is_replayed():
+    dedup, call = SubmissionDedup(ttl=60, enabled=True), FakeCall()
+    first, deduplicated = submit(
+        dedup, call, update_resource, TYPE_NAME, "t", patch("b")
+    )
+    assert not deduplicated
+    again, deduplicated = submit(
+        dedup, call, update_resource, TYPE_NAME, "t", patch("b")
+    )
+    assert deduplicated and again == first
+    assert len(call.calls) == 1
+
+
+def test_update_aba_is_applied_again():
+    dedup, call = SubmissionDedup(ttl=60, enabled=True), FakeCall()
+    first, _ = submit(dedup, call, update_resource, TYPE_NAME, "t", patch("b"))
+    submit(dedup, call, update_resource, TYPE_NAME, "t", patch("a"))
+    third, deduplicated = submit(
+        dedup, call, update_resource, TYPE_NAME, "t", patch("b")
+    )
+    assert not deduplicated and third != first
+    assert len(call.calls) == 3
+    # The repeat is new work upstream too, not a replay of the first token.
+    assert call.calls[0][1] != call.calls[2][1]
+
+
+def test_create_delete_create_is_applied_again():
+    dedup, call = SubmissionDedup(ttl=60, enabled=True), FakeCall()
+    body = json.dumps({"TopicName": "orders"})
+    first, _ = submit(dedup, call, create_resource, TYPE_NAME, body)
+    submit(dedup, call, delete_resource, TYPE_NAME, "orders")
+    again, deduplicated = submit(dedup, call, create_resource, TYPE_NAME, body)
+    assert not deduplicated and again != first
+    assert [name for name, _ in call.calls] == [
+        "create_resource",
+        "delete_resource",
+        "create_resource",
+    ]
+    assert call.calls[0][1] != call.calls[2][1]
+
+
+def test_other_resources_keep_their_entries():
+    dedup, call = SubmissionDedup(ttl=60, enabled=True), FakeCall()
+    submit(dedup, call, update_resource, TYPE_NAME, "t1", patch("b"))
+    submit(dedup, call, update_resource, TYPE_NAME, "t2", patch("a"))
+    _, deduplicated = submit(dedup, call, update_resource, TYPE_NAME, "t1", patch("b"))
+    assert deduplicated
+
+
+def test_finished_request_is_not_replayed():
+    dedup, call = SubmissionDedup(ttl=60, enabled=True), FakeCall()
+    first, _ = submit(dedup, call, update_resource, TYPE_NAME, "t", patch("b"))
+    token = first["ProgressEvent"]["RequestToken"]
+    key = status_poller._key(token, CREDENTIALS, REGION)
+    status_poller._store(key, {"ProgressEvent": {"OperationStatus": "SUCCESS"}})
+    _, deduplicated = submit(dedup, call, update_resource, TYPE_NAME, "t", patch("b"))
+    assert not deduplicated
+    assert len(call.calls) == 2
+
+
+def test_entries_expire_after_ttl():
+    dedup, call = SubmissionDedup(ttl=0, enabled=True), FakeCall()
+    submit(dedup, call, update_resource, TYPE_NAME, "t", patch("b"))
+    _, deduplicated = submit(dedup, call, update_resource, TYPE_NAME, "t", patch("b"))
+    assert not deduplicated
+    assert call.calls[0][1] != call.calls[1][1]
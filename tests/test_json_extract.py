@@ -0,0 +1,97 @@
+import json
+import os
+import time
+
+import pytest
+
+from cloudysetup.envapi_app.json_extract import (
+    JsonExtractor,
+    extract_json_array,
+    extract_json_object,
+    extract_json_values,
+)
+
+CORPUS = os.path.join(
+    os.path.dirname(__file__), os.pardir, "benchmarks", "corpus", "model_replies.jsonl"
+)
+
+
+def values(text, kinds="{["):
+    return [candidate.value for candidate in extract_json_values(text, kinds)]
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"a": 1}', [{"a": 1}]),
+        ('Here: {"a": {"b": [1, 2]}} done', [{"a": {"b": [1, 2]}}]),
+        ('a {placeholder} then {"x": 1} and [2]', [{"x": 1}, [2]]),
+        ('{"s": "a } in a string"}', [{"s": "a } in a string"}]),
+        ('{"s": "escaped \\" quote {"}', [{"s": 'escaped " quote {'}]),
+        ('He said "hi {there" {"a":1}', [{"a": 1}]),
+        ('text "quoted {brace" then {"k": "v"}', [{"k": "v"}]),
+        ('{ outer { mid {"deep": 1} } }', [{"deep": 1}]),
+        ('{"a": 1 ] {"b": 2}', [{"b": 2}]),
+        ('{ unterminated {"a": 1}', [{"a": 1}]),
+        ("no json at all", []),
+    ],
+)
+def test_extract_json_values(text, expected):
+    assert values(text) == expected
+
+
+def test_offsets_point_into_the_text():
+    text = 'He said "hi {there" {"a":1} and [1]'
+    for candidate in extract_json_values(text):
+        assert json.loads(text[candidate.start : candidate.end]) == candidate.value
+
+
+def test_extract_json_object_after_stray_quote():
+    assert extract_json_object('He said "hi {there" {"a":1}') == {"a": 1}
+    assert extract_json_array('Pick ["one", or {"two"}: ["a", "b"]') == ["a", "b"]
+    with pytest.raises(ValueError):
+        extract_json_object("nothing here")
+
+
+@pytest.mark.parametrize("size", [1, 3, 16])
+def test_chunked_feed_matches_whole_text(size):
+    text = 'Sure "here {is" the template: {"T": {"P": [1, 2]}} and {"U": 2}'
+    extractor = JsonExtractor("{")
+    found = []
+    for start in range(0, len(text), size):
+        found += extractor.feed(text[start : start + size])
+    found += extractor.finish()
+    assert found == extract_json_values(text, "{")
+    assert [candidate.value for candidate in found] == [{"T": {"P": [1, 2]}}, {"U": 2}]
+
+
+def test_corpus_replies_yield_a_value():
+    with open(CORPUS) as f:
+        replies = [json.loads(line)["reply"] for line in f if line.strip()]
+    assert replies
+    for reply in replies:
+        assert extract_json_values(reply)
+        if '"TypeName"' in reply:
+            assert "TypeName" in json.dumps(extract_json_object(reply))
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("{ " * 20000 + '{"a": 1}', [{"a": 1}]),
+        ("{a" * 10000 + "}" * 10000, []),
+        ('{"a" ' * 10000 + "}" * 10000, []),
+        ("[1," * 10000 + "x" + "]" * 10000, []),
+        ('He said "hi {there" ' * 2000, []),
+    ],
+)
+def test_pathological_input_stays_linear(text, expected):
+    started = time.perf_counter()
+    assert values(text) == expected
+    # Rescanning every failed span took tens of seconds on these.
+    assert time.perf_counter() - started < 2
+
+
+def test_deep_nesting_yields_the_decodable_part():
+    (candidate,) = extract_json_values("[" * 5000 + "]" * 5000)
+    assert candidate.end - candidate.start < 5000 * 2
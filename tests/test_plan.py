@@ -0,0 +1,192 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from botocore.exceptions import ClientError
+
+from cloudysetup.envapi_app import plan
+from cloudysetup.envapi_app.plan import array_key, diff_properties, values_equal
+from cloudysetup.envapi_app.schema_registry import ResourceSchema
+
+CREDENTIALS = ("access-key", "secret-key", None)
+SCHEMA = ResourceSchema(
+    "AWS::SQS::Queue",
+    {
+        "typeName": "AWS::SQS::Queue",
+        "definitions": {
+            "Tag": {
+                "type": "object",
+                "properties": {
+                    "Key": {"type": "string"},
+                    "Value": {"type": "string"},
+                },
+            }
+        },
+        "properties": {
+            "QueueName": {"type": "string"},
+            "FifoQueue": {"type": "boolean"},
+            "VisibilityTimeout": {"type": "integer"},
+            "MaximumMessageSize": {"type": "string"},
+            "Tags": {"type": "array", "items": {"$ref": "#/definitions/Tag"}},
+            "Ordered": {
+                "type": "array",
+                "insertionOrder": True,
+                "items": {"type": "object"},
+            },
+            "Arn": {"type": "string"},
+        },
+        "readOnlyProperties": ["/properties/Arn"],
+        "createOnlyProperties": ["/properties/QueueName", "/properties/FifoQueue"],
+    },
+    "v1",
+)
+
+
+def test_values_compare_strictly_without_a_schema():
+    assert values_equal(30, 30.0)
+    assert not values_equal("30", 30)
+    assert not values_equal(True, 1)
+    assert not values_equal({"a": True}, {"a": 1})
+
+
+def test_string_properties_accept_their_text():
+    assert (
+        diff_properties(
+            {"MaximumMessageSize": "1024"}, {"MaximumMessageSize": 1024}, SCHEMA
+        )
+        == []
+    )
+    assert diff_properties(
+        {"VisibilityTimeout": "30"}, {"VisibilityTimeout": 30}, SCHEMA
+    ) == [{"op": "replace", "path": "/VisibilityTimeout", "value": 30}]
+    # Nested through a $ref.
+    assert (
+        diff_properties(
+            {"Tags": [{"Key": "size", "Value": "3"}]},
+            {"Tags": [{"Key": "size", "Value": 3}]},
+            SCHEMA,
+        )
+        == []
+    )
+
+
+def test_keyed_array_reorder_is_no_change():
+    current = {"Tags": [{"Key": "a", "Value": "1"}, {"Key": "b", "Value": "2"}]}
+    desired = {"Tags": [{"Key": "b", "Value": "2"}, {"Key": "a", "Value": "1"}]}
+    assert diff_properties(current, desired) == []
+    desired["Tags"][0]["Value"] = "3"
+    assert diff_properties(current, desired) == [
+        {"op": "replace", "path": "/Tags/1/Value", "value": "3"}
+    ]
+
+
+def test_ambiguous_array_keys_fall_back_to_order():
+    current = [{"Name": "x", "Key": "1"}, {"Name": "y", "Key": "2"}]
+    desired = [{"Name": "x", "Key": "2"}, {"Name": "y", "Key": "1"}]
+    assert array_key(current, desired) is None
+    assert diff_properties({"Items": current}, {"Items": desired}) == [
+        {"op": "replace", "path": "/Items/0/Key", "value": "2"},
+        {"op": "replace", "path": "/Items/1/Key", "value": "1"},
+    ]
+    # Both fields pair the same elements: still keyed.
+    assert array_key(current, list(reversed(current))) == "Key"
+
+
+def test_insertion_ordered_arrays_are_not_keyed():
+    current = {"Ordered": [{"Key": "a"}, {"Key": "b"}]}
+    desired = {"Ordered": [{"Key": "b"}, {"Key": "a"}]}
+    assert diff_properties(current, desired, SCHEMA) != []
+
+
+def test_ordered_array_trims_common_head_and_tail():
+    current = {"List": [1, 2, 3, 4, 5]}
+    assert diff_properties(current, {"List": [1, 2, 9, 4, 5]}) == [
+        {"op": "replace", "path": "/List/2", "value": 9}
+    ]
+    assert diff_properties(current, {"List": [1, 2, 6, 7, 3, 4, 5]}) == [
+        {"op": "add", "path": "/List/2", "value": 6},
+        {"op": "add", "path": "/List/3", "value": 7},
+    ]
+    assert diff_properties(current, {"List": [1, 5]}) == [
+        {"op": "remove", "path": "/List/3"},
+        {"op": "remove", "path": "/List/2"},
+        {"op": "remove", "path": "/List/1"},
+    ]
+
+
+def test_top_level_properties_left_out_are_kept():
+    assert diff_properties({"QueueName": "q", "Arn": "arn"}, {"QueueName": "q"}) == []
+    assert diff_properties({"Nested": {"a": 1, "b": 2}}, {"Nested": {"a": 1}}) == [
+        {"op": "remove", "path": "/Nested/b"}
+    ]
+
+
+@pytest.fixture
+def live(monkeypatch):
+    """Serve plan_resource a live resource and the schema above."""
+    resources = {}
+
+    async def run_cloudcontrol(func, type_name, identifier, *args):
+        if identifier not in resources:
+            raise ClientError(
+                {"Error": {"Code": "ResourceNotFoundException"}}, "GetResource"
+            )
+        return {
+            "ResourceDescription": {"Properties": json.dumps(resources[identifier])}
+        }
+
+    async def get_resource_schema(type_name, credentials):
+        return SCHEMA
+
+    async def validate_request(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(plan, "run_cloudcontrol", run_cloudcontrol)
+    monkeypatch.setattr(plan, "get_resource_schema", get_resource_schema)
+    monkeypatch.setattr(plan, "validate_request", validate_request)
+    return resources
+
+
+def plan_for(identifier, properties):
+    resource = SimpleNamespace(
+        TypeName="AWS::SQS::Queue",
+        Identifier=identifier,
+        Properties=properties,
+        Region="us-east-1",
+    )
+    return asyncio.run(plan.plan_resource(resource, CREDENTIALS, None))
+
+
+def test_plan_create(live):
+    assert plan_for("missing", {"QueueName": "q"})["Action"] == "create"
+
+
+def test_plan_no_op(live):
+    live["q"] = {"QueueName": "q", "VisibilityTimeout": 30, "Arn": "arn:q"}
+    result = plan_for("q", {"QueueName": "q", "VisibilityTimeout": 30, "Arn": "x"})
+    assert result["Action"] == "no-op"
+    assert result["ResourceModel"] == live["q"]
+
+
+def test_plan_update(live):
+    live["q"] = {"QueueName": "q", "VisibilityTimeout": 30}
+    result = plan_for("q", {"QueueName": "q", "VisibilityTimeout": 60})
+    assert result["Action"] == "update"
+    assert result["PatchDocument"] == [
+        {"op": "replace", "path": "/VisibilityTimeout", "value": 60}
+    ]
+
+
+def test_plan_type_change_is_an_update(live):
+    live["q"] = {"QueueName": "q", "VisibilityTimeout": "30"}
+    assert (
+        plan_for("q", {"QueueName": "q", "VisibilityTimeout": 30})["Action"] == "update"
+    )
+
+
+def test_plan_replace_on_create_only(live):
+    live["q"] = {"QueueName": "q", "FifoQueue": False}
+    result = plan_for("q", {"QueueName": "q", "FifoQueue": True})
+    assert result["Action"] == "replace"
+    assert result["ReplacementProperties"] == ["FifoQueue"]
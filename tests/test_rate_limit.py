@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from cloudysetup.envapi_app import rate_limit
+from cloudysetup.envapi_app.client_pool import ClientPool
+from cloudysetup.envapi_app.rate_limit import (
+    MemoryBackend,
+    RateLimiter,
+    RedisBackend,
+    client_key,
+    parse_rate,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRequest:
+    """Only what client_key reads from a starlette Request."""
+
+    def __init__(self, headers=None, host="10.0.0.1"):
+        self.headers = headers or {}
+        self.client = type("Client", (), {"host": host})()
+
+
+def acquire(backend, key="k", rate=1 / 20, burst=3):
+    return asyncio.run(backend.acquire(key, rate, burst))
+
+
+def test_parse_rate():
+    assert parse_rate("3/minute") == (3 / 60, 3)
+    assert parse_rate("10/2 hours") == (10 / 7200, 10)
+
+
+def test_memory_bucket_bursts_then_refills(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    backend = MemoryBackend()
+
+    assert [acquire(backend)[0] for _ in range(3)] == [True, True, True]
+    allowed, _, retry_after = acquire(backend)
+    assert not allowed
+    assert retry_after == pytest.approx(20)
+
+    clock.now += 20
+    assert acquire(backend)[0]
+    assert not acquire(backend)[0]
+    # Idle time never fills the bucket past the burst.
+    clock.now += 3600
+    assert [acquire(backend)[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_memory_buckets_are_per_key_and_bounded(monkeypatch):
+    monkeypatch.setattr(rate_limit.time, "monotonic", FakeClock())
+    backend = MemoryBackend(max_keys=2)
+    for _ in range(3):
+        acquire(backend, "a")
+    assert not acquire(backend, "a")[0]
+    assert acquire(backend, "b")[0]
+    acquire(backend, "c")
+    assert backend.stats() == {"keys": 2}
+    # "a" was evicted, so it starts again from a full bucket.
+    assert acquire(backend, "a")[0]
+
+
+def test_redis_backend_shares_the_bucket():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+
+    async def scenario():
+        # Two workers talking to the same server.
+        first = RedisBackend(client=fakeredis.FakeAsyncRedis(server=server))
+        second = RedisBackend(client=fakeredis.FakeAsyncRedis(server=server))
+        results = [await first.acquire("k", 3 / 60, 3) for _ in range(2)]
+        results.append(await second.acquire("k", 3 / 60, 3))
+        results.append(await second.acquire("k", 3 / 60, 3))
+        return results
+
+    results = asyncio.run(scenario())
+    assert [allowed for allowed, _, _ in results] == [True, True, True, False]
+    assert results[-1][2] == pytest.approx(20, abs=1)
+
+
+def test_unknown_access_key_is_keyed_on_the_client_address(monkeypatch):
+    monkeypatch.setattr(rate_limit, "known_access_key", lambda key: key == "AKIAKNOWN")
+
+    assert client_key(FakeRequest({"aws-access-key": "AKIAMADEUP"})) == "ip:10.0.0.1"
+    assert client_key(FakeRequest({"aws-access-key": "AKIAKNOWN"})).startswith("key:")
+    forwarded = {"aws-access-key": "AKIAMADEUP", "x-forwarded-for": "1.2.3.4, 5.6.7.8"}
+    assert client_key(FakeRequest(forwarded)) == "ip:5.6.7.8"
+
+
+def test_pool_knows_the_access_keys_of_its_clients():
+    pool = ClientPool("cloudcontrol", max_size=1)
+    pool.get_client("AKIAFIRST", "secret", region_name="us-east-1")
+    assert pool.knows_access_key("AKIAFIRST")
+    assert not pool.knows_access_key("AKIASECOND")
+
+    pool.get_client("AKIASECOND", "secret", region_name="us-east-1")
+    assert pool.knows_access_key("AKIASECOND")
+    assert not pool.knows_access_key("AKIAFIRST")
+
+
+def test_endpoint_answers_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(rate_limit, "known_access_key", lambda key: False)
+    limiter = RateLimiter(MemoryBackend(), enabled=True)
+    app = FastAPI()
+
+    @app.post("/limited")
+    @limiter.limit("3/minute")
+    async def limited(request: Request):
+        return {"status": "success"}
+
+    client = TestClient(app)
+    codes = []
+    for index in range(3):
+        # A different made-up key each time still draws from one bucket.
+        response = client.post("/limited", headers={"aws-access-key": f"AKIA{index}"})
+        codes.append(response.status_code)
+    response = client.post("/limited", headers={"aws-access-key": "AKIAOTHER"})
+
+    assert codes == [200, 200, 200]
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "20"
+    assert limiter.stats()["limited"] == 1
@@ -0,0 +1,161 @@
+import pytest
+
+from cloudysetup.cli_tool.scheduler import (
+    DagScheduler,
+    ResourceNode,
+    build_graph,
+    execution_levels,
+)
+
+
+def node(name, properties=None, operation="create", depends_on=(), **body):
+    body = {"TypeName": "AWS::SNS::Topic", "Properties": properties or {}, **body}
+    return ResourceNode(name, f"{name}.json", operation, body, depends_on)
+
+
+def test_independent_nodes_share_a_level():
+    nodes = [node("a"), node("b"), node("c")]
+    build_graph(nodes)
+    assert execution_levels(nodes) == [["a", "b", "c"]]
+
+
+def test_ref_getatt_and_depends_on():
+    nodes = [
+        node("topic"),
+        node("queue"),
+        node(
+            "subscription",
+            {"TopicArn": {"Ref": "topic"}, "Endpoint": {"Fn::GetAtt": "queue.Arn"}},
+        ),
+        node("alarm", depends_on=["subscription"]),
+    ]
+    build_graph(nodes)
+    assert execution_levels(nodes) == [["queue", "topic"], ["subscription"], ["alarm"]]
+
+
+def test_getatt_list_form():
+    nodes = [
+        node("queue"),
+        node("policy", {"Queues": [{"Fn::GetAtt": ["queue", "Arn"]}]}),
+    ]
+    build_graph(nodes)
+    assert execution_levels(nodes) == [["queue"], ["policy"]]
+
+
+def test_deletes_run_in_reverse():
+    nodes = [
+        node("topic", operation="delete"),
+        node("subscription", {"TopicArn": {"Ref": "topic"}}, operation="delete"),
+    ]
+    build_graph(nodes)
+    assert execution_levels(nodes) == [["subscription"], ["topic"]]
+
+
+def test_unknown_dependency():
+    with pytest.raises(ValueError, match="unknown resources: missing"):
+        build_graph([node("a", depends_on=["missing"])])
+
+
+def test_cycle():
+    nodes = [node("a", depends_on=["b"]), node("b", depends_on=["a"])]
+    with pytest.raises(ValueError, match="Dependency cycle between: a, b"):
+        build_graph(nodes)
+
+
+def test_values_are_not_matched_by_default():
+    nodes = [
+        node(
+            "topic",
+            {"TopicName": "orders", "Tags": [{"Key": "team", "Value": "billing"}]},
+        ),
+        node(
+            "queue",
+            {"QueueName": "billing", "Tags": [{"Key": "team", "Value": "orders"}]},
+        ),
+    ]
+    build_graph(nodes)
+    assert execution_levels(nodes) == [["queue", "topic"]]
+
+
+def test_matched_values_ignore_tags_and_display_names():
+    nodes = [
+        node(
+            "topic",
+            {
+                "TopicName": "orders",
+                "DisplayName": "prod",
+                "Tags": [{"Key": "team", "Value": "billing"}],
+            },
+        ),
+        node(
+            "queue", {"QueueName": "billing", "Tags": [{"Key": "env", "Value": "prod"}]}
+        ),
+    ]
+    build_graph(nodes, match_values=True)
+    assert execution_levels(nodes) == [["queue", "topic"]]
+
+
+def test_matched_values_follow_arns():
+    nodes = [
+        node("topic", {"TopicName": "orders"}),
+        node(
+            "subscription",
+            {"TopicArn": "arn:aws:sns:us-east-1:123456789012:orders"},
+        ),
+    ]
+    build_graph(nodes, match_values=True)
+    assert execution_levels(nodes) == [["topic"], ["subscription"]]
+
+
+def succeed(node):
+    return {"ProgressEvent": {"OperationStatus": "SUCCESS", "Identifier": node.name}}
+
+
+def test_scheduler_runs_in_order():
+    nodes = [node("topic"), node("subscription", {"TopicArn": {"Ref": "topic"}})]
+    build_graph(nodes)
+    submitted = []
+
+    def submit(ready):
+        submitted.append([n.name for n in ready])
+        return [{"status": "success", "RequestToken": n.name} for n in ready]
+
+    DagScheduler(nodes, submit, succeed).run()
+    assert submitted == [["topic"], ["subscription"]]
+    assert nodes[1].body["Properties"]["TopicArn"] == "topic"
+    assert [n.status for n in nodes] == ["SUCCESS", "SUCCESS"]
+
+
+def test_submit_error_fails_the_batch():
+    nodes = [
+        node("topic"),
+        node("queue"),
+        node("subscription", {"TopicArn": {"Ref": "topic"}}),
+    ]
+    build_graph(nodes)
+
+    def submit(ready):
+        if any(n.name == "topic" for n in ready):
+            raise ConnectionError("connection refused")
+        return [{"status": "success", "RequestToken": n.name} for n in ready]
+
+    DagScheduler(nodes, submit, succeed).run()
+    assert [n.status for n in nodes] == ["FAILED", "FAILED", "SKIPPED"]
+    assert nodes[0].error == "connection refused"
+
+
+def test_wait_error_fails_the_node():
+    nodes = [node("topic"), node("queue")]
+    build_graph(nodes)
+
+    def wait(n):
+        if n.name == "topic":
+            raise TimeoutError("timed out")
+        return succeed(n)
+
+    DagScheduler(
+        nodes,
+        lambda ready: [{"status": "success", "RequestToken": n.name} for n in ready],
+        wait,
+    ).run()
+    assert [n.status for n in nodes] == ["FAILED", "SUCCESS"]
@@ -0,0 +1,76 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cloudysetup.envapi_app.schema_registry import SchemaRegistry
+
+CREDENTIALS = ("access-key", "secret-key", None)
+SCHEMA = {
+    "typeName": "AWS::SNS::Topic",
+    "properties": {"TopicName": {"type": "string"}},
+    "additionalProperties": False,
+}
+
+
+class SlowRegistry(SchemaRegistry):
+    """describe_type for AWS::SNS::Topic blocks until released."""
+
+    def __init__(self, cache_dir):
+        super().__init__(cache_dir=cache_dir, offline=False)
+        self.release = threading.Event()
+        self.fetching = threading.Event()
+        self.fetched = []
+
+    def _fetch(self, type_name, credentials):
+        self.fetched.append(type_name)
+        if type_name == "AWS::SNS::Topic":
+            self.fetching.set()
+            assert self.release.wait(5)
+        return {
+            "TypeName": type_name,
+            "VersionId": "v1",
+            "CheckedAt": time.time(),
+            "Schema": {**SCHEMA, "typeName": type_name},
+        }
+
+
+def test_slow_fetch_does_not_hold_up_other_types(tmp_path):
+    registry = SlowRegistry(str(tmp_path))
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        topic = pool.submit(registry.load, "AWS::SNS::Topic", CREDENTIALS)
+        assert registry.fetching.wait(5)
+        queue = registry.load("AWS::SQS::Queue", CREDENTIALS)
+        assert queue.version == "v1"
+        assert not topic.done()
+        registry.release.set()
+        assert topic.result(5).version == "v1"
+
+
+def test_concurrent_loads_of_one_type_fetch_once(tmp_path):
+    registry = SlowRegistry(str(tmp_path))
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        loads = [
+            pool.submit(registry.load, "AWS::SNS::Topic", CREDENTIALS) for _ in range(4)
+        ]
+        assert registry.fetching.wait(5)
+        registry.release.set()
+        schemas = {id(load.result(5)) for load in loads}
+    assert len(schemas) == 1
+    assert registry.fetched == ["AWS::SNS::Topic"]
+
+
+def test_offline_falls_back_to_the_bundled_snapshot(tmp_path):
+    registry = SchemaRegistry(cache_dir=str(tmp_path), offline=True)
+    assert registry.load("AWS::SNS::Topic").version == "bundled"
+    assert registry.load("AWS::Nothing::Here") is None
+
+
+def test_known_types_bound_the_metrics_label(tmp_path):
+    from cloudysetup.envapi_app.metrics import type_name_label
+
+    registry = SchemaRegistry(cache_dir=str(tmp_path), offline=True)
+    registry.load("AWS::SNS::Topic")
+    assert registry.known("AWS::SNS::Topic")
+    assert not registry.known("Made::Up::Type")
+    assert type_name_label("") == ""
+    assert type_name_label("Made::Up::Type") == "other"
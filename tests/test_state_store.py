@@ -0,0 +1,96 @@
+import json
+import time
+
+import pytest
+
+from cloudysetup.cli_tool.state_store import StateStore
+
+TYPE_NAME = "AWS::SNS::Topic"
+
+
+@pytest.fixture
+def store(tmp_path):
+    return StateStore(str(tmp_path / "state.db"))
+
+
+def created(store, token, identifier, region="us-east-1"):
+    store.record_submission("create", TYPE_NAME, token, region=region, source="/t.json")
+    store.record_status(
+        {
+            "RequestToken": token,
+            "Operation": "CREATE",
+            "OperationStatus": "SUCCESS",
+            "Identifier": identifier,
+        }
+    )
+
+
+def test_submission_then_status(store):
+    store.record_submission("create", TYPE_NAME, "t1", region="us-east-1")
+    assert store.active_tokens() == [("t1", "us-east-1")]
+    store.record_status(
+        {
+            "RequestToken": "t1",
+            "OperationStatus": "SUCCESS",
+            "Identifier": "orders",
+            "ResourceModel": json.dumps({"TopicName": "orders"}),
+        }
+    )
+    (row,) = store.query(identifier="orders")
+    assert row["status"] == "SUCCESS"
+    assert json.loads(row["properties"]) == {"TopicName": "orders"}
+    assert store.active_tokens() == []
+
+
+def test_unknown_tokens_are_ignored(store):
+    store.record_status({"RequestToken": "elsewhere", "OperationStatus": "SUCCESS"})
+    assert store.query() == []
+
+
+def test_update_reuses_the_resource_row(store):
+    created(store, "t1", "orders")
+    store.record_submission(
+        "update", TYPE_NAME, "t2", region="us-east-1", identifier="orders"
+    )
+    (row,) = store.query()
+    assert (row["request_token"], row["status"]) == ("t2", "IN_PROGRESS")
+    assert row["source"] == "/t.json"
+
+
+def test_successful_delete_drops_the_row(store):
+    created(store, "t1", "orders")
+    store.record_submission(
+        "delete", TYPE_NAME, "t2", region="us-east-1", identifier="orders"
+    )
+    store.record_status(
+        {"RequestToken": "t2", "Operation": "DELETE", "OperationStatus": "SUCCESS"}
+    )
+    assert store.query() == []
+
+
+def test_reconcile_marks_unlisted_resources_missing(store):
+    created(store, "t1", "orders")
+    created(store, "t2", "billing")
+    assert store.reconcile_targets() == [(TYPE_NAME, "us-east-1")]
+
+    started_at = time.time()
+    store.reconcile_page(
+        TYPE_NAME,
+        "us-east-1",
+        [{"Identifier": "orders", "Properties": {"TopicName": "orders"}}],
+        started_at,
+    )
+    assert store.finish_reconcile(TYPE_NAME, "us-east-1", started_at) == 1
+    statuses = {row["identifier"]: row["status"] for row in store.query()}
+    assert statuses == {"orders": "SUCCESS", "billing": "MISSING"}
+
+    assert store.reconcile_targets(max_age=3600) == []
+    assert store.reconcile_targets() == [(TYPE_NAME, "us-east-1")]
+    assert store.reconcile_targets(type_names=("AWS::SQS::Queue",)) == []
+
+
+def test_reconcile_spares_resources_changed_since_it_started(store):
+    started_at = time.time()
+    created(store, "t1", "orders")
+    assert store.finish_reconcile(TYPE_NAME, "us-east-1", started_at) == 0
+    assert store.query(identifier="orders")[0]["status"] == "SUCCESS"
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from cloudysetup.envapi_app import status_poller as poller_module
+from cloudysetup.envapi_app.cloudcontrol_client import (
+    get_resource_request_status,
+    list_resource_requests,
+)
+from cloudysetup.envapi_app.status_poller import ACTIVE_STATUSES, StatusPoller
+
+CREDENTIALS = ("access-key", "secret-key", None)
+REGION = "us-east-1"
+
+
+class FakeCloudControl:
+    """Stands in for run_cloudcontrol over a fixed set of requests."""
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.calls = []
+
+    async def __call__(self, func, *args, **kwargs):
+        if func is list_resource_requests:
+            wanted = kwargs.get("operation_statuses")
+            self.calls.append(("list", wanted))
+            return [
+                {"RequestToken": token, "OperationStatus": status}
+                for token, status in self.statuses.items()
+                if not wanted or status in wanted
+            ]
+        assert func is get_resource_request_status
+        token = args[0]
+        self.calls.append(("get", token))
+        return {
+            "ProgressEvent": {
+                "RequestToken": token,
+                "OperationStatus": self.statuses[token],
+            }
+        }
+
+
+@pytest.fixture
+def cloudcontrol(monkeypatch):
+    fake = FakeCloudControl(
+        {f"other-{index}": "SUCCESS" for index in range(50)}
+        | {"running": "IN_PROGRESS", "done": "SUCCESS", "other-running": "PENDING"}
+    )
+    monkeypatch.setattr(poller_module, "run_cloudcontrol", fake)
+    return fake
+
+
+def refresh(poller, tokens):
+    return asyncio.run(poller.refresh_many(CREDENTIALS, tokens, region=REGION))
+
+
+def test_tokens_list_only_active_requests(cloudcontrol):
+    poller = StatusPoller()
+    events = refresh(poller, ["running", "done"])
+
+    assert [event["OperationStatus"] for event in events] == ["IN_PROGRESS", "SUCCESS"]
+    assert cloudcontrol.calls == [("list", list(ACTIVE_STATUSES)), ("get", "done")]
+    # Summaries nobody asked for are not cached.
+    assert poller.stats()["tracked"] == 2
+
+
+def test_finished_tokens_are_served_from_the_cache(cloudcontrol):
+    poller = StatusPoller()
+    refresh(poller, ["running", "done"])
+    cloudcontrol.calls.clear()
+
+    refresh(poller, ["running", "done"])
+    assert cloudcontrol.calls == [("list", list(ACTIVE_STATUSES))]
+
+
+def test_caller_filter_is_kept(cloudcontrol):
+    poller = StatusPoller()
+    events = asyncio.run(
+        poller.refresh_many(
+            CREDENTIALS, ["done"], operation_statuses=["SUCCESS"], region=REGION
+        )
+    )
+    assert events == [{"RequestToken": "done", "OperationStatus": "SUCCESS"}]
+    assert cloudcontrol.calls == [("list", ["SUCCESS"])]
+
+
+def test_without_tokens_everything_listed_is_returned(cloudcontrol):
+    poller = StatusPoller()
+    events = asyncio.run(
+        poller.refresh_many(
+            CREDENTIALS, operation_statuses=list(ACTIVE_STATUSES), region=REGION
+        )
+    )
+    assert {event["RequestToken"] for event in events} == {"running", "other-running"}
@@ -0,0 +1,66 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from cloudysetup.envapi_app.template_cache import SQLiteTier, TemplateCache
+
+
+def test_disk_tier_serves_other_processes(tmp_path):
+    path = str(tmp_path / "cache.db")
+    asyncio.run(TemplateCache(db_path=path).set("key", {"request_data": "{}"}))
+    cache = TemplateCache(db_path=path)
+    assert asyncio.run(cache.get("key")) == {"request_data": "{}"}
+    assert cache.disk_hits == 1
+    # Now answered from memory.
+    assert asyncio.run(cache.get("key")) == {"request_data": "{}"}
+    assert cache.disk_hits == 1
+
+
+def test_reads_do_not_write(tmp_path):
+    tier = SQLiteTier(str(tmp_path / "cache.db"), max_size=10, ttl=60)
+    tier.set("key", "value")
+    changes = tier._connection().total_changes
+    assert tier.get("key")[0] == "value"
+    assert tier.get("missing") is None
+    assert tier._connection().total_changes == changes
+
+
+def test_expired_rows_are_not_served(tmp_path):
+    tier = SQLiteTier(str(tmp_path / "cache.db"), max_size=10, ttl=-1)
+    tier.set("key", "value")
+    assert tier.get("key") is None
+
+
+def test_prune_keeps_the_newest_rows(tmp_path):
+    tier = SQLiteTier(str(tmp_path / "cache.db"), max_size=3, ttl=60, prune_every=5)
+    for index in range(5):
+        tier.set(f"key-{index}", index)
+    count = tier._connection().execute("SELECT COUNT(*) FROM templates").fetchone()
+    assert count[0] == 3
+    assert tier.get("key-0") is None
+    assert tier.get("key-4")[0] == 4
+
+
+def test_old_table_with_accessed_at_is_replaced(tmp_path):
+    path = str(tmp_path / "cache.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE templates (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+        "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+    )
+    conn.commit()
+    conn.close()
+
+    tier = SQLiteTier(path, max_size=10, ttl=60)
+    tier.set("key", "value")
+    assert tier.get("key")[0] == "value"
+
+
+def test_concurrent_writes_prune_once_per_interval(tmp_path, monkeypatch):
+    tier = SQLiteTier(str(tmp_path / "cache.db"), max_size=100, ttl=60, prune_every=4)
+    prunes = []
+    monkeypatch.setattr(tier, "prune", lambda now=None: prunes.append(now))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda index: tier.set(f"key-{index}", index), range(64)))
+    assert len(prunes) == 16